@@ -0,0 +1,200 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import json
+from datetime import datetime
+from flask import Blueprint, Response, current_app, request
+from models import db, Venue, Artist, Show
+from instrumentation import query_budget
+from pagination import paginate_keyset
+from queries import GENRE_ASSOCIATIONS, get_genre_names
+from replicas import read_only
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#
+#   GET /api/v1/<venues|artists|shows>
+#       ?fields=id,name    only these fields (and only their columns are
+#                          selected)
+#       ?ids=1,2,3         these records, looked up with one IN query
+#       ?limit=, ?after=, ?before=
+#                          keyset pagination, as on the HTML listings
+#   GET /api/v1/<venues|artists|shows>/<id>?fields=...
+#
+# Rows are serialized straight from the query's result tuples, without
+# loading model instances.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Largest page size (and number of ids) a request can ask for
+MAX_LIMIT = 100
+
+
+class Resource(object):
+  # The fields a resource offers, each backed by one column, and the keys
+  # its listing is paged on. 'genres' is loaded separately, for venues and
+  # artists.
+
+  def __init__(self, model, fields, keys, default_fields):
+      self.model = model
+      self.fields = fields
+      self.keys = keys
+      self.default_fields = default_fields
+
+  def has_genres(self):
+      return self.model in GENRE_ASSOCIATIONS
+
+
+def _entity_fields(model, names):
+  return dict((name, getattr(model, name)) for name in ['id'] + names + ['upcoming_show_count', 'past_show_count', 'updated_at'])
+
+RESOURCES = {
+  'venues': Resource(Venue, _entity_fields(Venue, ['name', 'city', 'state', 'address', 'phone',
+  'image_link', 'facebook_link', 'website', 'seeking_talent', 'seeking_description']),
+  (Venue.id,), ('id', 'name', 'city', 'state')),
+  'artists': Resource(Artist, _entity_fields(Artist, ['name', 'city', 'state', 'phone',
+  'image_link', 'facebook_link', 'website', 'seeking_venue', 'seeking_description']),
+  (Artist.id,), ('id', 'name', 'city', 'state')),
+  'shows': Resource(Show, {
+    'id': Show.id,
+    'start_time': Show.start_time,
+    'artist_id': Show.artist_id,
+    'artist_name': Artist.name,
+    'artist_image_link': Artist.image_link,
+    'venue_id': Show.venue_id,
+    'venue_name': Venue.name,
+    'updated_at': Show.updated_at
+  }, (Show.start_time, Show.id), ('id', 'start_time', 'artist_id', 'artist_name', 'venue_id', 'venue_name'))
+}
+
+
+class APIError(Exception):
+
+  def __init__(self, status, message):
+      super(APIError, self).__init__(message)
+      self.status = status
+      self.message = message
+
+
+def _json_default(value):
+  if isinstance(value, datetime):
+      return value.isoformat()
+  raise TypeError('%r is not JSON serializable' % (value,))
+
+def json_response(payload, status=200):
+  data = json.dumps(payload, default=_json_default, separators=(',', ':'))
+  return Response(data, status=status, mimetype='application/json')
+
+@api.errorhandler(APIError)
+def handle_api_error(error):
+  return json_response({'error': error.message}, error.status)
+
+@api.errorhandler(404)
+def handle_not_found(error):
+  return json_response({'error': 'Not found'}, 404)
+
+
+def get_resource(name):
+  resource = RESOURCES.get(name)
+  if resource is None:
+      raise APIError(404, 'Unknown resource: %s' % name)
+  return resource
+
+def parse_fields(resource):
+  # The requested field names, in request order
+  value = request.args.get('fields')
+  if not value:
+      fields = list(resource.default_fields)
+      return fields + ['genres'] if resource.has_genres() else fields
+  fields = []
+  for name in value.split(','):
+      name = name.strip()
+      if name in fields:
+          continue
+      if name not in resource.fields and not (name == 'genres' and resource.has_genres()):
+          raise APIError(400, 'Unknown field: %s' % name)
+      fields.append(name)
+  return fields
+
+def parse_ids(value):
+  try:
+      ids = [int(entity_id) for entity_id in value.split(',') if entity_id.strip()]
+  except ValueError:
+      raise APIError(400, 'ids must be a comma separated list of integers')
+  if any(not -2 ** 63 <= entity_id < 2 ** 63 for entity_id in ids):
+      raise APIError(400, 'ids must be 64 bit integers')
+  if len(ids) > MAX_LIMIT:
+      raise APIError(400, 'At most %d ids can be requested at once' % MAX_LIMIT)
+  return ids
+
+def select_fields(resource, fields):
+  # A query on just the columns behind the requested fields, plus the
+  # resource's keys (which paging and genres rely on). Artists and venues
+  # are only joined to shows when one of their columns is requested.
+  columns = [resource.fields[name].label(name) for name in fields if name != 'genres']
+  selected = set(name for name in fields if name != 'genres')
+  for key in resource.keys:
+      if key.key not in selected:
+          columns.append(key.label(key.key))
+          selected.add(key.key)
+
+  query = db.session.query(*columns).select_from(resource.model)
+  if resource.model is Show:
+      models = set(resource.fields[name].class_ for name in selected)
+      for model, foreign_key in ((Artist, Show.artist_id), (Venue, Show.venue_id)):
+          if model in models:
+              query = query.join(model, model.id == foreign_key)
+  return query
+
+def serialize(resource, fields, rows):
+  genres = get_genre_names(resource.model, [row.id for row in rows]) if 'genres' in fields else None
+  items = []
+  for row in rows:
+      item = {}
+      for name in fields:
+          item[name] = genres[row.id] if name == 'genres' else getattr(row, name)
+      items.append(item)
+  return items
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+@api.route('/<resource_name>')
+@query_budget(2)
+@read_only
+def list_resource(resource_name):
+  resource = get_resource(resource_name)
+  fields = parse_fields(resource)
+  query = select_fields(resource, fields)
+
+  if 'ids' in request.args:
+      ids = parse_ids(request.args['ids'])
+      rows = query.filter(resource.model.id.in_(ids)).all() if ids else []
+      # In the order requested; ids that don't exist are left out
+      by_id = dict((row.id, row) for row in rows)
+      rows = [by_id[entity_id] for entity_id in ids if entity_id in by_id]
+      return json_response({'data': serialize(resource, fields, rows)})
+
+  limit = request.args.get('limit', current_app.config['PAGE_SIZE'], type=int)
+  if limit < 1 or limit > MAX_LIMIT:
+      raise APIError(400, 'limit must be between 1 and %d' % MAX_LIMIT)
+  page = paginate_keyset(query, resource.keys, limit, request.args.get('after'), request.args.get('before'))
+  return json_response({
+    'data': serialize(resource, fields, page.items),
+    'prev': page.prev_token,
+    'next': page.next_token
+  })
+
+@api.route('/<resource_name>/<int:entity_id>')
+@query_budget(2)
+@read_only
+def get_entity(resource_name, entity_id):
+  resource = get_resource(resource_name)
+  fields = parse_fields(resource)
+  row = select_fields(resource, fields).filter(resource.model.id == entity_id).first()
+  if row is None:
+      raise APIError(404, 'No %s with id %d' % (resource_name.rstrip('s'), entity_id))
+  return json_response({'data': serialize(resource, fields, [row])[0]})
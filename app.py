@@ -3,92 +3,256 @@
 #----------------------------------------------------------------------------#
 
 import json
+import os
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+from flask import Flask, current_app, render_template, request, Response, flash, redirect, url_for, abort, jsonify, stream_with_context
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 import logging
+from functools import lru_cache
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+from models import *
+from queries import *
+from search import search
+from instrumentation import instrumentation, query_budget
+from replicas import replicas, read_only
+from cache import cache
+from api import api
+from conditional import conditional
+from importer import import_command
+from counters import counters_command
+from template_cache import template_cache, templates_command
+from assets import assets, assets_command
+from exporter import export_command, export_shows, parse_filters, ExportError, EXPORT_FORMATS
 from flask_migrate import Migrate
+from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+# Babel patterns for the filter's named formats; any other format is used as
+# a pattern itself
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@lru_cache(maxsize=None)
+def get_datetime_pattern(format, locale):
+  # Parsing the pattern and loading the locale cost more than formatting
+  # with them, so each is done once
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+@lru_cache(maxsize=16384)
+def _format_datetime(value, format, locale):
+  # Shows on a page often share start times, so results are memoized too
+  if not isinstance(value, datetime):
+      value = dateutil.parser.parse(value)
+  # Naive times are taken as UTC, as babel.dates.format_datetime does
+  if value.tzinfo is None:
+      value = value.replace(tzinfo=babel.dates.UTC)
+  pattern, locale = get_datetime_pattern(format, locale)
+  return pattern.apply(value, locale)
+
+def format_datetime(value, format='medium'):
+  # Takes a datetime, or a string dateutil can parse
+  return _format_datetime(value, format, babel.dates.LC_TIME)
+
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
+moment = Moment()
+migrate = Migrate()
+
+def load_environment(app, prefix='FYYUR_'):
+  # Overrides settings with FYYUR_<SETTING> environment variables. Values
+  # are read as JSON when they parse (numbers, true/false, null) and as
+  # strings otherwise.
+  for name, value in os.environ.items():
+      if not name.startswith(prefix):
+          continue
+      try:
+          value = json.loads(value)
+      except ValueError:
+          pass
+      app.config[name[len(prefix):]] = value
+
+def configure_engine(app):
+  # Builds the engine options from the DB_POOL_* settings. SQLite doesn't
+  # use a connection queue, so it only gets the pre-ping and recycling.
+  options = {
+    'pool_pre_ping': app.config['DB_POOL_PRE_PING'],
+    'pool_recycle': app.config['DB_POOL_RECYCLE']
+  }
+  if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+      options.update(pool_size=app.config['DB_POOL_SIZE'],
+      max_overflow=app.config['DB_MAX_OVERFLOW'], pool_timeout=app.config['DB_POOL_TIMEOUT'])
+  options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+  app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+def create_app(config_object='config'):
+  app = Flask(__name__)
+  app.config.from_object(config_object)
+  load_environment(app)
+
+  if not app.config['SECRET_KEY']:
+      # Only usable with a single process: each worker would get its own key
+      app.logger.warning('SECRET_KEY is not set; using a random key for this process')
+      app.config['SECRET_KEY'] = os.urandom(32)
+
+  configure_engine(app)
+  moment.init_app(app)
+  db.init_app(app)
+  replicas.init_app(app)
+  search.init_app(app)
+  instrumentation.init_app(app)
+  cache.init_app(app)
+  conditional.init_app(app)
+  migrate.init_app(app, db)
+  assets.init_app(app)
+  app.jinja_env.filters['datetime'] = format_datetime
+  template_cache.init_app(app)
+
+  app.register_blueprint(api)
+  app.cli.add_command(import_command)
+  app.cli.add_command(export_command)
+  app.cli.add_command(counters_command)
+  app.cli.add_command(templates_command)
+  app.cli.add_command(assets_command)
+  register_views(app)
+  return app
+
+#----------------------------------------------------------------------------#
+# Views.
+#----------------------------------------------------------------------------#
 
-migrate = Migrate(app, db)
+# The site's views and error handlers, collected by @route and
+# @errorhandler and registered on every app create_app builds, with the
+# views' names as endpoints
+VIEWS = []
+ERROR_HANDLERS = {}
+
+def route(rule, **options):
+  # Like app.route
+  def decorator(view):
+      VIEWS.append((rule, options, view))
+      return view
+  return decorator
+
+def errorhandler(code):
+  # Like app.errorhandler
+  def decorator(handler):
+      ERROR_HANDLERS[code] = handler
+      return handler
+  return decorator
+
+def register_views(app):
+  for rule, options, view in VIEWS:
+      app.add_url_rule(rule, view_func=view, **options)
+  for code, handler in ERROR_HANDLERS.items():
+      app.register_error_handler(code, handler)
 
 #----------------------------------------------------------------------------#
-# Models.
+# Search index.
 #----------------------------------------------------------------------------#
 
-class Venue(db.Model):
-    __tablename__ = 'venues'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String, nullable=False)
-    city = db.Column(db.String(120), nullable=False)
-    state = db.Column(db.String(120), nullable=False)
-    address = db.Column(db.String(120), nullable=False)
-    phone = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.String(240), nullable=False)
-    website = db.Column(db.String(120))
-    seeking_talent = db.Column(db.Boolean)
-    seeking_description = db.Column(db.String(240))
-    shows = db.relationship('Show', backref='show_venue')
-
-class Artist(db.Model):
-    __tablename__ = 'artists'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String, nullable=False)
-    city = db.Column(db.String(120), nullable=False)
-    state = db.Column(db.String(120), nullable=False)
-    phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120), nullable=False)
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    website = db.Column(db.String(120))
-    seeking_venue = db.Column(db.Boolean)
-    seeking_description = db.Column(db.String(240))
-    shows = db.relationship('Show', backref='show_artist')
-
-class Show(db.Model):
-    __tablename__ = 'shows'
-
-    id = db.Column(db.Integer, primary_key=True)
-    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
-    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
+def index_entity(model, entity, genres):
+  # Updates the search index with a venue or an artist as just written
+  genre_ids = get_genre_ids()
+  search.index(model, entity['id'], entity['name'], entity['city'],
+  [genre for genre in genres if genre in genre_ids])
 
 #----------------------------------------------------------------------------#
-# Filters.
+# Cache invalidation.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+# For venues and artists: the cache scope of their page, of their listing and
+# of the pages of the artists/venues they have shows with
+CACHE_SCOPES = {
+  Venue: ('venue', 'venues', 'artist'),
+  Artist: ('artist', 'artists', 'venue')
+}
+
+def invalidate_entity_pages(model, entity_ids, related_ids):
+  # Drops the cached pages showing venues or artists: their own pages, their
+  # listing, the shows listing and the pages of the artists or venues they
+  # have shows with (related_ids)
+  scope, listing_scope, related_scope = CACHE_SCOPES[model]
+  for entity_id in entity_ids:
+      cache.invalidate(scope, entity_id)
+  cache.invalidate(listing_scope)
+  cache.invalidate('shows')
+  for related_id in related_ids:
+      cache.invalidate(related_scope, related_id)
+
+def forget_entities(model, entity_ids, related_ids):
+  # Drops deleted venues or artists from the search index, along with the
+  # cached pages that showed them
+  for entity_id in entity_ids:
+      search.unindex(model, entity_id)
+  invalidate_entity_pages(model, entity_ids, related_ids)
+
+#----------------------------------------------------------------------------#
+# Batch deletion.
+#----------------------------------------------------------------------------#
+
+# Largest number of venues or artists one request can delete
+DELETE_BATCH_LIMIT = 100
+
+def delete_batch(model):
+  # Deletes the venues or artists given as ?ids=1,2,3 in one statement, and
+  # answers with the ids that existed and were deleted
+  try:
+      entity_ids = [int(entity_id) for entity_id in request.args.get('ids', '').split(',') if entity_id.strip()]
+  except ValueError:
+      abort(400)
+  if not entity_ids or len(entity_ids) > DELETE_BATCH_LIMIT:
+      abort(400)
+  if any(not -2 ** 63 <= entity_id < 2 ** 63 for entity_id in entity_ids):
+      abort(400)
+
+  try:
+      deleted_ids, related_ids = delete_entities(model, entity_ids)
+  except SQLAlchemyError:
+      current_app.logger.exception('Failed to delete %s %s', model.__tablename__, entity_ids)
+      abort(500)
+
+  forget_entities(model, deleted_ids, related_ids)
+  return jsonify(deleted=deleted_ids)
+
+#----------------------------------------------------------------------------#
+# Paging parameters.
+#----------------------------------------------------------------------------#
+
+# Largest past_from/upcoming_from accepted on venue and artist pages. It's
+# past the shows of any venue or artist, and keeps the positions computed
+# from it within the database's integers.
+MAX_SHOWS_FROM = 10 ** 9
 
-app.jinja_env.filters['datetime'] = format_datetime
+def get_shows_from(name):
+  # Where a venue's or artist's list of past or upcoming shows starts
+  return min(max(request.args.get(name, 0, type=int), 0), MAX_SHOWS_FROM)
+
+# Largest page number accepted on the search pages; the offset computed
+# from it stays within the database's integers
+MAX_SEARCH_PAGE = 10 ** 6
+
+def get_search_page():
+  # The page of search results asked for in the submitted form
+  return min(max(request.form.get('page', 1, type=int), 1), MAX_SEARCH_PAGE)
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+@route('/')
+@query_budget(0)
 def index():
   return render_template('pages/home.html')
 
@@ -96,404 +260,449 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@route('/venues')
+@query_budget(2)
+@read_only
+@conditional.validated(lambda: get_listing_validators('venues'))
+@cache.cached('venues')
 def venues():
-  # Get the current date and time
-  current_datetime = datetime.now()
+  # Get a page of venues, grouped by area, from the database
+  data, page = get_venue_areas(current_app.config['PAGE_SIZE'],
+  request.args.get('after'), request.args.get('before'), request.args.get('genre'))
 
-  # Get the data from the database
-  data = []
-  city_count = db.session.query(Venue.city, Venue.state, db.func.count(Venue.id)).group_by(Venue.city, Venue.state).all()
-  venue_show_data = db.session.query(Venue.id, Venue.name, db.func.count(Show.id)).outerjoin(Show).group_by(Venue.id, Venue.name)
-
-  # Add data to the data list
-  for city in city_count:
-      data.append({
-        'city': city[0],
-        'state': city[1],
-        'venues': []
-      })
-      city_venue_data = venue_show_data.filter(Venue.city == city[0]).filter(Venue.state == city[1]).all()
-      num_venues = city[2]
-      # Add venues information
-      for i in range(num_venues):
-          data[len(data) - 1]['venues'].append({
-            'id': city_venue_data[i][0],
-            'name': city_venue_data[i][1],
-            'num_upcoming_shows': city_venue_data[i][2]
-          })
-
-  return render_template('pages/venues.html', areas=data);
-
-@app.route('/venues/search', methods=['POST'])
+  return render_template('pages/venues.html', areas=data, page=page);
+
+@route('/venues/search', methods=['POST'])
+@query_budget(4)
+@read_only
 def search_venues():
   # Gets the search term from the text field and searches in the database
   search_term = request.form.get('search_term', '')
-  search_results = db.session.query(Venue.id, Venue.name).filter(Venue.name.ilike('%' + search_term + '%')).all()
-  num_search_results = db.session.query(Venue.id, Venue.name).filter(Venue.name.ilike('%' + search_term + '%')).count()
+  page = get_search_page()
+  results = search.paginate(search.venues(search_term), page)
 
-  return render_template('pages/search_venues.html', results=search_results, search_term=search_term, num_search_results=num_search_results)
+  return render_template('pages/search_venues.html', results=results.items, search_term=search_term, num_search_results=results.total, page=results)
 
-@app.route('/venues/<int:venue_id>')
+@route('/venues/<int:venue_id>')
+@query_budget(3)
+@read_only
+@conditional.validated(lambda venue_id: get_detail_validators(Venue, venue_id, datetime.now()))
+@cache.cached('venue', 'venue_id')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # Get the current date and time
   current_datetime = datetime.now()
+  past_from = get_shows_from('past_from')
+  upcoming_from = get_shows_from('upcoming_from')
 
-  # Get the venue details from the database
-  venue_data = db.session.query(Venue).get(venue_id)
-  venue_data.genres = str(venue_data.genres).split(',')
-  past_shows = db.session.query(Show.venue_id, Show.start_time, Show.artist_id,
-  Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link')).join(Artist).filter(Show.venue_id == venue_id).filter(Show.start_time < current_datetime).all()
-  future_shows = db.session.query(Show.venue_id, Show.start_time, Show.artist_id,
-  Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link')).join(Artist).filter(Show.venue_id == venue_id).filter(Show.start_time > current_datetime).all()
-  past_shows_count = db.session.query(Show.venue_id, Show.start_time).filter(Show.venue_id == venue_id).filter(Show.start_time < current_datetime).count()
-  future_shows_count = db.session.query(Show.venue_id, Show.start_time).filter(Show.venue_id == venue_id).filter(Show.start_time > current_datetime).count()
+  # Get the venue details and its shows from the database
+  venue_page, genres = get_detail(Venue, venue_id, current_datetime,
+  current_app.config['DETAIL_SHOWS_LIMIT'], past_from, upcoming_from)
+  if venue_page is None:
+      abort(404)
+  venue_data, past_shows, future_shows = venue_page
 
-  return render_template('pages/show_venue.html', venue=venue_data, past_shows=past_shows,
-  future_shows=future_shows, num_past_shows=past_shows_count, num_future_shows=future_shows_count)
+  return render_template('pages/show_venue.html', venue=venue_data,
+  genres=genres, past_shows=past_shows, future_shows=future_shows,
+  num_past_shows=past_shows.total, num_future_shows=future_shows.total,
+  past_from=past_from, upcoming_from=upcoming_from)
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@route('/venues/create', methods=['GET'])
+@query_budget(1)
 def create_venue_form():
   form = VenueForm()
+  form.genres.choices = get_genre_choices()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@route('/venues/create', methods=['POST'])
+@query_budget(3)
 def create_venue_submission():
   #Venue details as entered in the submitted form
-  venue_name = request.form.get('name')
-  venue_city = request.form.get('city')
-  venue_state = request.form.get('state')
-  venue_address = request.form.get('address')
-  venue_phone = request.form.get('phone')
-  venue_genres = ','.join(request.form.getlist('genres'))
-  venue_fb_link = request.form.get('facebook_link')
-  venue_website = request.form.get('website')
-  venue_image = request.form.get('image_link')
-  seeking_talent = True if request.form.get('seeking_talent') == 'y' else False
-  seeking_description = request.form.get('seeking_description')
-
-  data = {}
-  error = False
-
-  #Try to add the data to the database
+  venue_details = {
+    'name': request.form.get('name'),
+    'city': request.form.get('city'),
+    'state': request.form.get('state'),
+    'address': request.form.get('address'),
+    'phone': request.form.get('phone'),
+    'facebook_link': request.form.get('facebook_link'),
+    'website': request.form.get('website'),
+    'image_link': request.form.get('image_link'),
+    'seeking_talent': True if request.form.get('seeking_talent') == 'y' else False,
+    'seeking_description': request.form.get('seeking_description')
+  }
+  venue_genres = request.form.getlist('genres')
+
+  #Try to add the data to the database, in one transaction
   try:
-      #New venue object
-      venue = Venue(name=venue_name, city=venue_city, state=venue_state,
-      address=venue_address, phone=venue_phone, genres=venue_genres,
-      facebook_link=venue_fb_link, website=venue_website, image_link=venue_image,
-      seeking_talent=seeking_talent, seeking_description=seeking_description)
-      db.session.add(venue)
-      db.session.commit()
-      data['name'] = venue.name
-  #If there's an error, rollback the session
-  except:
-      db.session.rollback()
-      error = True
-  #Close the connection either way
-  finally:
-      db.session.close()
-  #If an error occurred, flash an error message
-  if error:
+      venue = create_entity(Venue, venue_details, venue_genres)
+  #If there's an error, it was rolled back; alert the user
+  except SQLAlchemyError:
+      current_app.logger.exception('Failed to list a venue')
       flash('An error occurred and the venue was not listed. Please try again.')
-  #If there was no error, alert the user the venue was listed
-  if not error:
-      # on successful db insert, flash success
-      flash('Venue ' + data['name'] + ' was successfully listed!')
+      return render_template('pages/home.html')
+
+  index_entity(Venue, venue, venue_genres)
+  cache.invalidate('venues')
+  # on successful db insert, flash success
+  flash('Venue ' + venue['name'] + ' was successfully listed!')
 
   return render_template('pages/home.html')
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@route('/venues/<int:venue_id>', methods=['DELETE'])
+@query_budget(5)
 def delete_venue(venue_id):
-  redirect_to = ''
-  error = False
-
-  #Try to delete the venue and all associated events from the database
+  #Try to delete the venue from the database; its shows go along with it
   try:
-      venue = db.session.query(Venue).get(venue_id)
-      db.session.query(Show).filter(Show.venue_id == venue_id).delete()
-      db.session.delete(venue)
-      db.session.commit()
-  #If there's an error, rollback the session
-  except:
-      db.session.rollback()
-      error = True
-  #Close the connection either way
-  finally:
-      db.session.close()
-  #If an error occurred, flash an error message
-  if error:
+      deleted_ids, artist_ids = delete_entities(Venue, [venue_id])
+  #If there's an error, it was rolled back
+  except SQLAlchemyError:
+      current_app.logger.exception('Failed to delete venue %s', venue_id)
+      deleted_ids = []
+  #If the venue couldn't be deleted, flash an error message
+  if not deleted_ids:
       flash('Failed to delete the venue. Please try again.')
-      redirect_to = '/venues/' + venue_id
-  #If there was no error, alert the user the venue was deleted and redirect to index
-  if not error:
-      flash('Venue successfully deleted!')
-      redirect_to = 'index'
+      return redirect(url_for('show_venue', venue_id=venue_id))
 
-  return redirect(url_for(redirect_to))
+  forget_entities(Venue, deleted_ids, artist_ids)
+  #Alert the user the venue was deleted and redirect to index
+  flash('Venue successfully deleted!')
+
+  return redirect(url_for('index'))
+
+@route('/venues', methods=['DELETE'])
+@query_budget(5)
+def delete_venues():
+  return delete_batch(Venue)
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@route('/artists')
+@query_budget(2)
+@read_only
+@conditional.validated(lambda: get_listing_validators('artists'))
+@cache.cached('artists')
 def artists():
-  data = db.session.query(Artist.id, Artist.name).all()
-  return render_template('pages/artists.html', artists=data)
+  page = get_artists_page(current_app.config['PAGE_SIZE'], request.args.get('after'),
+  request.args.get('before'), request.args.get('genre'))
+  return render_template('pages/artists.html', artists=page.items, page=page)
 
-@app.route('/artists/search', methods=['POST'])
+@route('/artists/search', methods=['POST'])
+@query_budget(4)
+@read_only
 def search_artists():
   # Gets the search term from the text field and searches the database
   search_term = request.form.get('search_term', '')
-  search_results = db.session.query(Artist.name, Artist.id).filter(Artist.name.ilike('%' + search_term + '%')).all()
-  num_search_results = db.session.query(Artist.name, Artist.id).filter(Artist.name.ilike('%' + search_term + '%')).count()
+  page = get_search_page()
+  results = search.paginate(search.artists(search_term), page)
 
-  return render_template('pages/search_artists.html', results=search_results, search_term=search_term, num_search_results=num_search_results)
+  return render_template('pages/search_artists.html', results=results.items, search_term=search_term, num_search_results=results.total, page=results)
 
-@app.route('/artists/<int:artist_id>')
+@route('/artists/<int:artist_id>')
+@query_budget(3)
+@read_only
+@conditional.validated(lambda artist_id: get_detail_validators(Artist, artist_id, datetime.now()))
+@cache.cached('artist', 'artist_id')
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
   # Gets the current date
   current_datetime = datetime.now()
-
-  # Gets the artist data to display on the page
-  artist_data = db.session.query(Artist).get(artist_id)
-  artist_data.genres = str(artist_data.genres).split(',')
-  past_shows = db.session.query(Show.venue_id, Show.start_time, Venue.name.label('venue_name'),
-  Venue.image_link.label('venue_image_link')).select_from(Show).join(Venue).filter(Show.artist_id == artist_id).filter(Show.start_time < current_datetime).all()
-  future_shows = db.session.query(Show.venue_id, Show.start_time, Venue.name.label('venue_name'),
-  Venue.image_link.label('venue_image_link')).select_from(Show).join(Venue).filter(Show.artist_id == artist_id).filter(Show.start_time > current_datetime).all()
-  num_past_shows = db.session.query(Show.artist_id, Show.start_time).filter(Show.artist_id == artist_id).filter(Show.start_time < current_datetime).count()
-  num_future_shows = db.session.query(Show.artist_id, Show.start_time).filter(Show.artist_id == artist_id).filter(Show.start_time > current_datetime).count()
-
-  return render_template('pages/show_artist.html', artist=artist_data, past_shows=past_shows,
-  future_shows=future_shows, num_past=num_past_shows, num_future=num_future_shows)
+  past_from = get_shows_from('past_from')
+  upcoming_from = get_shows_from('upcoming_from')
+
+  # Gets the artist data and shows to display on the page
+  artist_page, genres = get_detail(Artist, artist_id, current_datetime,
+  current_app.config['DETAIL_SHOWS_LIMIT'], past_from, upcoming_from)
+  if artist_page is None:
+      abort(404)
+  artist_data, past_shows, future_shows = artist_page
+
+  return render_template('pages/show_artist.html', artist=artist_data,
+  genres=genres, past_shows=past_shows, future_shows=future_shows,
+  num_past=past_shows.total, num_future=future_shows.total,
+  past_from=past_from, upcoming_from=upcoming_from)
+
+@route('/artists/<int:artist_id>', methods=['DELETE'])
+@query_budget(5)
+def delete_artist(artist_id):
+  #Try to delete the artist from the database; their shows go along with them
+  try:
+      deleted_ids, venue_ids = delete_entities(Artist, [artist_id])
+  #If there's an error, it was rolled back
+  except SQLAlchemyError:
+      current_app.logger.exception('Failed to delete artist %s', artist_id)
+      deleted_ids = []
+  #If the artist couldn't be deleted, flash an error message
+  if not deleted_ids:
+      flash('Failed to delete the artist. Please try again.')
+      return redirect(url_for('show_artist', artist_id=artist_id))
+
+  forget_entities(Artist, deleted_ids, venue_ids)
+  #Alert the user the artist was deleted and redirect to index
+  flash('Artist successfully deleted!')
+
+  return redirect(url_for('index'))
+
+@route('/artists', methods=['DELETE'])
+@query_budget(5)
+def delete_artists():
+  return delete_batch(Artist)
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+EDIT_FORMS = {
+  Venue: (VenueForm, 'forms/edit_venue.html', 'venue'),
+  Artist: (ArtistForm, 'forms/edit_artist.html', 'artist')
+}
+
+def render_edit_form(model, entity_id, status=200):
+  # Gets the venue's or artist's details (and version) and creates a
+  # pre-filled form
+  entity = db.session.query(model).get(entity_id)
+  if entity is None:
+      abort(404)
+  form_class, template, name = EDIT_FORMS[model]
+  # Filled from the row only: after a conflict the submitted form data
+  # holds the stale version_id
+  form = form_class(formdata=None, obj=entity)
+  form.genres.choices = get_genre_choices()
+  form.genres.data = [genre.name for genre in entity.genres]
+
+  return render_template(template, form=form, **{name: entity}), status
+
+@route('/artists/<int:artist_id>/edit', methods=['GET'])
+@query_budget(3)
 def edit_artist(artist_id):
-  # Gets the artist details and creates a pre-filled forms
-  artist = db.session.query(Artist).get(artist_id)
-  genres = str(db.session.query(Artist.genres).filter(Artist.id == artist_id).all()).replace("[(", "").replace(")]", "").replace("'", "")
-  genres = genres.split(',')
-  form = ArtistForm(obj=artist)
-  form.genres.data = genres
-
-  return render_template('forms/edit_artist.html', form=form, artist=artist)
+  return render_edit_form(Artist, artist_id)
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@route('/artists/<int:artist_id>/edit', methods=['POST'])
+@query_budget(7)
 def edit_artist_submission(artist_id):
-  error = False
-  artist_name = ''
-
-  # Try to update the selected artist's details
+  # Change the details according to the form details
+  artist_details = {
+    'name': request.form.get('name'),
+    'city': request.form.get('city'),
+    'state': request.form.get('state'),
+    'phone': request.form.get('phone'),
+    'image_link': request.form.get('image_link'),
+    'facebook_link': request.form.get('facebook_link'),
+    'website': request.form.get('website'),
+    'seeking_venue': True if request.form.get('seeking_venue') == 'y' else False,
+    'seeking_description': request.form.get('seeking_description')
+  }
+  artist_genres = request.form.getlist('genres')
+  version_id = request.form.get('version_id', type=int)
+  if version_id is None:
+      abort(400)
+
+  # Try to update the selected artist's details, in one transaction
   try:
-      # Get the artist's details
-      artist = db.session.query(Artist).get(artist_id)
-      # Change the details according to the form details
-      artist.name = request.form.get('name')
-      artist.city = request.form.get('city')
-      artist.state = request.form.get('state')
-      artist.phone = request.form.get('phone')
-      artist.genres = ",".join(request.form.getlist('genres'))
-      artist.image_link = request.form.get('image_link')
-      artist.facebook_link = request.form.get('facebook_link')
-      artist.website = request.form.get('website')
-      artist.seeking_venue = True if request.form.get('seeking_venue') == 'y' else False
-      artist.seeking_description = request.form.get('seeking_description')
-      # Attempt to commit to the database
-      db.session.commit()
-      artist_name = artist.name
-  #If there's an error, rollback the session
-  except:
-      db.session.rollback()
-      error = True
-  #Close the connection either way
-  finally:
-      db.session.close()
-  #If an error occurred, flash an error message
-  if error:
+      artist = update_entity(Artist, artist_id, version_id, artist_details, artist_genres)
+  #If it was changed since the form was loaded, show the current details
+  except EditConflict:
+      flash('This artist was changed by someone else while you were editing it. Please review the current details and try again.')
+      return render_edit_form(Artist, artist_id, 409)
+  #If there's an error, it was rolled back; flash an error message
+  except SQLAlchemyError:
+      current_app.logger.exception('Failed to update artist %s', artist_id)
       flash('Edit failed due to an error. Please try again.')
-  #If there was no error, alert the user the venue was listed
-  if not error:
-      flash('Updated ' + artist_name + ' successfully!')
+      return redirect(url_for('show_artist', artist_id=artist_id))
+  if artist is None:
+      abort(404)
+
+  index_entity(Artist, artist, artist_genres)
+  invalidate_entity_pages(Artist, [artist_id], get_related_ids(Artist, [artist_id]))
+  flash('Updated ' + artist['name'] + ' successfully!')
 
   return redirect(url_for('show_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@route('/venues/<int:venue_id>/edit', methods=['GET'])
+@query_budget(3)
 def edit_venue(venue_id):
-  # Gets the venue details and creates a pre-filled form with the details
-  venue = db.session.query(Venue).get(venue_id)
-  genres = str(db.session.query(Venue.genres).filter(Venue.id == venue_id).all()).replace("[(", "").replace(")]", "").replace("'", "")
-  genres = genres.split(',')
-  form = VenueForm(obj=venue)
-  form.genres.data = genres
+  return render_edit_form(Venue, venue_id)
 
-  return render_template('forms/edit_venue.html', form=form, venue=venue)
-
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@route('/venues/<int:venue_id>/edit', methods=['POST'])
+@query_budget(7)
 def edit_venue_submission(venue_id):
-  error = False
-  venue_name = ''
-
-  # Try to update the selected artist's details
+  # Update the details based on the form submission
+  venue_details = {
+    'name': request.form.get('name'),
+    'city': request.form.get('city'),
+    'state': request.form.get('state'),
+    'address': request.form.get('address'),
+    'phone': request.form.get('phone'),
+    'image_link': request.form.get('image_link'),
+    'facebook_link': request.form.get('facebook_link'),
+    'website': request.form.get('website'),
+    'seeking_talent': True if request.form.get('seeking_talent') == 'y' else False,
+    'seeking_description': request.form.get('seeking_description')
+  }
+  venue_genres = request.form.getlist('genres')
+  version_id = request.form.get('version_id', type=int)
+  if version_id is None:
+      abort(400)
+
+  # Try to update the selected venue's details, in one transaction
   try:
-      # Get the venue's details
-      venue = db.session.query(Venue).get(venue_id)
-      # Update the details based on the form submission
-      venue.name = request.form.get('name')
-      venue.city = request.form.get('city')
-      venue.state = request.form.get('state')
-      venue.address = request.form.get('address')
-      venue.phone = request.form.get('phone')
-      venue.image_link = request.form.get('image_link')
-      venue.facebook_link = request.form.get('facebook_link')
-      venue.genres = ','.join(request.form.getlist('genres'))
-      venue.website = request.form.get('website')
-      venue.seeking_talent = True if request.form.get('seeking_talent') == 'y' else False
-      venue.seeking_description = request.form.get('seeking_description')
-      # Try to commit to the database
-      db.session.commit()
-      venue_name = venue.name
-  #If there's an error, rollback the session
-  except:
-      db.session.rollback()
-      error = True
-  #Close the connection either way
-  finally:
-      db.session.close()
-  #If an error occurred, flash an error message
-  if error:
+      venue = update_entity(Venue, venue_id, version_id, venue_details, venue_genres)
+  #If it was changed since the form was loaded, show the current details
+  except EditConflict:
+      flash('This venue was changed by someone else while you were editing it. Please review the current details and try again.')
+      return render_edit_form(Venue, venue_id, 409)
+  #If there's an error, it was rolled back; flash an error message
+  except SQLAlchemyError:
+      current_app.logger.exception('Failed to update venue %s', venue_id)
       flash('Update failed due to an error. Please try again.')
-  #If there was no error, alert the user the venue was listed
-  if not error:
-      flash('Updated ' + venue_name + ' successfully!')
+      return redirect(url_for('show_venue', venue_id=venue_id))
+  if venue is None:
+      abort(404)
+
+  index_entity(Venue, venue, venue_genres)
+  invalidate_entity_pages(Venue, [venue_id], get_related_ids(Venue, [venue_id]))
+  flash('Updated ' + venue['name'] + ' successfully!')
 
   return redirect(url_for('show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@route('/artists/create', methods=['GET'])
+@query_budget(1)
 def create_artist_form():
   form = ArtistForm()
+  form.genres.choices = get_genre_choices()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@route('/artists/create', methods=['POST'])
+@query_budget(3)
 def create_artist_submission():
   #Artist details as entered in the form
-  artist_name = request.form.get('name')
-  artist_city = request.form.get('city')
-  artist_state = request.form.get('state')
-  artist_phone = request.form.get('phone')
-  artist_genres = ','.join(request.form.getlist('genres'))
-  artist_fb_link = request.form.get('facebook_link')
-  artist_image = request.form.get('image_link')
-  artist_website = request.form.get('website')
-  seeking_venue = True if request.form.get('seeking_venue') == 'y' else False
-  seeking_description = request.form.get('seeking_description')
-
-  data = {}
-  error = False
-
-  #Try to add the data to the database
+  artist_details = {
+    'name': request.form.get('name'),
+    'city': request.form.get('city'),
+    'state': request.form.get('state'),
+    'phone': request.form.get('phone'),
+    'facebook_link': request.form.get('facebook_link'),
+    'image_link': request.form.get('image_link'),
+    'website': request.form.get('website'),
+    'seeking_venue': True if request.form.get('seeking_venue') == 'y' else False,
+    'seeking_description': request.form.get('seeking_description')
+  }
+  artist_genres = request.form.getlist('genres')
+
+  #Try to add the data to the database, in one transaction
   try:
-      artist = Artist(name=artist_name, city=artist_city, state=artist_state,
-      phone=artist_phone, genres=artist_genres, facebook_link=artist_fb_link,
-      image_link=artist_image, website=artist_website, seeking_venue=seeking_venue,
-      seeking_description=seeking_description)
-      db.session.add(artist)
-      db.session.commit()
-      data['name'] = artist.name
-  #If there's an error, rollback the session
-  except:
-      db.session.rollback()
-      error = True
-  #Close the connection either way
-  finally:
-      db.session.close()
-  #If an error occurred, flash an error message
-  if error:
-      flash('An error occurred and the venue was not listed. Please try again.')
-  #If there was no error, alert the user the venue was listed
-  if not error:
-      # on successful db insert, flash success
-      flash('Artist ' + data['name'] + ' was successfully listed!')
+      artist = create_entity(Artist, artist_details, artist_genres)
+  #If there's an error, it was rolled back; alert the user
+  except SQLAlchemyError:
+      current_app.logger.exception('Failed to list an artist')
+      flash('An error occurred and the artist was not listed. Please try again.')
+      return render_template('pages/home.html')
+
+  index_entity(Artist, artist, artist_genres)
+  cache.invalidate('artists')
+  # on successful db insert, flash success
+  flash('Artist ' + artist['name'] + ' was successfully listed!')
 
   return render_template('pages/home.html')
 
-
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@route('/shows')
+@query_budget(2)
+@read_only
+@conditional.validated(lambda: get_listing_validators('shows'))
+@cache.cached('shows')
 def shows():
-  # displays list of shows at /shows.
-  data = db.session.query(Show.artist_id, Show.venue_id, Show.start_time,
-  Artist.name, Artist.image_link , Venue.name).join(Artist).join(Venue).all()
-  return render_template('pages/shows.html', shows=data)
-
-@app.route('/shows/search', methods=['POST'])
+  # displays list of shows at /shows, a page at a time.
+  page = get_shows_page(current_app.config['PAGE_SIZE'], request.args.get('after'), request.args.get('before'))
+  return render_template('pages/shows.html', shows=page.items, page=page)
+
+@route('/shows/export.<any(csv, ndjson):format>')
+@query_budget(1)
+@read_only
+def export_shows_file(format):
+  # Streams the show calendar, optionally filtered by date range (from, to),
+  # venue_id and artist_id; gzip=1 compresses it on the fly
+  try:
+      filters = parse_filters(request.args)
+  except ExportError:
+      abort(400)
+  gzip = request.args.get('gzip') == '1'
+
+  filename = 'shows.' + format + ('.gz' if gzip else '')
+  response = Response(stream_with_context(export_shows(format, filters, gzip)),
+  mimetype='application/gzip' if gzip else EXPORT_FORMATS[format])
+  response.headers['Content-Disposition'] = 'attachment; filename=' + filename
+  return response
+
+@route('/shows/search', methods=['POST'])
+@query_budget(7)
+@read_only
 def search_shows():
   # Gets the search term from the text field and searches the database
   search_term = request.form.get('search_term', '')
-  search_results = db.session.query(Show.artist_id, Show.venue_id, Show.start_time,
-  Artist.name, Artist.image_link, Venue.name).join(Artist).join(Venue).filter(Artist.name.ilike('%' + search_term + '%') | Venue.name.ilike('%' + search_term + '%')).all()
-  num_search_results = db.session.query(Show.artist_id, Show.venue_id, Show.start_time,
-  Artist.name, Artist.image_link, Venue.name).join(Artist).join(Venue).filter(Artist.name.ilike('%' + search_term + '%') | Venue.name.ilike('%' + search_term + '%')).count()
-  print(search_results)
+  page = get_search_page()
+  results = search.paginate(search.shows(search_term), page)
 
-  return render_template('pages/search_shows.html', shows=search_results, search_term=search_term, num_search_results=num_search_results)
+  return render_template('pages/search_shows.html', shows=results.items, search_term=search_term, num_search_results=results.total, page=results)
 
-@app.route('/shows/create')
+@route('/shows/create')
+@query_budget(0)
 def create_shows():
   # renders form. do not touch.
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@route('/shows/create', methods=['POST'])
+@query_budget(4)
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
-  show_venue = request.form.get('venue_id')
-  show_artist = request.form.get('artist_id')
-  show_time = datetime.strptime(request.form.get('start_time'), '%Y-%m-%d %H:%M:%S')
-
-  error = False
-
-  #Try to add the data to the database
   try:
-      show = Show(venue_id=show_venue, artist_id=show_artist,
-      start_time=show_time)
-      db.session.add(show)
-      db.session.commit()
-  #If there's an error, rollback the session
-  except Exception as e:
-      db.session.rollback()
-      error = True
-      print(e)
-  #Close the connection either way
-  finally:
-      db.session.close()
-  #If an error occurred, flash an error message
-  if error:
+      start_time = datetime.strptime(request.form.get('start_time'), '%Y-%m-%d %H:%M:%S')
+  #If the start time is missing or malformed, show the form again
+  except (TypeError, ValueError):
+      flash('The start time must be given as YYYY-MM-DD HH:MM:SS. Please try again.')
+      return render_template('forms/new_show.html', form=ShowForm()), 400
+
+  show_details = {
+    'venue_id': request.form.get('venue_id'),
+    'artist_id': request.form.get('artist_id'),
+    'start_time': start_time
+  }
+
+  #Try to add the data to the database, in one transaction
+  try:
+      show = create_show(show_details)
+  #If there's an error, it was rolled back; flash an error message
+  except SQLAlchemyError:
+      current_app.logger.exception('Failed to list a show')
       flash('An error occurred and the show was not listed. Please try again.')
-  #If there was no error, alert the user the venue was listed
-  if not error:
-      # on successful db insert, flash success
-      flash('Show was successfully listed!')
+      return render_template('pages/home.html')
+
+  # The venues listing counts upcoming shows
+  cache.invalidate('shows')
+  cache.invalidate('venues')
+  cache.invalidate('venue', show['venue_id'])
+  cache.invalidate('artist', show['artist_id'])
+  # on successful db insert, flash success
+  flash('Show was successfully listed!')
 
   return render_template('pages/home.html')
 
-@app.errorhandler(404)
+@errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
+# wsgi.py serves this instance, and the flask command uses it
+app = create_app()
 
 if not app.debug:
     file_handler = FileHandler('error.log')
@@ -0,0 +1,259 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#
+#   flask assets build [--clean]
+#
+# copies every file under static/ to static/dist/ with a hash of its content
+# in its name, concatenates (and minifies) the stylesheets and scripts of
+# each bundle the same way, writes gzip (and, with the brotli package,
+# brotli) variants of the text files next to them, and lists them all in
+# static/dist/manifest.json. Templates link to assets with
+#
+#   {{ asset_url('img/front-splash.jpg') }}
+#   {% for url in asset_urls('site.css') %}...{% endfor %}
+#
+# which give the built files when there's a manifest and the source files
+# otherwise (e.g. in development). Built files are served with a far-future
+# immutable Cache-Control, so browsers don't request them again, and in the
+# best encoding the browser accepts.
+#----------------------------------------------------------------------------#
+
+# The files of each bundle, relative to the static folder, in load order
+BUNDLES = {
+  'site.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css',
+  'css/main.responsive.css', 'css/main.quickfix.css'],
+  # Loaded in <head>, before the page renders
+  'head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+  # Deferred, after jQuery
+  'site.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js']
+}
+
+# Files worth storing compressed
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.eot', '.ttf', '.otf', '.json')
+
+# Precompressed variants, preferred first: (Content-Encoding, suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+MANIFEST = 'manifest.json'
+
+CSS_STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+CSS_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def minify_css(source):
+  # Drops comments (but not /*! license comments */) and the whitespace the
+  # syntax doesn't need, leaving strings alone
+  parts = CSS_STRING.split(CSS_COMMENT.sub('', source))
+  for i in range(0, len(parts), 2):
+      code = re.sub(r'\s+', ' ', parts[i])
+      code = re.sub(r'\s*([{};,>])\s*', r'\1', code)
+      parts[i] = re.sub(r':\s+', ':', code).replace(';}', '}')
+  return ''.join(parts).strip()
+
+def minify_js(source, name):
+  # Minified libraries are kept as they are. Others only lose indentation,
+  # blank lines and whole-line // comments: anything more needs a parser.
+  if name.endswith('.min.js'):
+      return source.strip()
+  lines = [line.strip() for line in source.splitlines()]
+  return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+def rewrite_css_urls(source, source_name, output_name, files):
+  # Points the url()s of a stylesheet moved from source_name to output_name
+  # (both relative to the static folder) at the built copies of the files
+  # they name, or back at the originals
+  def replace(match):
+      quote, url = match.groups()
+      if re.match(r'^(data:|[a-z]+:|/|#)', url):
+          return match.group(0)
+      path, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+      target = posixpath.normpath(posixpath.join(posixpath.dirname(source_name), path))
+      target = files.get(target, target)
+      return 'url(%s%s%s%s)' % (quote, posixpath.relpath(target, posixpath.dirname(output_name)), suffix, quote)
+  return CSS_URL.sub(replace, source)
+
+
+class AssetBuilder(object):
+
+  def __init__(self, static_folder, output='dist'):
+      self.static_folder = static_folder
+      self.output = output
+      self.written = set()
+
+  def source_files(self):
+      # Every file under the static folder outside the output folder,
+      # relative to it, with the stylesheets last since they refer to others
+      names = []
+      for root, dirs, files in os.walk(self.static_folder):
+          dirs[:] = sorted(name for name in dirs if os.path.join(root, name) != os.path.join(self.static_folder, self.output))
+          for name in sorted(files):
+              if not name.startswith('.'):
+                  names.append(os.path.relpath(os.path.join(root, name), self.static_folder).replace(os.sep, '/'))
+      return sorted(names, key=lambda name: name.endswith('.css'))
+
+  def read(self, name):
+      with open(os.path.join(self.static_folder, name), 'rb') as f:
+          return f.read()
+
+  def write(self, name, data):
+      # Writes data under its hashed name; returns that name
+      stem, extension = posixpath.splitext(name)
+      hashed = posixpath.join(self.output, '%s.%s%s' % (stem, hashlib.sha1(data).hexdigest()[:12], extension))
+      path = os.path.join(self.static_folder, hashed)
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      with open(path, 'wb') as f:
+          f.write(data)
+      self.written.add(hashed)
+      if extension in COMPRESSIBLE:
+          with open(path + '.gz', 'wb') as f:
+              f.write(gzip.compress(data, compresslevel=9, mtime=0))
+          self.written.add(hashed + '.gz')
+          if brotli is not None:
+              with open(path + '.br', 'wb') as f:
+                  f.write(brotli.compress(data))
+              self.written.add(hashed + '.br')
+      return hashed
+
+  def build(self):
+      # Returns the manifest: logical name -> built file, relative to the
+      # static folder
+      manifest = {}
+      for name in self.source_files():
+          data = self.read(name)
+          if name.endswith('.css'):
+              output = posixpath.join(self.output, name)
+              data = rewrite_css_urls(data.decode('utf-8'), name, output, manifest).encode('utf-8')
+          manifest[name] = self.write(name, data)
+
+      for bundle, names in sorted(BUNDLES.items()):
+          output = posixpath.join(self.output, bundle)
+          if bundle.endswith('.css'):
+              data = '\n'.join(minify_css(rewrite_css_urls(self.read(name).decode('utf-8'), name, output, manifest))
+              for name in names)
+          else:
+              # Statements can't run on into the next file
+              data = ';\n'.join(minify_js(self.read(name).decode('utf-8'), name) for name in names)
+          manifest[bundle] = self.write(bundle, data.encode('utf-8'))
+
+      # Written last, so pages only link to files that are in place
+      path = os.path.join(self.static_folder, self.output, MANIFEST)
+      with open(path + '.tmp', 'w') as f:
+          json.dump(manifest, f, indent=2, sort_keys=True)
+      os.replace(path + '.tmp', path)
+      return manifest
+
+  def clean(self):
+      # Removes built files left over from earlier builds; returns how many
+      removed = 0
+      folder = os.path.join(self.static_folder, self.output)
+      for root, dirs, files in os.walk(folder):
+          for name in files:
+              path = os.path.relpath(os.path.join(root, name), self.static_folder).replace(os.sep, '/')
+              if name != MANIFEST and path not in self.written:
+                  os.remove(os.path.join(root, name))
+                  removed += 1
+      return removed
+
+
+class Assets(object):
+
+  def __init__(self, app=None):
+      if app is not None:
+          self.init_app(app)
+
+  def init_app(self, app):
+      app.config.setdefault('ASSETS_FOLDER', 'dist')
+      app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+
+      manifest = {}
+      path = os.path.join(app.static_folder, app.config['ASSETS_FOLDER'], MANIFEST)
+      if os.path.isfile(path):
+          with open(path) as f:
+              manifest = json.load(f)
+      app.extensions['assets'] = manifest
+      # Pages link to the built files, so their ETags change with them
+      if manifest and 'conditional_get' in app.extensions:
+          app.extensions['conditional_get'] += hashlib.sha1(json.dumps(manifest, sort_keys=True).encode('utf-8')).hexdigest()
+
+      app.add_url_rule('%s/%s/<path:filename>' % (app.static_url_path, app.config['ASSETS_FOLDER']),
+      endpoint='asset', view_func=send_asset)
+      app.jinja_env.globals.update(asset_url=asset_url, asset_urls=asset_urls)
+
+
+def asset_url(name):
+  # The URL of a file under static/, built if there's a manifest
+  return url_for('static', filename=current_app.extensions['assets'].get(name, name))
+
+def asset_urls(bundle):
+  # The URLs to load a bundle from: the built bundle, or its source files
+  built = current_app.extensions['assets'].get(bundle)
+  if built is not None:
+      return [url_for('static', filename=built)]
+  return [url_for('static', filename=name) for name in BUNDLES[bundle]]
+
+def send_asset(filename):
+  # Built files never change under the same name, so browsers can keep them
+  # for good; they get the precompressed variant they accept, if any
+  folder = os.path.join(current_app.static_folder, current_app.config['ASSETS_FOLDER'])
+  path = safe_join(folder, filename)
+  encoding = None
+  if path is not None:
+      for name, suffix in ENCODINGS:
+          if name in request.accept_encodings and os.path.isfile(path + suffix):
+              encoding, filename = name, filename + suffix
+              break
+
+  mimetype = mimetypes.guess_type(path or filename)[0] or 'application/octet-stream'
+  response = send_from_directory(folder, filename, mimetype=mimetype, max_age=current_app.config['ASSETS_MAX_AGE'])
+  response.cache_control.public = True
+  response.cache_control.immutable = True
+  if encoding is not None:
+      response.content_encoding = encoding
+  response.vary.add('Accept-Encoding')
+  return response
+
+
+assets = Assets()
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@click.group('assets')
+def assets_command():
+  """Build the static assets."""
+
+@assets_command.command('build')
+@click.option('--clean', is_flag=True, help='Remove files left over from earlier builds.')
+@with_appcontext
+def build_command(clean):
+  """Fingerprint, bundle and compress the files under static/."""
+  builder = AssetBuilder(current_app.static_folder, current_app.config['ASSETS_FOLDER'])
+  manifest = builder.build()
+  click.echo('Built %d assets into %s' % (len(manifest), os.path.join(current_app.static_folder, builder.output)))
+  if brotli is None:
+      click.echo('The brotli package is not installed; only gzip variants were written')
+  if clean:
+      click.echo('Removed %d old files' % builder.clean())
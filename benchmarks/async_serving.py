@@ -0,0 +1,166 @@
+#----------------------------------------------------------------------------#
+# Threaded against gevent workers on I/O-bound routes.
+#
+# Serves the listings, the search pages and the detail pages with gunicorn
+# (gunicorn.conf.py) under a growing number of concurrent clients, with the
+# same number of worker processes each time, so the same memory:
+# - 'threads': gthread workers with --threads threads each;
+# - 'gevent': gevent workers taking up to --connections requests each;
+# - 'gevent+concurrent': the same, with CONCURRENT_QUERIES on.
+# Every statement is delayed by --db-latency milliseconds on the server, as
+# a networked database would be. The delay only lets other requests run
+# under gevent because gevent patches time.sleep, as psycogreen makes
+# psycopg2 yield. Records throughput, latency percentiles, errors and the
+# memory taken by the server's processes.
+#
+#   python -m benchmarks.async_serving [--workers 2] [--threads 4]
+#       [--connections 100] [--clients 8,32,128] [--duration 5]
+#       [--db-latency 20] [--database-url URL]
+#----------------------------------------------------------------------------#
+
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+from benchmarks.common import create_bench_app, seed
+from benchmarks.load_test import ROOT, wait_for_port
+from benchmarks.routes import percentile
+
+REQUESTS = [
+  ('GET', '/venues', None),
+  ('GET', '/artists', None),
+  ('GET', '/shows', None),
+  ('POST', '/venues/search', 'search_term=Venue+12'),
+  ('POST', '/artists/search', 'search_term=Artist+12'),
+  ('POST', '/shows/search', 'search_term=Artist+12'),
+  ('GET', '/venues/1', None),
+  ('GET', '/artists/1', None)
+]
+
+
+def create_app():
+  # The app the server runs, with every statement delayed
+  from sqlalchemy import event
+  from sqlalchemy.engine import Engine
+  from app import app
+
+  latency = float(os.environ.get('BENCH_DB_LATENCY', 0)) / 1000
+  if latency:
+      @event.listens_for(Engine, 'before_cursor_execute')
+      def delay(*args):
+          time.sleep(latency)
+  return app
+
+def server_memory_mb(pid):
+  # The resident memory of the gunicorn master and its workers (Linux only)
+  pids = [pid]
+  try:
+      with open('/proc/%d/task/%d/children' % (pid, pid)) as f:
+          pids += [int(child) for child in f.read().split()]
+      total = 0
+      for process in pids:
+          with open('/proc/%d/status' % process) as f:
+              total += int(next(line for line in f if line.startswith('VmRSS:')).split()[1])
+  except (OSError, StopIteration):
+      return None
+  return total / 1024.0
+
+def run_clients(port, clients, duration):
+  # Each client sends REQUESTS in turn over a keep-alive connection until
+  # the time is up. Returns (latencies, errors).
+  latencies = []
+  errors = [0]
+  lock = threading.Lock()
+  deadline = time.time() + duration
+
+  def client(offset):
+      connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+      own = []
+      failures = 0
+      i = offset
+      while time.time() < deadline:
+          method, path, body = REQUESTS[i % len(REQUESTS)]
+          headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+          started = time.perf_counter()
+          try:
+              connection.request(method, path, body=body, headers=headers)
+              response = connection.getresponse()
+              response.read()
+              failures += response.status != 200
+          except (OSError, http.client.HTTPException):
+              failures += 1
+              connection.close()
+              connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+          own.append(time.perf_counter() - started)
+          i += 1
+      connection.close()
+      with lock:
+          latencies.extend(own)
+          errors[0] += failures
+
+  threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+  for thread in threads:
+      thread.start()
+  for thread in threads:
+      thread.join()
+  return latencies, errors[0]
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--workers', type=int, default=2)
+  parser.add_argument('--threads', type=int, default=4)
+  parser.add_argument('--connections', type=int, default=100)
+  parser.add_argument('--clients', default='8,32,128')
+  parser.add_argument('--duration', type=float, default=5)
+  parser.add_argument('--db-latency', type=float, default=20)
+  parser.add_argument('--port', type=int, default=8767)
+  parser.add_argument('--database-url')
+  args = parser.parse_args()
+
+  app = create_bench_app(args.database_url)
+  seed(app, num_cities=50, num_venues=2000, num_artists=2000, num_shows=20000)
+
+  env = dict(os.environ, DATABASE_URL=app.config['SQLALCHEMY_DATABASE_URI'], SECRET_KEY='async-serving',
+  PORT=str(args.port), WEB_CONCURRENCY=str(args.workers), BENCH_DB_LATENCY=str(args.db_latency),
+  FYYUR_CACHE_BACKEND='null', FYYUR_CONDITIONAL_GET='false')
+  modes = [('threads', dict(env, GUNICORN_WORKER_CLASS='gthread', GUNICORN_THREADS=str(args.threads),
+  DB_POOL_SIZE=str(args.threads)))]
+  try:
+      import gevent
+  except ImportError:
+      print('gevent is not installed; only the threaded mode is measured')
+  else:
+      gevent_env = dict(env, GUNICORN_WORKER_CLASS='gevent', GUNICORN_WORKER_CONNECTIONS=str(args.connections))
+      modes += [('gevent', gevent_env), ('gevent+concurrent', dict(gevent_env, FYYUR_CONCURRENT_QUERIES='true'))]
+
+  print('%d workers, %.0f ms per statement, %gs per run' % (args.workers, args.db_latency, args.duration))
+  print('%18s %8s %9s %8s %8s %8s %11s' % ('mode', 'clients', 'req/s', 'p50 ms', 'p95 ms', 'errors', 'memory MB'))
+  for name, mode_env in modes:
+      # Workers aren't recycled during the run
+      server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+      '--access-logfile', '/dev/null', '--max-requests', '0', 'benchmarks.async_serving:create_app()'],
+      cwd=ROOT, env=mode_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+      try:
+          wait_for_port(args.port)
+          # Warm up every worker (search indexes, genre choices, pools)
+          run_clients(args.port, args.workers * 2, 1)
+          for clients in [int(value) for value in args.clients.split(',')]:
+              started = time.perf_counter()
+              latencies, errors = run_clients(args.port, clients, args.duration)
+              elapsed = time.perf_counter() - started
+              latencies.sort()
+              memory = server_memory_mb(server.pid)
+              print('%18s %8d %9.1f %8.1f %8.1f %8d %11s' % (name, clients, len(latencies) / elapsed,
+              percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000, errors,
+              '%.1f' % memory if memory is not None else '-'))
+      finally:
+          server.terminate()
+          server.wait()
+
+
+if __name__ == '__main__':
+  main()
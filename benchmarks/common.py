@@ -0,0 +1,117 @@
+#----------------------------------------------------------------------------#
+# Shared benchmark setup: a throwaway database, synthetic data and a
+# statement counter.
+#----------------------------------------------------------------------------#
+
+import logging
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+'Funk', 'Hip-Hop', 'Jazz', 'Pop', 'Punk', 'Rock n Roll', 'Soul']
+
+
+def create_bench_app(database_url=None):
+  # Builds an app on a scratch database, in testing mode, and creates the
+  # tables. Every call gets an app of its own.
+  import queries
+  from app import create_app, db, cache, configure_engine
+
+  app = create_app()
+
+  if database_url is None:
+      fd, path = tempfile.mkstemp(prefix='fyyur-bench-', suffix='.db')
+      os.close(fd)
+      database_url = 'sqlite:///' + path
+  app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+  # The pool options were worked out for the configured database
+  app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+  configure_engine(app)
+  app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+  app.config['TESTING'] = True
+  # Report N+1 queries (see instrumentation.py)
+  app.config['QUERY_REPEAT_LIMIT'] = 3
+  app.logger.setLevel(logging.WARNING)
+
+  with app.app_context():
+      db.drop_all()
+      db.create_all()
+      # Nothing cached from a previous database may be served (the cache
+      # may be shared, e.g. CACHE_BACKEND = 'redis')
+      cache.clear()
+  # The genre ids are kept per process
+  queries._genre_ids = None
+
+  return app
+
+
+def seed(app, num_cities, num_venues, num_artists, num_shows, batch_size=5000):
+  # Inserts synthetic rows with executemany, in batches
+  from app import db
+  from models import Venue, Artist, Show, Genre, venue_genres, artist_genres
+  from counters import rebuild_show_counts
+
+  rng = random.Random(1)
+  now = datetime.now()
+  cities = [('City %d' % i, 'S%02d' % (i % 50)) for i in range(num_cities)]
+
+  def genres(foreign_key, count):
+      # Two genres per entity
+      for entity_id in range(1, count + 1):
+          for genre_id in rng.sample(range(1, len(GENRES) + 1), 2):
+              yield {foreign_key: entity_id, 'genre_id': genre_id}
+
+  with app.app_context():
+      _insert(db, Genre.__table__, ({'name': name} for name in GENRES), batch_size)
+      _insert(db, Venue.__table__, ({
+        'name': 'Venue %d' % i,
+        'city': cities[i % num_cities][0],
+        'state': cities[i % num_cities][1],
+        'address': '%d Main St' % i
+      } for i in range(num_venues)), batch_size)
+      _insert(db, venue_genres, genres('venue_id', num_venues), batch_size)
+      _insert(db, Artist.__table__, ({
+        'name': 'Artist %d' % i,
+        'city': cities[i % num_cities][0],
+        'state': cities[i % num_cities][1]
+      } for i in range(num_artists)), batch_size)
+      _insert(db, artist_genres, genres('artist_id', num_artists), batch_size)
+      _insert(db, Show.__table__, ({
+        'venue_id': rng.randint(1, num_venues),
+        'artist_id': rng.randint(1, num_artists),
+        'start_time': now + timedelta(hours=rng.randint(-24 * 365, 24 * 365))
+      } for i in range(num_shows)), batch_size)
+      rebuild_show_counts()
+
+
+def _insert(db, table, rows, batch_size):
+  batch = []
+  for row in rows:
+      batch.append(row)
+      if len(batch) == batch_size:
+          db.session.execute(table.insert(), batch)
+          batch = []
+  if batch:
+      db.session.execute(table.insert(), batch)
+  db.session.commit()
+
+
+class StatementCounter(object):
+  # Counts the statements sent to the database while active
+  def __init__(self, engine):
+      self.engine = engine
+      self.count = 0
+
+  def _count(self, *args, **kwargs):
+      self.count += 1
+
+  def __enter__(self):
+      self.count = 0
+      event.listen(self.engine, 'before_cursor_execute', self._count)
+      return self
+
+  def __exit__(self, *exc):
+      event.remove(self.engine, 'before_cursor_execute', self._count)
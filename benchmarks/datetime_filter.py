@@ -0,0 +1,73 @@
+#----------------------------------------------------------------------------#
+# The datetime template filter over a page's worth of show times.
+#
+# Formats the start times of 10k shows (as datetimes and as strings) with
+# the filter in app.py and with the implementation it replaced, which
+# parsed every value with dateutil and every pattern with Babel. The
+# filter's memo is cleared before each run, so 'cold' only reuses parsed
+# patterns and times repeated within the run.
+#
+#   python -m benchmarks.datetime_filter [--shows 10000] [--runs 5]
+#----------------------------------------------------------------------------#
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+import babel.dates
+import dateutil.parser
+from app import format_datetime, _format_datetime
+
+
+def previous_format_datetime(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format)
+
+def start_times(count):
+  # Shows start on the hour or half hour over two years, so some share
+  # their start time, like on a busy listing
+  rng = random.Random(1)
+  now = datetime.now().replace(minute=0, second=0, microsecond=0)
+  return [now + timedelta(minutes=30 * rng.randint(-24 * 365, 24 * 365)) for i in range(count)]
+
+def best_time(function, values, format, runs, before=None):
+  best = None
+  for i in range(runs):
+      if before is not None:
+          before()
+      started = time.perf_counter()
+      for value in values:
+          function(value, format)
+      elapsed = time.perf_counter() - started
+      best = elapsed if best is None else min(best, elapsed)
+  return best
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--shows', type=int, default=10000)
+  parser.add_argument('--runs', type=int, default=5)
+  args = parser.parse_args()
+
+  times = start_times(args.shows)
+  strings = [str(value) for value in times]
+  print('%d shows, %d distinct start times, best of %d runs' % (len(times), len(set(times)), args.runs))
+  print('%8s %8s %12s %12s %12s' % ('input', 'format', 'previous ms', 'cold ms', 'warm ms'))
+
+  # The previous filter only took strings
+  previous = dict((format, best_time(previous_format_datetime, strings, format, args.runs)) for format in ('medium', 'full'))
+  for label, values in (('datetime', times), ('string', strings)):
+      for format in ('medium', 'full'):
+          for value in values[:100]:
+              assert format_datetime(value, format) == previous_format_datetime(str(value), format)
+          cold = best_time(format_datetime, values, format, args.runs, before=_format_datetime.cache_clear)
+          warm = best_time(format_datetime, values, format, args.runs)
+          print('%8s %8s %12.1f %12.1f %12.1f' % (label, format, previous[format] * 1000, cold * 1000, warm * 1000))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,111 @@
+#----------------------------------------------------------------------------#
+# Load test across worker processes and threads.
+#
+# Seeds a database, then serves the site with gunicorn (gunicorn.conf.py)
+# under each combination of workers and threads and measures the requests
+# per second a pool of concurrent clients gets through. The response cache
+# is disabled so every request reaches the database.
+#
+#   python -m benchmarks.load_test [--workers 1,2,4] [--threads 1,4]
+#       [--clients 16] [--duration 10] [--database-url URL]
+#----------------------------------------------------------------------------#
+
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from benchmarks.common import create_bench_app, seed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1', '/api/v1/shows?limit=50']
+
+
+def wait_for_port(port, timeout=30):
+  deadline = time.time() + timeout
+  while time.time() < deadline:
+      try:
+          socket.create_connection(('127.0.0.1', port), timeout=1).close()
+          return
+      except OSError:
+          time.sleep(0.2)
+  raise RuntimeError('The server did not start on port %d' % port)
+
+def run_clients(port, clients, duration):
+  # Each client requests PATHS in turn over a keep-alive connection until
+  # the time is up. Returns (requests, errors).
+  counts = []
+  deadline = time.time() + duration
+
+  def client(offset):
+      done = errors = 0
+      connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+      i = offset
+      while time.time() < deadline:
+          try:
+              connection.request('GET', PATHS[i % len(PATHS)])
+              response = connection.getresponse()
+              response.read()
+              if response.status != 200:
+                  errors += 1
+          except (OSError, http.client.HTTPException):
+              errors += 1
+              connection.close()
+              connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+          done += 1
+          i += 1
+      connection.close()
+      counts.append((done, errors))
+
+  threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+  for thread in threads:
+      thread.start()
+  for thread in threads:
+      thread.join()
+  return sum(done for done, errors in counts), sum(errors for done, errors in counts)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--workers', default='1,2,4')
+  parser.add_argument('--threads', default='1,4')
+  parser.add_argument('--clients', type=int, default=16)
+  parser.add_argument('--duration', type=float, default=10)
+  parser.add_argument('--port', type=int, default=8765)
+  parser.add_argument('--database-url')
+  args = parser.parse_args()
+
+  app = create_bench_app(args.database_url)
+  seed(app, num_cities=50, num_venues=2000, num_artists=2000, num_shows=20000)
+  database_url = app.config['SQLALCHEMY_DATABASE_URI']
+
+  env = dict(os.environ, DATABASE_URL=database_url, SECRET_KEY='load-test',
+  PORT=str(args.port), FYYUR_CACHE_BACKEND='null', FYYUR_CONDITIONAL_GET='false')
+  print('%d CPUs, %d clients, %.0fs per run' % (os.cpu_count(), args.clients, args.duration))
+  print('%8s %8s %10s %8s' % ('workers', 'threads', 'req/s', 'errors'))
+
+  for workers in [int(value) for value in args.workers.split(',')]:
+      for threads in [int(value) for value in args.threads.split(',')]:
+          run_env = dict(env, WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads),
+          DB_POOL_SIZE=str(max(threads, 1)))
+          server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+          '--access-logfile', '/dev/null', 'wsgi:app'], cwd=ROOT, env=run_env,
+          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+          try:
+              wait_for_port(args.port)
+              # Warm up every worker (search indexes, genre choices, pools)
+              run_clients(args.port, args.clients, 1)
+              started = time.time()
+              done, errors = run_clients(args.port, args.clients, args.duration)
+              elapsed = time.time() - started
+              print('%8d %8d %10.1f %8d' % (workers, threads, done / elapsed, errors))
+          finally:
+              server.terminate()
+              server.wait()
+
+
+if __name__ == '__main__':
+  main()
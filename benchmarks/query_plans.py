@@ -0,0 +1,91 @@
+#----------------------------------------------------------------------------#
+# Query plan check.
+#
+# Drives the read routes against a large seeded database, records the
+# SELECT statements they send, runs EXPLAIN on each and exits non-zero if
+# any of them reads one of the app's tables with a full (sequential) scan.
+#
+#   python -m benchmarks.query_plans [--database-url URL]
+#----------------------------------------------------------------------------#
+
+import argparse
+import re
+import sys
+from sqlalchemy import event
+from benchmarks.common import create_bench_app, seed
+
+TABLES = ('venues', 'artists', 'shows')
+
+GET_ROUTES = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1',
+'/venues/1/edit', '/artists/1/edit']
+SEARCH_ROUTES = [('/venues/search', 'Venue 12'), ('/artists/search', 'Artist 12'),
+('/shows/search', 'Artist 12')]
+
+
+def full_scans(connection, statement, parameters):
+  # Returns the plan lines reading one of TABLES without an index
+  if connection.dialect.name == 'postgresql':
+      plan = [row[0] for row in connection.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+      pattern = re.compile(r'Seq Scan on (%s)\b' % '|'.join(TABLES))
+      return [line for line in plan if pattern.search(line)]
+
+  plan = [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+  pattern = re.compile(r'^SCAN (TABLE )?(%s)\b' % '|'.join(TABLES))
+  return [line for line in plan if pattern.search(line) and 'INDEX' not in line]
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--database-url')
+  parser.add_argument('--venues', type=int, default=20000)
+  parser.add_argument('--artists', type=int, default=20000)
+  parser.add_argument('--shows', type=int, default=200000)
+  args = parser.parse_args()
+
+  app = create_bench_app(args.database_url)
+  seed(app, num_cities=500, num_venues=args.venues, num_artists=args.artists,
+  num_shows=args.shows)
+
+  from app import db
+  with app.app_context():
+      engine = db.engine
+      with engine.begin() as connection:
+          connection.exec_driver_sql('ANALYZE')
+
+  # The n-gram search backend loads its index with one full read on first
+  # use; build it before recording
+  client = app.test_client()
+  for route, term in SEARCH_ROUTES:
+      client.post(route, data={'search_term': term})
+
+  statements = {}
+
+  def record(conn, cursor, statement, parameters, context, executemany):
+      if statement.lstrip().upper().startswith('SELECT'):
+          statements.setdefault(statement, (record.route, parameters))
+  record.route = None
+
+  event.listen(engine, 'before_cursor_execute', record)
+  for route in GET_ROUTES:
+      record.route = 'GET ' + route
+      assert client.get(route).status_code == 200, route
+  for route, term in SEARCH_ROUTES:
+      record.route = 'POST ' + route
+      assert client.post(route, data={'search_term': term}).status_code == 200, route
+  event.remove(engine, 'before_cursor_execute', record)
+
+  failed = False
+  with engine.connect() as connection:
+      for statement, (route, parameters) in statements.items():
+          scans = full_scans(connection, statement, parameters)
+          if scans:
+              failed = True
+              print('%s: full scan in\n  %s\n  %s' % (route, ' '.join(statement.split()), '\n  '.join(scans)))
+
+  print('%d statements checked, %s' % (len(statements), 'full scans found' if failed else 'no full scans'))
+  if failed:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,301 @@
+#----------------------------------------------------------------------------#
+# Latency of every route, with a baseline to compare against.
+#
+# Seeds a synthetic dataset, then times each read and create route of the
+# site and of the API
+# - through the Flask test client, one request at a time: latency
+#   percentiles, requests per second and statements per request;
+# - with --http, over HTTP against gunicorn (gunicorn.conf.py) with a pool of
+#   concurrent clients: latency percentiles, throughput and errors.
+# The response cache and conditional GETs are off, so every request renders
+# its page. The results, with the peak RSS of this process and of the
+# server, are written as JSON with --output; --compare reads such a file
+# and exits with 1 if a route got slower by more than --tolerance, or sends
+# more statements, than in it. Baselines only compare on the same machine,
+# database and dataset.
+#
+#   python -m benchmarks.routes [--size small|medium|large] [--venues N]
+#       [--artists N] [--shows N] [--requests 200] [--http] [--clients 8]
+#       [--duration 5] [--database-url URL] [--output FILE] [--compare FILE]
+#       [--tolerance 0.25]
+#
+# 'large' (10k venues, 100k artists, 5M shows) takes a while to seed; point
+# --database-url at a local PostgreSQL database to measure against it.
+#----------------------------------------------------------------------------#
+
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from benchmarks.common import create_bench_app, seed, StatementCounter
+from benchmarks.load_test import ROOT, wait_for_port
+
+# Dataset sizes: (cities, venues, artists, shows)
+SIZES = {
+  'small': (50, 500, 500, 5000),
+  'medium': (200, 10000, 10000, 100000),
+  'large': (1000, 10000, 100000, 5000000)
+}
+
+START_TIME = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+
+ENTITY_FORM = {
+  'name': 'Benchmark', 'city': 'City 1', 'state': 'S01', 'address': '1 Main St',
+  'phone': '555-555-5555', 'genres': ['Jazz', 'Rock n Roll'],
+  'facebook_link': 'https://www.facebook.com/benchmark', 'website': 'https://example.com'
+}
+
+# (method, path, form data). Edits and deletes are left out: each request
+# would change what the next one does.
+ROUTES = [
+  ('GET', '/', None),
+  ('GET', '/venues', None),
+  ('GET', '/venues?genre=Jazz', None),
+  ('POST', '/venues/search', {'search_term': 'Venue 12'}),
+  ('GET', '/venues/1', None),
+  ('GET', '/venues/create', None),
+  ('POST', '/venues/create', ENTITY_FORM),
+  ('GET', '/venues/1/edit', None),
+  ('GET', '/artists', None),
+  ('GET', '/artists?genre=Jazz', None),
+  ('POST', '/artists/search', {'search_term': 'Artist 12'}),
+  ('GET', '/artists/1', None),
+  ('GET', '/artists/create', None),
+  ('POST', '/artists/create', ENTITY_FORM),
+  ('GET', '/artists/1/edit', None),
+  ('GET', '/shows', None),
+  ('GET', '/shows/export.csv?venue_id=1', None),
+  ('POST', '/shows/search', {'search_term': 'Artist 12'}),
+  ('GET', '/shows/create', None),
+  ('POST', '/shows/create', {'venue_id': '1', 'artist_id': '1', 'start_time': START_TIME}),
+  ('GET', '/api/v1/venues', None),
+  ('GET', '/api/v1/artists?fields=id,name,genres', None),
+  ('GET', '/api/v1/shows?limit=50', None),
+  ('GET', '/api/v1/venues/1', None)
+]
+
+
+def percentile(ordered, p):
+  # Nearest-rank percentile of a sorted list
+  return ordered[max(int(math.ceil(p / 100.0 * len(ordered))) - 1, 0)]
+
+def summarize(latencies, elapsed):
+  ordered = sorted(latencies)
+  return {
+    'requests': len(ordered),
+    'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+    'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+    'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+    'throughput': round(len(ordered) / elapsed, 1)
+  }
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+  # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+  peak = resource.getrusage(who).ru_maxrss
+  return round(peak / (1024.0 * 1024 if sys.platform == 'darwin' else 1024.0), 1)
+
+def route_name(method, path):
+  return '%s %s' % (method, path)
+
+
+def run_test_client(app, engine, requests, warmup):
+  client = app.test_client()
+  results = {}
+  for method, path, data in ROUTES:
+      for i in range(warmup):
+          client.open(path, method=method, data=data).get_data()
+      latencies = []
+      with StatementCounter(engine) as counter:
+          started = time.perf_counter()
+          for i in range(requests):
+              request_started = time.perf_counter()
+              response = client.open(path, method=method, data=data)
+              response.get_data()
+              latencies.append(time.perf_counter() - request_started)
+              if response.status_code >= 400:
+                  raise SystemExit('%s %s answered %d' % (method, path, response.status_code))
+          elapsed = time.perf_counter() - started
+      result = summarize(latencies, elapsed)
+      result['statements'] = round(counter.count / float(requests), 1)
+      results[route_name(method, path)] = result
+      print('%-44s %8.2f %8.2f %8.2f %9.1f %6.1f' % (route_name(method, path), result['p50_ms'],
+      result['p95_ms'], result['p99_ms'], result['throughput'], result['statements']))
+  return results
+
+def run_http(port, clients, duration, warmup):
+  # Each client sends warmup requests to the route, then requests it over a
+  # keep-alive connection until the time is up
+  results = {}
+  for method, path, data in ROUTES:
+      body = urlencode(data, doseq=True) if data is not None else None
+      headers = {'Content-Type': 'application/x-www-form-urlencoded'} if data is not None else {}
+      latencies = []
+      errors = [0]
+      lock = threading.Lock()
+      timing = {}
+      # Timing starts once every client is warmed up
+      ready = threading.Barrier(clients, action=lambda: timing.update(started=time.perf_counter(),
+      deadline=time.time() + duration))
+
+      def client():
+          connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+          own = []
+          failures = 0
+          for i in range(warmup):
+              connection.request(method, path, body=body, headers=headers)
+              connection.getresponse().read()
+          ready.wait()
+          while time.time() < timing['deadline']:
+              started = time.perf_counter()
+              try:
+                  connection.request(method, path, body=body, headers=headers)
+                  response = connection.getresponse()
+                  response.read()
+                  failures += response.status >= 400
+              except (OSError, http.client.HTTPException):
+                  failures += 1
+                  connection.close()
+                  connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+              own.append(time.perf_counter() - started)
+          connection.close()
+          with lock:
+              latencies.extend(own)
+              errors[0] += failures
+
+      threads = [threading.Thread(target=client) for i in range(clients)]
+      for thread in threads:
+          thread.start()
+      for thread in threads:
+          thread.join()
+      result = summarize(latencies, time.perf_counter() - timing['started'])
+      result['errors'] = errors[0]
+      results[route_name(method, path)] = result
+      print('%-44s %8.2f %8.2f %8.2f %9.1f %6d' % (route_name(method, path), result['p50_ms'],
+      result['p95_ms'], result['p99_ms'], result['throughput'], result['errors']))
+  return results
+
+def compare(baseline, current, tolerance):
+  # Returns the regressions of current against baseline
+  regressions = []
+  for mode in ('test_client', 'http'):
+      for route, result in sorted(current.get(mode, {}).items()):
+          before = baseline.get(mode, {}).get(route)
+          if before is None:
+              continue
+          for key in ('p50_ms', 'p95_ms'):
+              if result[key] > before[key] * (1 + tolerance):
+                  regressions.append('%s %s: %s %.2f -> %.2f' % (mode, route, key, before[key], result[key]))
+          if 'statements' in before and result['statements'] > before['statements']:
+              regressions.append('%s %s: statements %.1f -> %.1f' % (mode, route, before['statements'], result['statements']))
+  return regressions
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--size', choices=sorted(SIZES), default='small')
+  parser.add_argument('--venues', type=int)
+  parser.add_argument('--artists', type=int)
+  parser.add_argument('--shows', type=int)
+  parser.add_argument('--requests', type=int, default=200)
+  parser.add_argument('--warmup', type=int, default=5)
+  parser.add_argument('--http', action='store_true')
+  parser.add_argument('--clients', type=int, default=8)
+  parser.add_argument('--workers', type=int, default=2)
+  parser.add_argument('--threads', type=int, default=4)
+  parser.add_argument('--duration', type=float, default=5)
+  parser.add_argument('--port', type=int, default=8766)
+  parser.add_argument('--database-url')
+  parser.add_argument('--output')
+  parser.add_argument('--compare')
+  parser.add_argument('--tolerance', type=float, default=0.25)
+  args = parser.parse_args()
+
+  cities, venues, artists, shows = SIZES[args.size]
+  dataset = {
+    'cities': cities,
+    'venues': args.venues or venues,
+    'artists': args.artists or artists,
+    'shows': args.shows or shows
+  }
+
+  # Read when the app module is imported, by create_bench_app
+  os.environ['FYYUR_CACHE_BACKEND'] = 'null'
+  os.environ['FYYUR_CONDITIONAL_GET'] = 'false'
+  app = create_bench_app(args.database_url)
+  started = time.perf_counter()
+  seed(app, num_cities=dataset['cities'], num_venues=dataset['venues'], num_artists=dataset['artists'],
+  num_shows=dataset['shows'])
+  print('Seeded %(venues)d venues, %(artists)d artists and %(shows)d shows' % dataset
+  + ' in %.1fs' % (time.perf_counter() - started))
+  app.config['WTF_CSRF_ENABLED'] = False
+
+  from app import db
+  with app.app_context():
+      engine = db.engine
+  report = {
+    'created': datetime.now().isoformat(timespec='seconds'),
+    'environment': {
+      'python': platform.python_version(),
+      'platform': platform.platform(),
+      'cpus': os.cpu_count(),
+      'database': engine.dialect.name
+    },
+    'dataset': dataset
+  }
+
+  print('\nTest client, %d requests per route' % args.requests)
+  print('%-44s %8s %8s %8s %9s %6s' % ('route', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'stmts'))
+  report['test_client'] = run_test_client(app, engine, args.requests, args.warmup)
+  report['peak_rss_mb'] = peak_rss_mb()
+
+  if args.http:
+      env = dict(os.environ, DATABASE_URL=app.config['SQLALCHEMY_DATABASE_URI'], SECRET_KEY='benchmark',
+      PORT=str(args.port), WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads),
+      DB_POOL_SIZE=str(args.threads), FYYUR_WTF_CSRF_ENABLED='false')
+      # Workers aren't recycled during the run, which would drop connections
+      # and start cold workers
+      server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+      '--access-logfile', '/dev/null', '--max-requests', '0', 'wsgi:app'], cwd=ROOT, env=env,
+      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+      try:
+          wait_for_port(args.port)
+          print('\nHTTP, %d workers x %d threads, %d clients, %gs per route' % (args.workers,
+          args.threads, args.clients, args.duration))
+          print('%-44s %8s %8s %8s %9s %6s' % ('route', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'errors'))
+          report['http'] = run_http(args.port, args.clients, args.duration, args.warmup)
+      finally:
+          server.terminate()
+          server.wait()
+      # The largest of the server's processes
+      report['server_peak_rss_mb'] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+
+  print('\nPeak RSS: %.1f MB' % report['peak_rss_mb']
+  + (', server %.1f MB' % report['server_peak_rss_mb'] if args.http else ''))
+
+  if args.output:
+      with open(args.output, 'w') as f:
+          json.dump(report, f, indent=2, sort_keys=True)
+          f.write('\n')
+  if args.compare:
+      with open(args.compare) as f:
+          baseline = json.load(f)
+      if baseline.get('dataset') != dataset:
+          print('The baseline was taken with a different dataset: %s' % baseline.get('dataset'))
+      regressions = compare(baseline, report, args.tolerance)
+      for regression in regressions:
+          print(regression)
+      if regressions:
+          sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
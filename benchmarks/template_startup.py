@@ -0,0 +1,84 @@
+#----------------------------------------------------------------------------#
+# Cold start with and without the template cache.
+#
+# Starts the app in a fresh interpreter for each run, the way a new worker
+# process starts, and times the import of app.py and the first request to
+# each page (each using different templates), with templates:
+# - 'source': compiled from source on first use
+# - 'bytecode': loaded from a TEMPLATE_CACHE_DIR warmed beforehand
+# - 'preload': loaded from that directory while the app starts
+# The response cache and conditional GETs are off so every page renders.
+#
+#   python -m benchmarks.template_startup [--runs 5]
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.common import create_bench_app, seed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ['/', '/venues', '/artists', '/shows', '/venues/1', '/artists/1',
+'/venues/1/edit', '/artists/1/edit', '/venues/create', '/artists/create', '/shows/create']
+
+
+def child():
+  # Runs in the fresh interpreter; prints the timings as JSON
+  started = time.perf_counter()
+  from app import app
+  imported = time.perf_counter()
+  client = app.test_client()
+  for path in PATHS:
+      response = client.get(path)
+      if response.status_code != 200:
+          raise SystemExit('%s answered %d' % (path, response.status_code))
+  done = time.perf_counter()
+  print(json.dumps({'startup': imported - started, 'first_requests': done - imported}))
+
+def run(env):
+  output = subprocess.run([sys.executable, '-m', 'benchmarks.template_startup', '--child'],
+  cwd=ROOT, env=env, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+  return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--runs', type=int, default=5)
+  parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+  args = parser.parse_args()
+  if args.child:
+      return child()
+
+  app = create_bench_app()
+  seed(app, num_cities=10, num_venues=100, num_artists=100, num_shows=1000)
+  cache_dir = tempfile.mkdtemp(prefix='fyyur-templates-')
+  env = dict(os.environ, DATABASE_URL=app.config['SQLALCHEMY_DATABASE_URI'], SECRET_KEY='bench',
+  FYYUR_CACHE_BACKEND='null', FYYUR_CONDITIONAL_GET='false', FYYUR_PRELOAD_TEMPLATES='false')
+  modes = [
+    ('source', dict(env, FYYUR_TEMPLATE_CACHE_DIR='null')),
+    ('bytecode', dict(env, FYYUR_TEMPLATE_CACHE_DIR=cache_dir)),
+    ('preload', dict(env, FYYUR_TEMPLATE_CACHE_DIR=cache_dir, FYYUR_PRELOAD_TEMPLATES='true'))
+  ]
+
+  try:
+      # What `flask templates warm` does at build time
+      run(modes[2][1])
+      print('%d pages, median of %d runs' % (len(PATHS), args.runs))
+      print('%10s %12s %16s %10s' % ('templates', 'startup ms', 'first pages ms', 'total ms'))
+      for name, mode_env in modes:
+          timings = [run(mode_env) for i in range(args.runs)]
+          startup = statistics.median(timing['startup'] for timing in timings) * 1000
+          first = statistics.median(timing['first_requests'] for timing in timings) * 1000
+          print('%10s %12.1f %16.1f %10.1f' % (name, startup, first, startup + first))
+  finally:
+      shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+  main()
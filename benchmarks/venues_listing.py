@@ -0,0 +1,46 @@
+#----------------------------------------------------------------------------#
+# /venues listing benchmark.
+#
+# Seeds thousands of venues across a growing number of cities and checks that
+# the number of statements per request stays the same.
+#
+#   python -m benchmarks.venues_listing
+#----------------------------------------------------------------------------#
+
+import sys
+import time
+from benchmarks.common import create_bench_app, seed, StatementCounter
+
+CITY_COUNTS = [10, 100, 500]
+VENUES = 5000
+
+
+def main():
+  query_counts = set()
+
+  for num_cities in CITY_COUNTS:
+      app = create_bench_app()
+      seed(app, num_cities=num_cities, num_venues=VENUES, num_artists=1000,
+      num_shows=20000)
+
+      from app import db
+      client = app.test_client()
+      with app.app_context():
+          engine = db.engine
+      with StatementCounter(engine) as counter:
+          started = time.perf_counter()
+          response = client.get('/venues')
+          elapsed = time.perf_counter() - started
+
+      assert response.status_code == 200, response.status_code
+      query_counts.add(counter.count)
+      print('%4d cities, %d venues: %d queries, %.1f ms' % (num_cities, VENUES,
+      counter.count, elapsed * 1000))
+
+  if len(query_counts) != 1:
+      print('Query count depends on the number of cities: %s' % sorted(query_counts))
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,289 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import socket
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlparse
+from flask import current_app, request, session, Response
+
+#----------------------------------------------------------------------------#
+# Response cache.
+#
+# Caches rendered GET pages. Every entry belongs to a namespace made of the
+# page's scope and, for detail pages, the entity id ('venue:4'), so the write
+# controllers can invalidate exactly the pages a change affects. Backends:
+# - 'simple': an in-process LRU with a TTL and a maximum number of entries.
+#   Each worker process has its own, so invalidation only reaches the
+#   process handling the write; other workers catch up when entries expire.
+# - 'redis': any server speaking the Redis protocol, shared by all workers.
+# - 'null': caching disabled.
+#----------------------------------------------------------------------------#
+
+# Request environ key set by code that knows a page mustn't be cached, e.g.
+# replicas.py when the page was read from a replica that may be behind
+NO_STORE = 'fyyur.cache.no_store'
+
+
+class CacheStats(object):
+
+  def __init__(self):
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0
+
+  def as_dict(self):
+      return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class NullCache(object):
+
+  def __init__(self, stats):
+      self.stats = stats
+
+  def get(self, key):
+      return None
+
+  def set(self, namespace, key, value, timeout):
+      pass
+
+  def delete_namespace(self, namespace):
+      pass
+
+  def clear(self):
+      pass
+
+
+class LRUCache(object):
+  # Entries are (expiry time, namespace, value), most recently used last.
+  # Expired entries are dropped when looked up; when the cache is full the
+  # least recently used entry makes room.
+
+  def __init__(self, stats, max_entries=1000):
+      self.stats = stats
+      self.max_entries = max_entries
+      self.entries = OrderedDict()
+      self.namespaces = {}
+      self.lock = threading.Lock()
+
+  def get(self, key):
+      with self.lock:
+          entry = self.entries.get(key)
+          if entry is None:
+              return None
+          if entry[0] <= time.time():
+              self._remove(key)
+              self.stats.evictions += 1
+              return None
+          self.entries.move_to_end(key)
+          return entry[2]
+
+  def set(self, namespace, key, value, timeout):
+      with self.lock:
+          if key in self.entries:
+              self._remove(key)
+          while len(self.entries) >= self.max_entries:
+              self._remove(next(iter(self.entries)))
+              self.stats.evictions += 1
+          self.entries[key] = (time.time() + timeout, namespace, value)
+          self.namespaces.setdefault(namespace, set()).add(key)
+
+  def delete_namespace(self, namespace):
+      with self.lock:
+          for key in list(self.namespaces.get(namespace, ())):
+              self._remove(key)
+
+  def clear(self):
+      with self.lock:
+          self.entries.clear()
+          self.namespaces.clear()
+
+  def _remove(self, key):
+      expiry, namespace, value = self.entries.pop(key)
+      keys = self.namespaces[namespace]
+      keys.discard(key)
+      if not keys:
+          del self.namespaces[namespace]
+
+
+class RedisConnectionError(Exception):
+  pass
+
+
+class RedisCache(object):
+  # Minimal client for the Redis protocol (RESP). Each namespace has a set
+  # listing its keys, so it can be invalidated without scanning the keyspace.
+  # Connection errors are treated as misses, so the site keeps working
+  # (uncached) when the server is down.
+
+  def __init__(self, stats, url='redis://localhost:6379/0', prefix='fyyur:'):
+      self.stats = stats
+      parsed = urlparse(url)
+      self.address = (parsed.hostname or 'localhost', parsed.port or 6379)
+      self.database = int(parsed.path.strip('/') or 0)
+      self.prefix = prefix
+      self.local = threading.local()
+
+  def get(self, key):
+      try:
+          return self.command('GET', self.prefix + key)
+      except RedisConnectionError:
+          return None
+
+  def set(self, namespace, key, value, timeout):
+      members = self.prefix + 'namespace:' + namespace
+      try:
+          self.command('SET', self.prefix + key, value, 'PX', int(timeout * 1000))
+          self.command('SADD', members, key)
+          self.command('PEXPIRE', members, int(timeout * 1000))
+      except RedisConnectionError:
+          pass
+
+  def delete_namespace(self, namespace):
+      members = self.prefix + 'namespace:' + namespace
+      try:
+          keys = self.command('SMEMBERS', members) or []
+          self.command('DEL', members, *[self.prefix + key.decode('utf-8') for key in keys])
+      except RedisConnectionError:
+          pass
+
+  def clear(self):
+      try:
+          keys = self.command('KEYS', self.prefix + '*') or []
+          if keys:
+              self.command('DEL', *keys)
+      except RedisConnectionError:
+          pass
+
+  def connection(self):
+      # One connection per thread
+      connection = getattr(self.local, 'connection', None)
+      if connection is None:
+          connection = socket.create_connection(self.address, timeout=1)
+          self.local.connection = connection
+          self.local.reader = connection.makefile('rb')
+          if self.database:
+              self.send('SELECT', self.database)
+      return connection
+
+  def command(self, *args):
+      try:
+          self.connection()
+          return self.send(*args)
+      except (OSError, socket.timeout) as e:
+          self.disconnect()
+          raise RedisConnectionError(str(e))
+
+  def send(self, *args):
+      parts = [b'*%d\r\n' % len(args)]
+      for arg in args:
+          if not isinstance(arg, bytes):
+              arg = str(arg).encode('utf-8')
+          parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+      self.local.connection.sendall(b''.join(parts))
+      return self.read_reply()
+
+  def read_reply(self):
+      line = self.local.reader.readline()
+      if not line:
+          raise OSError('Connection closed by the server')
+      kind, data = line[:1], line[1:-2]
+      if kind == b'+':
+          return data
+      if kind == b'-':
+          raise OSError(data.decode('utf-8'))
+      if kind == b':':
+          return int(data)
+      if kind == b'$':
+          length = int(data)
+          if length == -1:
+              return None
+          return self.local.reader.read(length + 2)[:-2]
+      if kind == b'*':
+          length = int(data)
+          if length == -1:
+              return None
+          return [self.read_reply() for i in range(length)]
+      raise OSError('Unexpected reply from the server: %r' % line)
+
+  def disconnect(self):
+      connection = getattr(self.local, 'connection', None)
+      if connection is not None:
+          try:
+              connection.close()
+          except OSError:
+              pass
+      self.local.connection = None
+
+
+class ResponseCache(object):
+  # Flask extension caching rendered pages
+
+  def __init__(self, app=None):
+      if app is not None:
+          self.init_app(app)
+
+  def init_app(self, app):
+      app.config.setdefault('CACHE_BACKEND', 'simple')
+      app.config.setdefault('CACHE_DEFAULT_TIMEOUT', 300)
+      app.config.setdefault('CACHE_MAX_ENTRIES', 1000)
+      app.config.setdefault('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+      stats = CacheStats()
+      backend = app.config['CACHE_BACKEND']
+      if backend == 'simple':
+          store = LRUCache(stats, app.config['CACHE_MAX_ENTRIES'])
+      elif backend == 'redis':
+          store = RedisCache(stats, app.config['CACHE_REDIS_URL'])
+      else:
+          store = NullCache(stats)
+      app.extensions['response_cache'] = store
+
+  @property
+  def store(self):
+      return current_app.extensions['response_cache']
+
+  @property
+  def stats(self):
+      return self.store.stats
+
+  def cached(self, scope, id_arg=None, timeout=None):
+      # Caches the view's page under the namespace scope (or scope:<id>, with
+      # the id taken from the view argument id_arg). The query string is part
+      # of the key, so every page of a listing is cached separately.
+      def decorator(view):
+          @wraps(view)
+          def wrapper(*args, **kwargs):
+              namespace = scope if id_arg is None else '%s:%s' % (scope, kwargs[id_arg])
+              # Pages showing flashed messages are specific to one visitor
+              if request.method != 'GET' or '_flashes' in session:
+                  return view(*args, **kwargs)
+
+              key = namespace + ':' + request.full_path
+              store = self.store
+              cached = store.get(key)
+              if cached is not None:
+                  store.stats.hits += 1
+                  content_type, body = cached.split(b'\n', 1)
+                  return Response(body, content_type=content_type.decode('utf-8'))
+
+              store.stats.misses += 1
+              response = current_app.make_response(view(*args, **kwargs))
+              if response.status_code == 200 and not response.direct_passthrough and not request.environ.get(NO_STORE):
+                  store.set(namespace, key, response.content_type.encode('utf-8') + b'\n' + response.get_data(),
+                  timeout or current_app.config['CACHE_DEFAULT_TIMEOUT'])
+              return response
+          return wrapper
+      return decorator
+
+  def invalidate(self, scope, entity_id=None):
+      self.store.delete_namespace(scope if entity_id is None else '%s:%s' % (scope, entity_id))
+
+  def clear(self):
+      self.store.clear()
+
+
+cache = ResponseCache()
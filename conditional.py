@@ -0,0 +1,84 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import hashlib
+import os
+from datetime import datetime
+from functools import wraps
+from flask import current_app, request, session
+from werkzeug.http import is_resource_modified
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#
+# Pages get a strong ETag derived from the updated_at timestamps and counts
+# of the rows they show, looked up by a cheap aggregate query before the
+# view runs. When the client's copy is still current the view (and its
+# template) is skipped and a 304 is returned. The ETag also covers the
+# templates, so a deploy changing them doesn't leave clients with stale
+# pages. There's no Last-Modified: deleting rows doesn't move the newest
+# timestamp, so a date alone would have clients keep deleted rows.
+#----------------------------------------------------------------------------#
+
+def _fingerprint_templates(folder):
+  digest = hashlib.sha1()
+  for root, dirs, files in sorted(os.walk(folder)):
+      dirs.sort()
+      for name in sorted(files):
+          path = os.path.join(root, name)
+          digest.update(os.path.relpath(path, folder).encode('utf-8'))
+          with open(path, 'rb') as template:
+              digest.update(template.read())
+  return digest.hexdigest()
+
+def make_etag(values, salt=''):
+  data = repr([value.isoformat() if isinstance(value, datetime) else value for value in values])
+  return hashlib.sha1((salt + data).encode('utf-8')).hexdigest()
+
+
+class ConditionalGet(object):
+  # Flask extension answering conditional GETs from page validators
+
+  def __init__(self, app=None):
+      if app is not None:
+          self.init_app(app)
+
+  def init_app(self, app):
+      app.config.setdefault('CONDITIONAL_GET', True)
+      folder = os.path.join(app.root_path, app.template_folder)
+      app.extensions['conditional_get'] = _fingerprint_templates(folder) if os.path.isdir(folder) else ''
+
+  def validated(self, get_validators):
+      # get_validators is called with the view's arguments and returns the
+      # values the page depends on, or None if the page doesn't exist (the
+      # view then handles it as usual).
+      def decorator(view):
+          @wraps(view)
+          def wrapper(*args, **kwargs):
+              # Pages showing flashed messages are specific to one visitor
+              if (request.method not in ('GET', 'HEAD') or '_flashes' in session
+              or not current_app.config['CONDITIONAL_GET']):
+                  return view(*args, **kwargs)
+
+              values = get_validators(**kwargs)
+              if values is None:
+                  return view(*args, **kwargs)
+              etag = make_etag(values, current_app.extensions['conditional_get'])
+
+              if not is_resource_modified(request.environ, etag=etag):
+                  response = current_app.response_class(status=304)
+              else:
+                  response = current_app.make_response(view(*args, **kwargs))
+                  if response.status_code != 200:
+                      return response
+
+              response.set_etag(etag)
+              # Let clients keep the page, but have them check it's current
+              response.cache_control.no_cache = True
+              return response
+          return wrapper
+      return decorator
+
+
+conditional = ConditionalGet()
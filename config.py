@@ -1,13 +1,79 @@
 import os
-SECRET_KEY = os.urandom(32)
+# Must be the same for every worker process, or sessions (and flashed
+# messages) only work on the worker that created them. Set it in the
+# environment in production; see create_app in app.py.
+SECRET_KEY = os.environ.get('SECRET_KEY')
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
+# Debug mode follows the environment (FLASK_ENV=development or FLASK_DEBUG=1)
+
+# Number of rows per page on the venues, artists and shows listings
+PAGE_SIZE = 30
+
+# Maximum number of past and of upcoming shows listed on a venue or artist
+# page; the rest are reached through "show more" links. None lists them all.
+DETAIL_SHOWS_LIMIT = 21
 
 # Connect to the database
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', '<Put your local database url>')
+# Some hosts still hand out the postgres:// scheme, which SQLAlchemy dropped
+if SQLALCHEMY_DATABASE_URI.startswith('postgres://'):
+    SQLALCHEMY_DATABASE_URI = 'postgresql://' + SQLALCHEMY_DATABASE_URI[len('postgres://'):]
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool, per worker process. pool_size should cover the worker's
+# threads (GUNICORN_THREADS), with max_overflow absorbing bursts; the total
+# over all workers has to stay under the database's max_connections.
+# Connections are checked before use and replaced after pool_recycle
+# seconds, so ones dropped by the server or a proxy aren't handed out.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+
+# Read replicas: binds in SQLALCHEMY_BINDS whose key starts with 'replica',
+# e.g. FYYUR_SQLALCHEMY_BINDS='{"replica1": "postgresql://..."}'. Read-only
+# views read from one of them, picked 'round-robin' or by 'least-latency';
+# a visitor that wrote reads from the primary for REPLICA_STICKY_SECONDS,
+# which should cover the replicas' lag. See replicas.py.
+REPLICA_SELECTION = 'round-robin'
+REPLICA_STICKY_SECONDS = 10
+
+# Run the independent queries of a page (e.g. a venue's shows and its
+# genres) at the same time, each on its own connection. It saves a round
+# trip on a networked database but takes more connections per request,
+# so raise DB_POOL_SIZE along with it; see run_concurrently in queries.py.
+CONCURRENT_QUERIES = False
+
+# Compiled templates are kept here, so worker processes don't compile them
+# from source; fill it at build time with `flask templates warm`. None
+# compiles templates in memory only.
+TEMPLATE_CACHE_DIR = os.path.join(basedir, '.template_cache')
+# Load every template when the app starts instead of on first use
+PRELOAD_TEMPLATES = False
+
+# Times a write transaction is run again after the database aborted it
+# because of concurrent transactions (see unit_of_work.py)
+TRANSACTION_RETRIES = 3
 
+# Request instrumentation (see instrumentation.py). Server-Timing headers
+# carry each response's database and template time; REQUEST_LOG writes a
+# JSON line per request to stderr; requests slower than
+# SLOW_REQUEST_SECONDS are logged as warnings with their slowest statement.
+# Prometheus metrics are served at METRICS_URL, which is off (None) by
+# default as the page has no access control of its own. When turning it on,
+# e.g. FYYUR_METRICS_URL=/metrics, keep it away from the public at the proxy.
+SERVER_TIMING = True
+REQUEST_LOG = False
+SLOW_REQUEST_SECONDS = 1.0
+METRICS_URL = None
+# Most times a request may send the same statement (with any parameters)
+# before it's reported as an N+1 query. Shaping every statement costs a
+# little, so it's off here and on in the tests and benchmarks, whose app is
+# set up by create_bench_app in benchmarks/common.py
+QUERY_REPEAT_LIMIT = None
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = '<Put your local database url>'
+# Any other setting can be overridden with an environment variable named
+# after it with a FYYUR_ prefix, e.g. FYYUR_CACHE_BACKEND=redis
@@ -0,0 +1,150 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from collections import defaultdict
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from cache import cache
+from models import db, Venue, Artist, Show, ShowCountClock
+from unit_of_work import transactional
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#
+# Venues and artists carry their numbers of upcoming and past shows, so the
+# listings don't have to count shows. The counters are as of the time kept
+# in ShowCountClock rather than of the current time: writers adjust them as
+# shows are added and deleted, and
+#
+#   flask counters rollover
+#
+# (run every few minutes, e.g. from cron) moves the shows that started since
+# then from the upcoming to the past counters and moves the clock forward.
+# Writers share-lock the clock and rollover locks it exclusively, so a show
+# is never counted against a clock that's moving. If the counters drift
+# anyway (rows written around the app), they're recounted with
+#
+#   flask counters check [--fix]
+#----------------------------------------------------------------------------#
+
+# The Show column pointing at each model
+SHOW_KEYS = {Venue: Show.venue_id, Artist: Show.artist_id}
+
+
+def get_clock(exclusive=False):
+  # The counters' as-of time, locked until the end of the transaction on
+  # databases with row locks: shared by writers, exclusive for rollover
+  return db.session.query(ShowCountClock.as_of).filter(ShowCountClock.id == 1).with_for_update(read=not exclusive).scalar()
+
+def apply_deltas(model, deltas):
+  # Adds {entity id: (upcoming, past)} to the counters, with one executemany.
+  # Rows are updated in id order so concurrent writers lock them in the same
+  # order.
+  table = model.__table__
+  statement = table.update().where(table.c.id == db.bindparam('entity_id')).values(
+  upcoming_show_count=table.c.upcoming_show_count + db.bindparam('upcoming'),
+  past_show_count=table.c.past_show_count + db.bindparam('past'))
+  rows = [{'entity_id': entity_id, 'upcoming': upcoming, 'past': past}
+  for entity_id, (upcoming, past) in sorted(deltas.items()) if upcoming or past]
+  if rows:
+      db.session.execute(statement, rows)
+
+def count_shows(shows):
+  # Adds new shows (mappings with venue_id, artist_id and start_time) to their
+  # venues' and artists' counters
+  as_of = get_clock()
+  for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+      deltas = defaultdict(lambda: [0, 0])
+      for show in shows:
+          deltas[show[key]][0 if show['start_time'] > as_of else 1] += 1
+      apply_deltas(model, deltas)
+
+def uncount_shows(model, entity_ids):
+  # Takes the shows of venues (or artists) about to be deleted off their
+  # artists' (or venues') counters. Returns the ids of those artists (or
+  # venues).
+  as_of = get_clock()
+  counterpart = Artist if model is Venue else Venue
+  counterpart_key = SHOW_KEYS[counterpart]
+  upcoming = Show.start_time > as_of
+  deltas = dict((related_id, (-upcoming_count, upcoming_count - total))
+  for related_id, upcoming_count, total in db.session.query(counterpart_key,
+  db.func.count(db.case([(upcoming, Show.id)])), db.func.count(Show.id)).filter(SHOW_KEYS[model].in_(entity_ids)).group_by(counterpart_key))
+  apply_deltas(counterpart, deltas)
+  return sorted(deltas)
+
+@transactional()
+def roll_over(now):
+  # Moves the shows that started between the clock and now from the upcoming
+  # to the past counters, then sets the clock to now. Returns the number of
+  # shows moved.
+  as_of = get_clock(exclusive=True)
+  if now <= as_of:
+      return 0
+  started = db.and_(Show.start_time > as_of, Show.start_time <= now)
+  moved = 0
+  for model, key in SHOW_KEYS.items():
+      counts = db.session.query(key, db.func.count(Show.id)).filter(started).group_by(key).all()
+      apply_deltas(model, dict((entity_id, (-count, count)) for entity_id, count in counts))
+      # Every show is counted once per model
+      moved = sum(count for entity_id, count in counts)
+  db.session.execute(ShowCountClock.__table__.update().values(as_of=now))
+  return moved
+
+def _recount(model, as_of):
+  # Correlated subqueries counting each row's shows from scratch, and the
+  # condition matching rows whose counters are off
+  key = SHOW_KEYS[model]
+  upcoming = db.select([db.func.count(Show.id)]).where(db.and_(key == model.id, Show.start_time > as_of)).scalar_subquery()
+  past = db.select([db.func.count(Show.id)]).where(db.and_(key == model.id, Show.start_time <= as_of)).scalar_subquery()
+  return upcoming, past, db.or_(model.upcoming_show_count != upcoming, model.past_show_count != past)
+
+def check_show_counts():
+  # The number of venues and of artists whose counters are off, by model
+  as_of = get_clock()
+  return dict((model, db.session.query(db.func.count(model.id)).filter(_recount(model, as_of)[2]).scalar())
+  for model in SHOW_KEYS)
+
+@transactional()
+def rebuild_show_counts():
+  # Recounts the counters of every venue and artist in one UPDATE per table,
+  # writing only the rows that are off. Returns their number, by model.
+  as_of = get_clock(exclusive=True)
+  fixed = {}
+  for model in SHOW_KEYS:
+      upcoming, past, drifted = _recount(model, as_of)
+      fixed[model] = db.session.execute(model.__table__.update().where(drifted).values(
+      upcoming_show_count=upcoming, past_show_count=past)).rowcount
+  return fixed
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@click.group('counters')
+def counters_command():
+  """Maintain the venues' and artists' show counters."""
+
+@counters_command.command('rollover')
+@with_appcontext
+def rollover_command():
+  """Count the shows that have started since the last rollover as past."""
+  moved = roll_over(datetime.now())
+  if moved:
+      cache.clear()
+  click.echo('Moved %d shows from upcoming to past' % moved)
+
+@counters_command.command('check')
+@click.option('--fix', is_flag=True, help='Recount the counters that are off.')
+@with_appcontext
+def check_command(fix):
+  """Check the show counters against the shows table."""
+  counts = rebuild_show_counts() if fix else check_show_counts()
+  if fix and any(counts.values()):
+      cache.clear()
+  for model, count in counts.items():
+      click.echo('%s: %d %s' % (model.__tablename__, count, 'fixed' if fix else 'off'))
+  if not fix and any(counts.values()):
+      raise SystemExit(1)
@@ -0,0 +1,138 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import os
+import sys
+import zlib
+from datetime import datetime
+import click
+import dateutil.parser
+from flask.cli import with_appcontext
+from queries import get_shows_export
+
+#----------------------------------------------------------------------------#
+# Show export.
+#
+# The show calendar as CSV or NDJSON, for /shows/export.<format> and
+#
+#   flask export FILE [--format csv|ndjson] [--from DATE] [--to DATE]
+#                     [--venue-id ID] [--artist-id ID] [--gzip]
+#
+# Rows are read from a server-side cursor and encoded (and optionally
+# gzipped) a chunk at a time, so memory use doesn't depend on the number
+# of shows.
+#----------------------------------------------------------------------------#
+
+EXPORT_COLUMNS = ('id', 'start_time', 'artist_id', 'artist_name', 'venue_id',
+'venue_name', 'venue_city', 'venue_state')
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# Rows encoded per chunk of output
+CHUNK_ROWS = 500
+
+
+class ExportError(ValueError):
+  # An invalid export filter
+  pass
+
+
+def parse_filters(values):
+  # Checks the export filters given as strings (from the query string or the
+  # command line), returning them as keyword arguments for get_shows_export
+  filters = {}
+  for name, key in (('from', 'start'), ('to', 'end')):
+      if values.get(name):
+          try:
+              filters[key] = dateutil.parser.parse(values[name])
+          except (ValueError, OverflowError):
+              raise ExportError('%s: not a valid date' % name)
+  for name in ('venue_id', 'artist_id'):
+      if values.get(name) not in (None, ''):
+          try:
+              filters[name] = int(values[name])
+          except (TypeError, ValueError):
+              raise ExportError('%s: not a valid id' % name)
+          if not -2 ** 63 <= filters[name] < 2 ** 63:
+              raise ExportError('%s: not a valid id' % name)
+  return filters
+
+def _value(value):
+  return value.isoformat() if isinstance(value, datetime) else value
+
+def encode_rows(rows, format):
+  # Yields the encoded export (a header line first for CSV), CHUNK_ROWS rows
+  # at a time
+  buffer = io.StringIO()
+  writer = csv.writer(buffer, lineterminator='\n')
+  if format == 'csv':
+      writer.writerow(EXPORT_COLUMNS)
+
+  count = 0
+  for row in rows:
+      values = [_value(getattr(row, column)) for column in EXPORT_COLUMNS]
+      if format == 'csv':
+          writer.writerow(values)
+      else:
+          buffer.write(json.dumps(dict(zip(EXPORT_COLUMNS, values))) + '\n')
+      count += 1
+      if count % CHUNK_ROWS == 0:
+          yield buffer.getvalue()
+          buffer.seek(0)
+          buffer.truncate()
+
+  if buffer.tell():
+      yield buffer.getvalue()
+
+def gzip_chunks(chunks):
+  # Compresses text chunks into a gzip stream as they come
+  compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+  for chunk in chunks:
+      data = compressor.compress(chunk.encode('utf-8'))
+      if data:
+          yield data
+  yield compressor.flush()
+
+def export_shows(format, filters, gzip=False):
+  # The export as an iterable of bytes
+  chunks = encode_rows(get_shows_export(**filters), format)
+  if gzip:
+      return gzip_chunks(chunks)
+  return (chunk.encode('utf-8') for chunk in chunks)
+
+
+@click.command('export')
+@click.argument('path', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', 'format', type=click.Choice(sorted(EXPORT_FORMATS)),
+help='File format; guessed from the file extension by default.')
+@click.option('--from', 'start', help='Only shows starting at or after this date.')
+@click.option('--to', 'end', help='Only shows starting before this date.')
+@click.option('--venue-id', help='Only shows at this venue.')
+@click.option('--artist-id', help='Only shows by this artist.')
+@click.option('--gzip/--no-gzip', default=None, help='Compress the output; the default for .gz files.')
+@with_appcontext
+def export_command(path, format, start, end, venue_id, artist_id, gzip):
+  """Export the show calendar to a CSV or NDJSON file."""
+  name = path[:-3] if path.endswith('.gz') else path
+  if gzip is None:
+      gzip = path != name
+  if format is None:
+      format = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}.get(os.path.splitext(name)[1].lower())
+      if format is None:
+          raise click.UsageError('Can\'t tell the format of %s, use --format' % path)
+  try:
+      filters = parse_filters({'from': start, 'to': end, 'venue_id': venue_id, 'artist_id': artist_id})
+  except ExportError as e:
+      raise click.BadParameter(str(e))
+
+  output = sys.stdout.buffer if path == '-' else open(path, 'wb')
+  try:
+      for chunk in export_shows(format, filters, gzip):
+          output.write(chunk)
+  finally:
+      if output is not sys.stdout.buffer:
+          output.close()
@@ -4,17 +4,20 @@ from fabric.contrib.console import confirm
 # prepare for deployment
 
 
+# The tests and the query plan check run against scratch SQLite databases,
+# seeded with synthetic data
+CHECKS = "python -m pytest -q tests && python -m benchmarks.query_plans"
+
+
 def test():
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local(CHECKS, capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
 def commit():
-    message = raw_input("Enter a git commit message: ")
+    message = input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
 
 
@@ -39,9 +42,7 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    local("heroku run '{}'".format(CHECKS))
 
 
 def deploy():
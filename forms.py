@@ -1,6 +1,6 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, HiddenField
 from wtforms.validators import DataRequired, AnyOf, URL
 
 class ShowForm(Form):
@@ -88,29 +88,9 @@ class VenueForm(Form):
         'phone'
     )
     genres = SelectMultipleField(
-        # TODO implement enum restriction
+        # Choices are loaded from the genres table (see get_genre_choices)
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices=[]
     )
     facebook_link = StringField(
         'facebook_link', validators=[URL()]
@@ -118,6 +98,10 @@ class VenueForm(Form):
     website = StringField(
         'website', validators=[URL()]
     )
+    # The version of the venue the edit form was filled from; see update_entity
+    version_id = HiddenField(
+        'version_id'
+    )
     seeking_talent = BooleanField(
         'True'
     )
@@ -199,29 +183,9 @@ class ArtistForm(Form):
         'image_link', validators=[URL()]
     )
     genres = SelectMultipleField(
-        # TODO implement enum restriction
+        # Choices are loaded from the genres table (see get_genre_choices)
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices=[]
     )
     facebook_link = StringField(
         # TODO implement enum restriction
@@ -230,6 +194,10 @@ class ArtistForm(Form):
     website = StringField(
         'website', validators=[URL()]
     )
+    # The version of the artist the edit form was filled from; see update_entity
+    version_id = HiddenField(
+        'version_id'
+    )
     seeking_venue = BooleanField(
         'True'
     )
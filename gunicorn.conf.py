@@ -0,0 +1,51 @@
+#----------------------------------------------------------------------------#
+# Gunicorn settings.
+#
+# Workers are processes, each with its own connection pool and caches, and
+# each serving requests on several threads (most of a request's time is
+# spent waiting on the database). Tune with the environment:
+# - WEB_CONCURRENCY: number of worker processes (default: 2 per CPU + 1)
+# - GUNICORN_THREADS: threads per worker (default: 4); keep DB_POOL_SIZE
+#   at least as large
+# - PORT: port to listen on (default: 8000)
+# - GUNICORN_WORKER_CLASS: 'gthread' (default), or 'gevent' to serve each
+#   request on a greenlet instead of a thread, so a worker can wait on the
+#   database for many requests at once; GUNICORN_WORKER_CONNECTIONS
+#   (default: 100) caps them. Needs the gevent package, and psycogreen with
+#   PostgreSQL. Requests beyond DB_POOL_SIZE + DB_MAX_OVERFLOW wait for a
+#   connection, so the database sees no more than with threads.
+#----------------------------------------------------------------------------#
+
+import multiprocessing
+import os
+
+bind = '0.0.0.0:%s' % os.environ.get('PORT', '8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+# Recycle workers now and then, so slow leaks can't build up
+max_requests = 2000
+max_requests_jitter = 200
+timeout = 30
+keepalive = 5
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+  # Without a shared key, sessions and flashed messages break as soon as a
+  # request lands on another worker
+  if workers > 1 and not os.environ.get('SECRET_KEY'):
+      raise RuntimeError('SECRET_KEY must be set when running more than one worker')
+
+def post_fork(server, worker):
+  # psycopg2 waits on the database in C, which would block every greenlet
+  # of the worker; psycogreen makes it yield to the others instead
+  if worker_class == 'gevent' and os.environ.get('DATABASE_URL', '').startswith('postgres'):
+      try:
+          from psycogreen.gevent import patch_psycopg
+      except ImportError:
+          server.log.warning('psycogreen is not installed; PostgreSQL queries block the gevent worker')
+      else:
+          patch_psycopg()
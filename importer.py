@@ -0,0 +1,367 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import os
+import sys
+import time
+import warnings
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from werkzeug.datastructures import MultiDict
+from wtforms.validators import DataRequired
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, venue_genres, artist_genres
+from queries import get_genre_choices, get_genre_ids
+from counters import count_shows
+from cache import cache
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+#   flask import venues|artists|shows FILE [--format csv|ndjson] [--batch-size N]
+#
+# Reads CSV (with a header row) or NDJSON (one object per line) a row at a
+# time, so memory use doesn't grow with the file. Each row is checked with
+# the same form the site uses, and valid rows are inserted a batch at a time,
+# with COPY on PostgreSQL (psycopg2) and executemany elsewhere. Each batch is
+# committed on its own; rejected rows are reported with their line number.
+#
+# Column names match the form fields. Genres are a list in NDJSON and a
+# comma separated cell in CSV. Shows refer to their artist and venue either
+# by id (artist_id, venue_id) or by name (artist, venue).
+#----------------------------------------------------------------------------#
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.json': 'ndjson'}
+
+FALSE_VALUES = ('', '0', 'false', 'f', 'no', 'n')
+
+
+class RowError(Exception):
+  # A row that can't be imported
+  pass
+
+
+def read_rows(stream, format):
+  # Yields (line number, row) pairs; a row that can't be parsed is yielded
+  # as a RowError instead
+  if format == 'csv':
+      reader = csv.DictReader(stream)
+      for row in reader:
+          yield reader.line_num, row
+      return
+
+  for number, line in enumerate(stream, 1):
+      if not line.strip():
+          continue
+      try:
+          row = json.loads(line)
+      except ValueError as e:
+          yield number, RowError('invalid JSON (%s)' % e)
+          continue
+      if not isinstance(row, dict):
+          yield number, RowError('expected a JSON object')
+          continue
+      yield number, row
+
+def to_formdata(row):
+  # Turns a parsed row into form data, as a browser would submit it
+  formdata = MultiDict()
+  for name, value in row.items():
+      if value is None or name is None:
+          continue
+      if name == 'genres':
+          values = value.split(',') if isinstance(value, str) else value
+          for genre in values:
+              if str(genre).strip():
+                  formdata.add(name, str(genre).strip())
+      elif name.startswith('seeking_'):
+          # Unchecked boxes aren't submitted at all
+          if str(value).strip().lower() not in FALSE_VALUES:
+              formdata.add(name, 'y')
+      else:
+          formdata.add(name, str(value).strip())
+  return formdata
+
+
+class Importer(object):
+  # Validates and inserts the rows of one kind of record
+
+  def __init__(self, model, form_class, columns, association=None, batch_size=5000, use_copy=False):
+      self.model = model
+      self.table = model.__table__
+      self.form_class = form_class
+      self.columns = columns
+      self.association = association
+      self.batch_size = batch_size
+      self.use_copy = use_copy
+      self.form = None
+      self.imported = 0
+      self.rejected = 0
+
+  def run(self, rows, report=None):
+      batch = []
+      for number, row in rows:
+          batch.append((number, row))
+          if len(batch) >= self.batch_size:
+              self.import_batch(batch, report)
+              batch = []
+      if batch:
+          self.import_batch(batch, report)
+
+  def import_batch(self, batch, report=None):
+      records = []
+      for number, row in self.resolve(batch):
+          try:
+              if isinstance(row, RowError):
+                  raise row
+              records.append(self.validate(row))
+          except RowError as e:
+              self.rejected += 1
+              if report is not None:
+                  report(number, str(e))
+      if records:
+          try:
+              self.insert(records)
+              db.session.commit()
+          except Exception:
+              db.session.rollback()
+              raise
+      self.imported += len(records)
+
+  def get_form(self):
+      # One form is created and refilled for every row, as binding the fields
+      # costs more than validating them
+      if self.form is None:
+          self.form = self.form_class(formdata=None, meta={'csrf': False})
+          if 'genres' in self.form:
+              self.form.genres.choices = get_genre_choices()
+      return self.form
+
+  def resolve(self, batch):
+      # Hook for filling in references before validation
+      return batch
+
+  def validate(self, row):
+      # Returns the row's column values, checked with the site's form. The
+      # forms' URL validators reject blank values, so errors on blank
+      # optional fields are ignored.
+      formdata = to_formdata(row)
+      form = self.get_form()
+      # A field missing from the form data would take its default (the
+      # show form's start_time defaults to the time the app started)
+      missing = [name for name in sorted(form._fields) if name not in formdata
+      and any(isinstance(validator, DataRequired) for validator in form[name].validators)]
+      if missing:
+          raise RowError('; '.join('%s: This field is required.' % name for name in missing))
+      form.process(formdata)
+      if not form.validate():
+          errors = ['%s: %s' % (name, ' '.join(messages)) for name, messages in sorted(form.errors.items())
+          if formdata.get(name) or any(isinstance(validator, DataRequired) for validator in form[name].validators)]
+          if errors:
+              raise RowError('; '.join(errors))
+
+      record = {'updated_at': datetime.utcnow()}
+      for column in self.columns:
+          value = form[column].data
+          if isinstance(value, str):
+              value = value.strip() or None
+          record[column] = value
+      if self.association is not None:
+          record['genres'] = form.genres.data
+      return record
+
+  def insert(self, records):
+      columns = ['updated_at'] + list(self.columns)
+      if self.association is not None:
+          # Ids are needed up front to link the genres
+          for record, entity_id in zip(records, allocate_ids(self.table, len(records))):
+              record['id'] = entity_id
+          columns.insert(0, 'id')
+      self.write(self.table, columns, records)
+
+      if self.association is not None:
+          genre_ids = get_genre_ids()
+          foreign_key = [column.name for column in self.association.columns if column.name != 'genre_id'][0]
+          links = [{foreign_key: record['id'], 'genre_id': genre_ids[genre]}
+          for record in records for genre in set(record['genres'])]
+          if links:
+              self.write(self.association, [foreign_key, 'genre_id'], links)
+
+  def write(self, table, columns, records):
+      if not self.use_copy:
+          db.session.execute(table.insert(), [dict((column, record[column]) for column in columns) for record in records])
+          return
+
+      buffer = io.StringIO()
+      writer = csv.writer(buffer)
+      for record in records:
+          writer.writerow([copy_value(record[column]) for column in columns])
+      buffer.seek(0)
+      cursor = db.session.connection().connection.cursor()
+      cursor.copy_expert('COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (table.name, ', '.join(columns)), buffer)
+
+
+class ShowImporter(Importer):
+  # Shows can name their artist and venue instead of giving their ids; both
+  # are looked up once per batch
+
+  def resolve(self, batch):
+      references = {}
+      for model, key in ((Artist, 'artist'), (Venue, 'venue')):
+          names = set()
+          ids = set()
+          for number, row in batch:
+              if isinstance(row, RowError):
+                  continue
+              if row.get(key + '_id') not in (None, ''):
+                  try:
+                      ids.add(int(row[key + '_id']))
+                  except (TypeError, ValueError):
+                      pass
+              elif row.get(key):
+                  names.add(str(row[key]).strip())
+          references[key] = lookup(model, names, ids)
+
+      for number, row in batch:
+          if isinstance(row, RowError):
+              yield number, row
+              continue
+          row = dict(row)
+          try:
+              for key in ('artist', 'venue'):
+                  row[key + '_id'] = self.reference(references[key], key, row)
+          except RowError as e:
+              yield number, e
+              continue
+          yield number, row
+
+  def reference(self, known, key, row):
+      value = row.get(key + '_id')
+      if value not in (None, ''):
+          try:
+              value = int(value)
+          except (TypeError, ValueError):
+              raise RowError('%s_id: not a valid id' % key)
+          if value not in known['ids']:
+              raise RowError('%s_id: no %s with id %d' % (key, key, value))
+          return value
+
+      name = str(row.get(key) or '').strip()
+      if not name:
+          raise RowError('%s: an %s_id or %s name is required' % (key, key, key))
+      matches = known['names'].get(name, [])
+      if not matches:
+          raise RowError('%s: no %s named %r' % (key, key, name))
+      if len(matches) > 1:
+          raise RowError('%s: %d %ss are named %r, use %s_id' % (key, len(matches), key, name, key))
+      return matches[0]
+
+  def validate(self, row):
+      record = super(ShowImporter, self).validate(row)
+      record['artist_id'] = int(record['artist_id'])
+      record['venue_id'] = int(record['venue_id'])
+      return record
+
+  def insert(self, records):
+      super(ShowImporter, self).insert(records)
+      count_shows(records)
+
+
+def lookup(model, names, ids):
+  # The given ids that exist, and the ids of the entities with the given names
+  known = {'ids': set(), 'names': {}}
+  if ids:
+      known['ids'] = set(entity_id for (entity_id,) in db.session.query(model.id).filter(model.id.in_(ids)))
+  if names:
+      for name, entity_id in db.session.query(model.name, model.id).filter(model.name.in_(names)).order_by(model.id):
+          known['names'].setdefault(name, []).append(entity_id)
+  return known
+
+def allocate_ids(table, count):
+  # Takes ids from the table's sequence on PostgreSQL. Other databases have
+  # no sequence, so ids follow the current maximum; don't import alongside
+  # other writes there.
+  connection = db.session.connection()
+  if connection.dialect.name == 'postgresql':
+      return [entity_id for (entity_id,) in connection.execute(db.text('SELECT nextval(pg_get_serial_sequence(:table, \'id\')) '
+      'FROM generate_series(1, :count)'), {'table': table.name, 'count': count})]
+  start = connection.execute(db.select([db.func.max(table.c.id)])).scalar() or 0
+  return list(range(start + 1, start + count + 1))
+
+def copy_value(value):
+  # COPY's CSV format reads an unquoted empty field as NULL
+  if value is None:
+      return ''
+  if isinstance(value, bool):
+      return 'true' if value else 'false'
+  if isinstance(value, datetime):
+      return value.isoformat(' ')
+  return value
+
+def create_importer(kind, batch_size, use_copy):
+  if kind == 'venues':
+      return Importer(Venue, VenueForm, ('name', 'city', 'state', 'address', 'phone', 'image_link',
+      'facebook_link', 'website', 'seeking_talent', 'seeking_description'), venue_genres, batch_size, use_copy)
+  if kind == 'artists':
+      return Importer(Artist, ArtistForm, ('name', 'city', 'state', 'phone', 'image_link',
+      'facebook_link', 'website', 'seeking_venue', 'seeking_description'), artist_genres, batch_size, use_copy)
+  return ShowImporter(Show, ShowForm, ('artist_id', 'venue_id', 'start_time'), None, batch_size, use_copy)
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+help='File format; guessed from the file extension by default.')
+@click.option('--batch-size', default=5000, show_default=True, type=click.IntRange(1),
+help='Rows inserted (and committed) at a time.')
+@click.option('--copy/--no-copy', 'use_copy', default=None,
+help='Insert with COPY; the default when the database is PostgreSQL.')
+@with_appcontext
+def import_command(kind, path, format, batch_size, use_copy):
+  """Import venues, artists or shows from a CSV or NDJSON file."""
+  if format is None:
+      format = FORMATS.get(os.path.splitext(path)[1].lower())
+      if format is None:
+          raise click.UsageError('Can\'t tell the format of %s, use --format' % path)
+  if use_copy is None:
+      use_copy = db.engine.dialect.name == 'postgresql' and db.engine.dialect.driver == 'psycopg2'
+
+  importer = create_importer(kind, batch_size, use_copy)
+  started = time.perf_counter()
+  progress = {'reported': started}
+
+  def report(number, message):
+      click.echo('line %d: %s' % (number, message), err=True)
+
+  def run(stream):
+      def rows():
+          for number, row in read_rows(stream, format):
+              yield number, row
+              now = time.perf_counter()
+              if now - progress['reported'] >= 5:
+                  progress['reported'] = now
+                  click.echo('%d rows read, %d imported (%.0f rows/s)' % (number, importer.imported,
+                  importer.imported / (now - started)), err=True)
+      importer.run(rows(), report)
+
+  # The forms use the deprecated flask_wtf.Form
+  with warnings.catch_warnings():
+      warnings.simplefilter('ignore', DeprecationWarning)
+      if path == '-':
+          run(io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline=''))
+      else:
+          with open(path, encoding='utf-8', newline='') as stream:
+              run(stream)
+
+  # Pages cached by the site (in a shared backend) no longer match the data
+  cache.clear()
+
+  elapsed = time.perf_counter() - started
+  click.echo('Imported %d %s in %.1fs (%.0f rows/s), %d rejected' % (importer.imported, kind,
+  elapsed, importer.imported / elapsed if elapsed else 0, importer.rejected))
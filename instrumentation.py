@@ -0,0 +1,257 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from flask import g, request, current_app, has_app_context, Response, before_render_template, template_rendered, request_started
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Instrumentation.
+#
+# Records, for each request, the statements sent to the database and the
+# time spent on them, the slowest of them, and the time spent rendering
+# templates. They're reported
+# - in a Server-Timing header (SERVER_TIMING), which browsers' developer
+#   tools show next to the request;
+# - as one JSON line per request on the 'fyyur.requests' logger
+#   (REQUEST_LOG), and as a warning in the app's log for requests slower
+#   than SLOW_REQUEST_SECONDS;
+# - as Prometheus metrics, by endpoint, at METRICS_URL. Each worker process
+#   keeps its own, so with several workers a scrape only sees the one that
+#   answered it.
+# The statement count is also returned in an X-DB-Round-Trips header when
+# RECORD_ROUND_TRIPS is set.
+#
+# Views can declare the most statements they may send per request with
+# @query_budget(n), and no request may send the same statement (up to its
+# parameters) more than QUERY_REPEAT_LIMIT times, which is how N+1 queries
+# show. Requests breaking either rule raise QueryBudgetExceeded when the app
+# is testing and are logged as warnings otherwise; tests/test_query_budgets.py
+# runs every route against them.
+#----------------------------------------------------------------------------#
+
+# Upper bounds of the request latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Longest statement text kept as a request's slowest statement
+STATEMENT_LENGTH = 300
+
+request_logger = logging.getLogger('fyyur.requests')
+
+# Parameter placeholders, literals and lists of them, so statements that
+# only differ by their parameters have the same shape
+PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+|\d+|'[^']*')\s*,)*\s*(?:\?|%s|%\(\w+\)s|:\w+|\d+|'[^']*')\s*\)")
+PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|:\w+|\b\d+\b|'[^']*'")
+
+
+class QueryBudgetExceeded(Exception):
+  pass
+
+
+def query_budget(statements):
+  # Declares the most statements a view may send to the database in one
+  # request, counting those of the decorators below it (e.g. the conditional
+  # GET validators). Put it right under the route.
+  def decorator(view):
+      view.query_budget = statements
+      return view
+  return decorator
+
+def statement_shape(statement):
+  return PLACEHOLDER.sub('?', PLACEHOLDER_LIST.sub('(?)', re.sub(r'\s+', ' ', statement).strip()))
+
+
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+  if context is not None:
+      context._instrumentation_started = time.perf_counter()
+
+def _end_statement(conn, cursor, statement, parameters, context, executemany):
+  # Only statements run on behalf of a request or command are recorded
+  if not has_app_context():
+      return
+  g.db_round_trips = g.get('db_round_trips', 0) + 1
+  if current_app.config['QUERY_REPEAT_LIMIT'] is not None:
+      g.setdefault('statement_shapes', Counter())[statement_shape(statement)] += 1
+  started = getattr(context, '_instrumentation_started', None)
+  if started is None:
+      return
+  elapsed = time.perf_counter() - started
+  g.db_time = g.get('db_time', 0.0) + elapsed
+  if elapsed > g.get('slowest_statement_time', -1):
+      g.slowest_statement_time = elapsed
+      g.slowest_statement = statement
+
+def _start_template(app, template, context, **extra):
+  g.setdefault('template_starts', []).append(time.perf_counter())
+
+def _end_template(app, template, context, **extra):
+  starts = g.get('template_starts')
+  if starts:
+      g.template_time = g.get('template_time', 0.0) + time.perf_counter() - starts.pop()
+
+def _start_request(app, **extra):
+  g.request_started = time.perf_counter()
+
+
+class RequestMetrics(object):
+  # Request counts, latency histograms and database and template time by
+  # endpoint, written out in the Prometheus text format
+
+  def __init__(self, buckets=LATENCY_BUCKETS):
+      self.buckets = buckets
+      self.lock = threading.Lock()
+      self.requests = {}
+      self.latency = {}
+      self.totals = {}
+
+  def observe(self, method, endpoint, status, duration, round_trips, db_time, template_time):
+      with self.lock:
+          key = (method, endpoint, str(status))
+          self.requests[key] = self.requests.get(key, 0) + 1
+
+          histogram = self.latency.get((method, endpoint))
+          if histogram is None:
+              histogram = self.latency[(method, endpoint)] = [[0] * len(self.buckets), 0.0, 0]
+          for i, bound in enumerate(self.buckets):
+              if duration <= bound:
+                  histogram[0][i] += 1
+          histogram[1] += duration
+          histogram[2] += 1
+
+          totals = self.totals.setdefault(endpoint, [0, 0.0, 0.0])
+          totals[0] += round_trips
+          totals[1] += db_time
+          totals[2] += template_time
+
+  def render(self):
+      with self.lock:
+          lines = [
+            '# HELP fyyur_requests_total Requests answered.',
+            '# TYPE fyyur_requests_total counter'
+          ]
+          for (method, endpoint, status), count in sorted(self.requests.items()):
+              lines.append('fyyur_requests_total%s %d' % (_labels(method=method, endpoint=endpoint, status=status), count))
+
+          lines += [
+            '# HELP fyyur_request_duration_seconds Time taken to answer requests.',
+            '# TYPE fyyur_request_duration_seconds histogram'
+          ]
+          for (method, endpoint), (counts, total, count) in sorted(self.latency.items()):
+              for bound, bucket_count in zip(self.buckets, counts):
+                  lines.append('fyyur_request_duration_seconds_bucket%s %d' % (_labels(method=method, endpoint=endpoint, le=repr(float(bound))), bucket_count))
+              lines.append('fyyur_request_duration_seconds_bucket%s %d' % (_labels(method=method, endpoint=endpoint, le='+Inf'), count))
+              lines.append('fyyur_request_duration_seconds_sum%s %r' % (_labels(method=method, endpoint=endpoint), total))
+              lines.append('fyyur_request_duration_seconds_count%s %d' % (_labels(method=method, endpoint=endpoint), count))
+
+          for index, name, kind, help_text in (
+            (0, 'fyyur_db_statements_total', 'counter', 'Statements sent to the database.'),
+            (1, 'fyyur_db_duration_seconds_total', 'counter', 'Time spent on database statements.'),
+            (2, 'fyyur_template_duration_seconds_total', 'counter', 'Time spent rendering templates.')):
+              lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s %s' % (name, kind)]
+              for endpoint, totals in sorted(self.totals.items()):
+                  lines.append('%s%s %r' % (name, _labels(endpoint=endpoint), totals[index]))
+      return '\n'.join(lines) + '\n'
+
+def _labels(**labels):
+  return '{%s}' % ','.join('%s="%s"' % (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+  for name, value in sorted(labels.items()))
+
+
+class Instrumentation(object):
+
+  def __init__(self, app=None):
+      if app is not None:
+          self.init_app(app)
+
+  def init_app(self, app):
+      app.config.setdefault('RECORD_ROUND_TRIPS', False)
+      app.config.setdefault('SERVER_TIMING', True)
+      app.config.setdefault('REQUEST_LOG', False)
+      app.config.setdefault('SLOW_REQUEST_SECONDS', None)
+      app.config.setdefault('METRICS_URL', None)
+      app.config.setdefault('QUERY_REPEAT_LIMIT', None)
+
+      # Listen on every engine, as the app's engine is created lazily
+      if not event.contains(Engine, 'before_cursor_execute', _start_statement):
+          event.listen(Engine, 'before_cursor_execute', _start_statement)
+          event.listen(Engine, 'after_cursor_execute', _end_statement)
+      request_started.connect(_start_request, app)
+      before_render_template.connect(_start_template, app)
+      template_rendered.connect(_end_template, app)
+
+      if app.config['REQUEST_LOG'] and not request_logger.handlers:
+          handler = logging.StreamHandler()
+          handler.setFormatter(logging.Formatter('%(message)s'))
+          request_logger.addHandler(handler)
+          request_logger.setLevel(logging.INFO)
+          request_logger.propagate = False
+
+      metrics = app.extensions['request_metrics'] = RequestMetrics()
+      if app.config['METRICS_URL']:
+          app.add_url_rule(app.config['METRICS_URL'], endpoint='metrics',
+          view_func=lambda: Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8'))
+
+      @app.after_request
+      def record_request(response):
+          started = g.get('request_started')
+          duration = time.perf_counter() - started if started is not None else 0.0
+          round_trips = g.get('db_round_trips', 0)
+          db_time = g.get('db_time', 0.0)
+          template_time = g.get('template_time', 0.0)
+          endpoint = request.endpoint or 'none'
+          metrics.observe(request.method, endpoint, response.status_code, duration, round_trips, db_time, template_time)
+
+          if app.config['RECORD_ROUND_TRIPS']:
+              response.headers['X-DB-Round-Trips'] = str(round_trips)
+          if app.config['SERVER_TIMING']:
+              response.headers.add('Server-Timing', 'db;dur=%.1f;desc="%d statements", tpl;dur=%.1f, total;dur=%.1f'
+              % (db_time * 1000, round_trips, template_time * 1000, duration * 1000))
+
+          check_query_budget(app, round_trips)
+
+          slow = app.config['SLOW_REQUEST_SECONDS'] is not None and duration >= app.config['SLOW_REQUEST_SECONDS']
+          if slow or request_logger.isEnabledFor(logging.INFO):
+              line = json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 1),
+                'db_statements': round_trips,
+                'db_ms': round(db_time * 1000, 1),
+                'template_ms': round(template_time * 1000, 1),
+                'slowest_statement_ms': round(g.get('slowest_statement_time', 0.0) * 1000, 1),
+                # Without its parameters, which may hold personal details
+                'slowest_statement': re.sub(r'\s+', ' ', g.get('slowest_statement', ''))[:STATEMENT_LENGTH]
+              }, sort_keys=True)
+              request_logger.info(line)
+              if slow:
+                  app.logger.warning('Slow request: %s', line)
+          return response
+
+
+def check_query_budget(app, round_trips):
+  problems = []
+  budget = getattr(app.view_functions.get(request.endpoint), 'query_budget', None)
+  if budget is not None and round_trips > budget:
+      problems.append('sent %d statements, over its budget of %d' % (round_trips, budget))
+  limit = app.config['QUERY_REPEAT_LIMIT']
+  if limit is not None and g.get('statement_shapes'):
+      shape, count = g.statement_shapes.most_common(1)[0]
+      if count > limit:
+          problems.append('sent the same statement %d times: %s' % (count, shape[:STATEMENT_LENGTH]))
+  if problems:
+      message = '%s %s %s' % (request.method, request.path, '; '.join(problems))
+      if app.testing:
+          raise QueryBudgetExceeded(message)
+      app.logger.warning('Query budget exceeded: %s', message)
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,42 @@
+"""cascade entity deletes
+
+Revision ID: 2b7f4c9e8d15
+Revises: 5d8b2f6e1a47
+Create Date: 2026-10-18 17:58:40.117362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7f4c9e8d15'
+down_revision = '5d8b2f6e1a47'
+branch_labels = None
+depends_on = None
+
+# The foreign keys pointing at venues and artists, by their default
+# PostgreSQL names: (table, column, referenced table)
+FOREIGN_KEYS = (
+    ('shows', 'venue_id', 'venues'),
+    ('shows', 'artist_id', 'artists'),
+    ('venue_genres', 'venue_id', 'venues'),
+    ('artist_genres', 'artist_id', 'artists'),
+)
+
+
+def _recreate_foreign_keys(ondelete):
+    for table, column, referenced in FOREIGN_KEYS:
+        name = '{0}_{1}_fkey'.format(table, column)
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referenced, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    # Deleting a venue or an artist deletes its shows and genre links in the
+    # same statement
+    _recreate_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _recreate_foreign_keys(None)
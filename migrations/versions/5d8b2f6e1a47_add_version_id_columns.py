@@ -0,0 +1,30 @@
+"""add version_id columns
+
+Revision ID: 5d8b2f6e1a47
+Revises: 9c5e1b7d3f20
+Create Date: 2026-10-18 17:34:12.481906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8b2f6e1a47'
+down_revision = '9c5e1b7d3f20'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venues', 'artists')
+
+
+def upgrade():
+    # The server default fills in existing rows, and rows inserted without
+    # the column (such as by COPY in the import command)
+    for table in TABLES:
+        op.add_column(table, sa.Column('version_id', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_column(table, 'version_id')
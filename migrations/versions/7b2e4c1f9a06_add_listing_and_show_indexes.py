@@ -0,0 +1,35 @@
+"""add listing and show indexes
+
+Revision ID: 7b2e4c1f9a06
+Revises: d1f3a7c9e2b4
+Create Date: 2026-10-18 14:03:12.551207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2e4c1f9a06'
+down_revision = 'd1f3a7c9e2b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Foreign keys aren't indexed automatically on PostgreSQL; shows are
+    # looked up by venue or artist and split around the current time
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+    # Listing orders (see the keys paged on in queries.py)
+    op.create_index('ix_shows_start_time', 'shows', ['start_time', 'id'], unique=False)
+    op.create_index('ix_venues_state_city_name', 'venues', ['state', 'city', 'name', 'id'], unique=False)
+    op.create_index('ix_artists_name', 'artists', ['name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artists_name', table_name='artists')
+    op.drop_index('ix_venues_state_city_name', table_name='venues')
+    op.drop_index('ix_shows_start_time', table_name='shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
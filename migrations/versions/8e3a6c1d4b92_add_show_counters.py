@@ -0,0 +1,51 @@
+"""add show counters
+
+Revision ID: 8e3a6c1d4b92
+Revises: 2b7f4c9e8d15
+Create Date: 2026-10-18 18:26:05.739214
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3a6c1d4b92'
+down_revision = '2b7f4c9e8d15'
+branch_labels = None
+depends_on = None
+
+# Each table with counters, and the shows column pointing at it
+TABLES = (('venues', 'venue_id'), ('artists', 'artist_id'))
+
+
+def upgrade():
+    as_of = datetime.now()
+    clock = op.create_table('show_count_clock',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('as_of', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(clock, [{'id': 1, 'as_of': as_of}])
+
+    shows = sa.table('shows', sa.column('venue_id', sa.Integer), sa.column('artist_id', sa.Integer),
+    sa.column('start_time', sa.DateTime))
+    for table, foreign_key in TABLES:
+        op.add_column(table, sa.Column('upcoming_show_count', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('past_show_count', sa.Integer(), nullable=False, server_default='0'))
+        # Existing shows are counted as of the clock's starting time
+        entities = sa.table(table, sa.column('id', sa.Integer), sa.column('upcoming_show_count', sa.Integer),
+        sa.column('past_show_count', sa.Integer))
+        key = shows.c[foreign_key]
+        op.execute(entities.update().values(
+            upcoming_show_count=sa.select([sa.func.count()]).where(sa.and_(key == entities.c.id, shows.c.start_time > as_of)).scalar_subquery(),
+            past_show_count=sa.select([sa.func.count()]).where(sa.and_(key == entities.c.id, shows.c.start_time <= as_of)).scalar_subquery()
+        ))
+
+
+def downgrade():
+    for table, foreign_key in reversed(TABLES):
+        op.drop_column(table, 'past_show_count')
+        op.drop_column(table, 'upcoming_show_count')
+    op.drop_table('show_count_clock')
@@ -0,0 +1,37 @@
+"""add updated_at columns
+
+Revision ID: 9c5e1b7d3f20
+Revises: e4a9d2b7c815
+Create Date: 2026-10-18 16:21:47.308114
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c5e1b7d3f20'
+down_revision = 'e4a9d2b7c815'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venues', 'artists', 'shows')
+
+
+def upgrade():
+    # Existing rows are stamped with the migration time (in UTC, like the
+    # timestamps the models set) before the column becomes required
+    now = datetime.utcnow()
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(sa.table(table, sa.column('updated_at', sa.DateTime())).update().values(updated_at=now))
+        op.alter_column(table, 'updated_at', nullable=False)
+        # Listing validators read max(updated_at)
+        op.create_index('ix_%s_updated_at' % table, table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_index('ix_%s_updated_at' % table, table_name=table)
+        op.drop_column(table, 'updated_at')
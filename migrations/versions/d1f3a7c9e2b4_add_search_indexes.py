@@ -0,0 +1,42 @@
+"""add search indexes
+
+Revision ID: d1f3a7c9e2b4
+Revises: 005957f0f5b6
+Create Date: 2026-10-18 10:12:41.203518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1f3a7c9e2b4'
+down_revision = '005957f0f5b6'
+branch_labels = None
+depends_on = None
+
+# Must stay identical to PostgresSearchBackend.document() in search.py
+DOCUMENT = "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(city, '') || ' ' || coalesce(genres, ''))"
+
+
+def upgrade():
+    # The search indexes are PostgreSQL specific; other databases use the
+    # in-process n-gram index
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venues', 'artists'):
+        op.execute('CREATE INDEX ix_{0}_name_trgm ON {0} USING gin (name gin_trgm_ops)'.format(table))
+        op.execute('CREATE INDEX ix_{0}_city_trgm ON {0} USING gin (city gin_trgm_ops)'.format(table))
+        op.execute('CREATE INDEX ix_{0}_search_document ON {0} USING gin ({1})'.format(table, DOCUMENT))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table in ('artists', 'venues'):
+        op.execute('DROP INDEX ix_{0}_search_document'.format(table))
+        op.execute('DROP INDEX ix_{0}_city_trgm'.format(table))
+        op.execute('DROP INDEX ix_{0}_name_trgm'.format(table))
@@ -0,0 +1,94 @@
+"""normalize genres
+
+Revision ID: e4a9d2b7c815
+Revises: 7b2e4c1f9a06
+Create Date: 2026-10-18 15:41:27.308841
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9d2b7c815'
+down_revision = '7b2e4c1f9a06'
+branch_labels = None
+depends_on = None
+
+# The genres the venue and artist forms used to offer
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre',
+'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other']
+
+# Entities with genres: (table, association table, foreign key, CSV column length)
+ENTITIES = [('venues', 'venue_genres', 'venue_id', 240), ('artists', 'artist_genres', 'artist_id', 120)]
+
+# Full text search documents (see search.py) with and without the genres column
+DOCUMENT = "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(city, ''))"
+CSV_DOCUMENT = "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(city, '') || ' ' || coalesce(genres, ''))"
+
+genres_table = sa.table('genres', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+
+def upgrade():
+    op.create_table('genres',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for table, association, foreign_key, length in ENTITIES:
+        op.create_table(association,
+        sa.Column(foreign_key, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['genre_id'], ['genres.id'], ),
+        sa.ForeignKeyConstraint([foreign_key], [table + '.id'], ),
+        sa.PrimaryKeyConstraint(foreign_key, 'genre_id')
+        )
+        op.create_index('ix_{0}_genre_id'.format(association), association, ['genre_id', foreign_key], unique=False)
+
+    # Move the comma-separated genres into the new tables
+    bind = op.get_bind()
+    names = list(GENRES)
+    entity_genres = {}
+    for table, association, foreign_key, length in ENTITIES:
+        entity_genres[association] = []
+        for entity_id, csv in bind.execute(sa.text('SELECT id, genres FROM ' + table)):
+            for name in set(genre.strip() for genre in (csv or '').split(',') if genre.strip()):
+                entity_genres[association].append((entity_id, name))
+                if name not in names:
+                    names.append(name)
+    op.bulk_insert(genres_table, [{'name': name} for name in names])
+
+    genre_ids = dict((name, genre_id) for genre_id, name in bind.execute(sa.text('SELECT id, name FROM genres')))
+    for table, association, foreign_key, length in ENTITIES:
+        if entity_genres[association]:
+            op.bulk_insert(sa.table(association, sa.column(foreign_key, sa.Integer), sa.column('genre_id', sa.Integer)),
+            [{foreign_key: entity_id, 'genre_id': genre_ids[name]} for entity_id, name in entity_genres[association]])
+
+    for table, association, foreign_key, length in ENTITIES:
+        if bind.dialect.name == 'postgresql':
+            op.execute('DROP INDEX ix_{0}_search_document'.format(table))
+            op.execute('CREATE INDEX ix_{0}_search_document ON {0} USING gin ({1})'.format(table, DOCUMENT))
+        op.drop_column(table, 'genres')
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table, association, foreign_key, length in ENTITIES:
+        op.add_column(table, sa.Column('genres', sa.String(length=length), nullable=True))
+        entity_genres = {}
+        for entity_id, name in bind.execute(sa.text('SELECT {0}.{1}, genres.name FROM {0} JOIN genres ON genres.id = {0}.genre_id ORDER BY genres.name'.format(association, foreign_key))):
+            entity_genres.setdefault(entity_id, []).append(name)
+        for entity_id, names in entity_genres.items():
+            bind.execute(sa.text('UPDATE {0} SET genres = :genres WHERE id = :id'.format(table)), {'genres': ','.join(names), 'id': entity_id})
+        bind.execute(sa.text("UPDATE {0} SET genres = '' WHERE genres IS NULL".format(table)))
+        op.alter_column(table, 'genres', existing_type=sa.String(length=length), nullable=False)
+        if bind.dialect.name == 'postgresql':
+            op.execute('DROP INDEX ix_{0}_search_document'.format(table))
+            op.execute('CREATE INDEX ix_{0}_search_document ON {0} USING gin ({1})'.format(table, CSV_DOCUMENT))
+
+    for table, association, foreign_key, length in ENTITIES:
+        op.drop_index('ix_{0}_genre_id'.format(association), table_name=association)
+        op.drop_table(association)
+    op.drop_table('genres')
@@ -0,0 +1,134 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import sqlite3
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from replicas import RoutingSQLAlchemy
+
+# Reads of read-only views can go to replicas; see replicas.py
+db = RoutingSQLAlchemy()
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+venue_genres = db.Table('venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id', 'genre_id', 'venue_id')
+)
+
+artist_genres = db.Table('artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id', 'genre_id', 'artist_id')
+)
+
+class Genre(db.Model):
+    __tablename__ = 'genres'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+class Venue(db.Model):
+    __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_state_city_name', 'state', 'city', 'name', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    address = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=venue_genres, order_by='Genre.name')
+    website = db.Column(db.String(120))
+    seeking_talent = db.Column(db.Boolean)
+    seeking_description = db.Column(db.String(240))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    version_id = db.Column(db.Integer, nullable=False, server_default='1')
+    # Numbers of shows, as of ShowCountClock; maintained by counters.py
+    upcoming_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    # Shows (and genre links) are deleted by the database along with their
+    # venue, rather than loaded and deleted one by one
+    shows = db.relationship('Show', backref='show_venue', passive_deletes=True)
+
+    __mapper_args__ = {'version_id_col': version_id}
+
+class Artist(db.Model):
+    __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_name', 'name', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=artist_genres, order_by='Genre.name')
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    website = db.Column(db.String(120))
+    seeking_venue = db.Column(db.Boolean)
+    seeking_description = db.Column(db.String(240))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    version_id = db.Column(db.Integer, nullable=False, server_default='1')
+    # Numbers of shows, as of ShowCountClock; maintained by counters.py
+    upcoming_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    shows = db.relationship('Show', backref='show_artist', passive_deletes=True)
+
+    __mapper_args__ = {'version_id_col': version_id}
+
+class Show(db.Model):
+    __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time', 'start_time', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+class ShowCountClock(db.Model):
+    # The time the venues' and artists' show counters are as of: shows
+    # starting after it are counted as upcoming, the others as past. A single
+    # row, moved forward by `flask counters rollover`.
+    __tablename__ = 'show_count_clock'
+
+    id = db.Column(db.Integer, primary_key=True)
+    as_of = db.Column(db.DateTime, nullable=False)
+
+@event.listens_for(ShowCountClock.__table__, 'after_create')
+def start_show_count_clock(target, connection, **kwargs):
+    connection.execute(target.insert().values(id=1, as_of=datetime.now()))
+
+# Genres live in association tables, so changing only an entity's genres
+# doesn't update its row; touch updated_at explicitly
+@event.listens_for(Venue.genres, 'append')
+@event.listens_for(Venue.genres, 'remove')
+@event.listens_for(Artist.genres, 'append')
+@event.listens_for(Artist.genres, 'remove')
+def touch_genres_owner(target, value, initiator):
+    target.updated_at = datetime.utcnow()
+
+# SQLite only enforces foreign keys, and so ON DELETE CASCADE, on connections
+# that ask for it
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
@@ -0,0 +1,89 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import base64
+import binascii
+import json
+import dateutil.parser
+from datetime import datetime
+from sqlalchemy import DateTime, tuple_
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#
+# Pages are ordered by a unique set of key columns (e.g. name, id) and
+# requested relative to the key of the row they follow ('after' token) or
+# precede ('before' token), so every page costs an index range scan no
+# matter how deep it is. Tokens stay valid when rows are added or removed.
+#----------------------------------------------------------------------------#
+
+def encode_token(values):
+  data = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+  return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_value(column, value):
+  # The value of a key column, as stored in a token. Raises ValueError when
+  # it isn't a scalar of the column's type, since tokens come from clients.
+  if value is None:
+      return None
+  if isinstance(column.type, DateTime):
+      if not isinstance(value, str):
+          raise ValueError(value)
+      return dateutil.parser.parse(value)
+  python_type = column.type.python_type
+  if not isinstance(value, python_type) or isinstance(value, bool):
+      raise ValueError(value)
+  if python_type is int and not -2 ** 63 <= value < 2 ** 63:
+      raise ValueError(value)
+  return value
+
+def decode_token(token, columns):
+  # Returns the key values in the token, or None if it's missing or invalid
+  if not token:
+      return None
+  try:
+      padded = token + '=' * (-len(token) % 4)
+      values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+      if not isinstance(values, list) or len(values) != len(columns):
+          return None
+      return [decode_value(column, value) for column, value in zip(columns, values)]
+  except (ValueError, TypeError, OverflowError, binascii.Error):
+      return None
+
+
+class KeysetPage(object):
+  # A page of rows plus the tokens of the previous and next pages (None when
+  # there's no such page)
+
+  def __init__(self, items, prev_token, next_token):
+      self.items = items
+      self.prev_token = prev_token
+      self.next_token = next_token
+
+
+def paginate_keyset(query, columns, page_size, after=None, before=None):
+  # Gets the page of query rows (ordered by columns, ascending) following the
+  # 'after' token or preceding the 'before' token; the first page if neither
+  # is given. Each column must be available on the rows under its key.
+  key = tuple_(*columns)
+  after_values = decode_token(after, columns)
+  before_values = decode_token(before, columns) if after_values is None else None
+
+  # One row more than the page size is fetched to tell if there's another page
+  if before_values is not None:
+      rows = query.filter(key < tuple(before_values)).order_by(*[column.desc() for column in columns]).limit(page_size + 1).all()
+      has_prev, has_next = len(rows) > page_size, True
+      rows = rows[:page_size][::-1]
+  else:
+      if after_values is not None:
+          query = query.filter(key > tuple(after_values))
+      rows = query.order_by(*columns).limit(page_size + 1).all()
+      has_prev, has_next = after_values is not None, len(rows) > page_size
+      rows = rows[:page_size]
+
+  def token(row):
+      return encode_token([getattr(row, column.key) for column in columns])
+
+  return KeysetPage(rows, token(rows[0]) if rows and has_prev else None,
+  token(rows[-1]) if rows and has_next else None)
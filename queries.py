@@ -0,0 +1,362 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from flask import current_app, copy_current_request_context, has_request_context
+from models import db, Venue, Artist, Show, Genre, venue_genres, artist_genres
+from pagination import paginate_keyset
+from unit_of_work import transactional, insert_returning, update_versioned, delete_returning
+from counters import count_shows, uncount_shows
+
+#----------------------------------------------------------------------------#
+# Genres.
+#----------------------------------------------------------------------------#
+
+# The association table linking each model to its genres, and its column
+# pointing at the model
+GENRE_ASSOCIATIONS = {
+  Venue: (venue_genres, venue_genres.c.venue_id),
+  Artist: (artist_genres, artist_genres.c.artist_id)
+}
+
+_genre_ids = None
+
+def get_genre_ids():
+  # Genre ids by name. The genres table only changes through migrations, so
+  # it's read once per process.
+  global _genre_ids
+  if _genre_ids is None:
+      _genre_ids = dict(db.session.query(Genre.name, Genre.id))
+  return _genre_ids
+
+def get_genre_choices():
+  # The genres offered by the venue and artist forms
+  return [(name, name) for name in sorted(get_genre_ids())]
+
+def get_genre_names(model, entity_ids):
+  # The genres of each of the given venues or artists, in one IN query
+  association, foreign_key = GENRE_ASSOCIATIONS[model]
+  genres = dict((entity_id, []) for entity_id in entity_ids)
+  if entity_ids:
+      for entity_id, name in db.session.query(foreign_key, Genre.name).join(Genre,
+      Genre.id == association.c.genre_id).filter(foreign_key.in_(entity_ids)).order_by(Genre.name):
+          genres[entity_id].append(name)
+  return genres
+
+def filter_by_genre(query, model, genre):
+  # Restricts a query on venues or artists to those with the given genre. The
+  # join lets the database go from the genre's name to the entities through
+  # the association table's genre_id index.
+  association, foreign_key = GENRE_ASSOCIATIONS[model]
+  return query.join(association, foreign_key == model.id).join(Genre,
+  Genre.id == association.c.genre_id).filter(Genre.name == genre)
+
+#----------------------------------------------------------------------------#
+# Venue directory.
+#----------------------------------------------------------------------------#
+
+# Keys the venues listing is paged on; venues are listed by area, so areas
+# are never split up other than at page boundaries
+VENUE_LISTING_KEYS = (Venue.state, Venue.city, Venue.name, Venue.id)
+
+def get_venue_areas(page_size, after=None, before=None, genre=None):
+  # Builds a page of the venues listing (venues grouped by city and state)
+  # from a single ordered result set, optionally only venues of one genre.
+  # Upcoming shows are read from the venues' counters (see counters.py)
+  # rather than counted. Returns the areas and the KeysetPage they were
+  # built from.
+  query = db.session.query(Venue.city, Venue.state, Venue.id, Venue.name,
+  Venue.upcoming_show_count.label('num_upcoming_shows'))
+  if genre:
+      query = filter_by_genre(query, Venue, genre)
+  page = paginate_keyset(query, VENUE_LISTING_KEYS, page_size, after, before)
+
+  # Rows are ordered by area, so each area is one consecutive run of rows
+  areas = []
+  for (city, state), venues in groupby(page.items, key=lambda row: (row.city, row.state)):
+      areas.append({
+        'city': city,
+        'state': state,
+        'venues': [{
+          'id': venue.id,
+          'name': venue.name,
+          'num_upcoming_shows': venue.num_upcoming_shows
+        } for venue in venues]
+      })
+
+  return areas, page
+
+#----------------------------------------------------------------------------#
+# Artists and shows listings.
+#----------------------------------------------------------------------------#
+
+def get_artists_page(page_size, after=None, before=None, genre=None):
+  query = db.session.query(Artist.id, Artist.name)
+  if genre:
+      query = filter_by_genre(query, Artist, genre)
+  return paginate_keyset(query, (Artist.name, Artist.id), page_size, after, before)
+
+def get_shows_page(page_size, after=None, before=None):
+  query = db.session.query(Show.artist_id, Show.venue_id, Show.start_time,
+  Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+  Venue.name.label('venue_name'), Show.id).join(Artist).join(Venue)
+  return paginate_keyset(query, (Show.start_time, Show.id), page_size, after, before)
+
+#----------------------------------------------------------------------------#
+# Show export.
+#----------------------------------------------------------------------------#
+
+def get_shows_export(start=None, end=None, venue_id=None, artist_id=None, batch_size=1000):
+  # Shows with their artist's and venue's names, in calendar order, starting
+  # at or after start and before end. Rows are streamed from a server-side
+  # cursor batch_size at a time rather than loaded all at once.
+  query = db.session.query(Show.id, Show.start_time, Show.artist_id,
+  Artist.name.label('artist_name'), Show.venue_id, Venue.name.label('venue_name'),
+  Venue.city.label('venue_city'), Venue.state.label('venue_state')).join(Artist).join(Venue)
+  if start is not None:
+      query = query.filter(Show.start_time >= start)
+  if end is not None:
+      query = query.filter(Show.start_time < end)
+  if venue_id is not None:
+      query = query.filter(Show.venue_id == venue_id)
+  if artist_id is not None:
+      query = query.filter(Show.artist_id == artist_id)
+  return query.order_by(Show.start_time, Show.id).yield_per(batch_size)
+
+#----------------------------------------------------------------------------#
+# Venue and artist pages.
+#----------------------------------------------------------------------------#
+
+# For each detail page: the Show column pointing at the entity, and the model
+# shown on each show tile along with the prefix of its columns' labels
+DETAIL_PAGES = {
+  Venue: (Show.venue_id, Artist, 'artist'),
+  Artist: (Show.artist_id, Venue, 'venue')
+}
+
+class ShowList(object):
+  # One side (past or upcoming) of a detail page's shows. next_from is the
+  # position to continue from with "show more", or None if all are shown.
+  def __init__(self):
+      self.items = []
+      self.total = 0
+      self.next_from = None
+
+def get_related_ids(model, entity_ids):
+  # The ids of the artists the given venues have shows with, or of the venues
+  # the given artists have shows at
+  foreign_key, counterpart, prefix = DETAIL_PAGES[model]
+  counterpart_key = getattr(Show, prefix + '_id')
+  return [related_id for (related_id,) in db.session.query(counterpart_key).filter(foreign_key.in_(entity_ids)).distinct()]
+
+def get_detail_page(model, entity_id, current_datetime, limit=None, past_from=0, upcoming_from=0):
+  # Loads a venue or an artist along with its shows, joined with the other
+  # side of each show, in a single query. Shows are numbered and counted per
+  # side (past or upcoming) with window functions, so at most `limit` shows
+  # per side, starting at past_from/upcoming_from, are loaded. Returns
+  # (entity, past ShowList, upcoming ShowList), or None if there's no entity.
+  foreign_key, counterpart, prefix = DETAIL_PAGES[model]
+  upcoming = Show.start_time > current_datetime
+
+  # Upcoming shows are numbered soonest first, past shows latest first
+  shows = db.session.query(foreign_key.label('entity_id'), Show.start_time,
+  counterpart.id.label(prefix + '_id'), counterpart.name.label(prefix + '_name'),
+  counterpart.image_link.label(prefix + '_image_link'), upcoming.label('upcoming'),
+  db.func.row_number().over(partition_by=upcoming, order_by=(db.case([(upcoming,
+  Show.start_time)]), Show.start_time.desc(), Show.id)).label('position'),
+  db.func.count().over(partition_by=upcoming).label('total')).join(counterpart,
+  counterpart.id == getattr(Show, prefix + '_id')).filter(foreign_key == entity_id).subquery()
+
+  # The first show of each side is always loaded, so that its total is known
+  # even when paging past the end
+  def window(is_upcoming, start):
+      condition = shows.c.upcoming == is_upcoming
+      if limit is None:
+          return db.and_(condition, db.or_(shows.c.position == 1, shows.c.position > start))
+      return db.and_(condition, db.or_(shows.c.position == 1,
+      shows.c.position.between(start + 1, start + limit)))
+
+  rows = db.session.query(model, shows).outerjoin(shows, db.and_(shows.c.entity_id == model.id,
+  db.or_(window(False, past_from), window(True, upcoming_from)))).filter(model.id == entity_id).order_by(shows.c.upcoming, shows.c.position).all()
+  if not rows:
+      return None
+
+  past = ShowList()
+  future = ShowList()
+  for row in rows:
+      if row.position is None:
+          continue
+      side, start = (future, upcoming_from) if row.upcoming else (past, past_from)
+      side.total = row.total
+      if row.position > start:
+          side.items.append(row)
+  for side, start in ((past, past_from), (future, upcoming_from)):
+      if limit is not None and start + limit < side.total:
+          side.next_from = start + limit
+
+  return rows[0][0], past, future
+
+def get_detail(model, entity_id, current_datetime, limit=None, past_from=0, upcoming_from=0):
+  # The detail page, as get_detail_page returns it, and the entity's genre
+  # names. The two queries don't depend on each other, so they can run at
+  # the same time.
+  return run_concurrently(
+    lambda: get_detail_page(model, entity_id, current_datetime, limit, past_from, upcoming_from),
+    lambda: get_genre_names(model, [entity_id])[entity_id])
+
+#----------------------------------------------------------------------------#
+# Concurrent reads.
+#----------------------------------------------------------------------------#
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def run_concurrently(*calls):
+  # Runs independent reads and returns their results in order. With
+  # CONCURRENT_QUERIES, all but the first run on a pool of threads
+  # (greenlets under gevent), each in an app context and so with a session
+  # and a connection of its own, while the first runs here: the request
+  # waits for the slowest query rather than for all of them in turn. Their
+  # statements aren't counted in the request's instrumentation.
+  global _executor
+  app = current_app._get_current_object()
+  if len(calls) < 2 or not app.config['CONCURRENT_QUERIES']:
+      return [call() for call in calls]
+
+  with _executor_lock:
+      if _executor is None:
+          # More threads than connections would only wait on the pool
+          _executor = ThreadPoolExecutor(max_workers=app.config['DB_POOL_SIZE'], thread_name_prefix='fyyur-queries')
+
+  # The calls see the request, e.g. to read from the same replica
+  if has_request_context():
+      calls = calls[:1] + tuple(copy_current_request_context(call) for call in calls[1:])
+  def run(call):
+      with app.app_context():
+          return call()
+  futures = [_executor.submit(run, call) for call in calls[1:]]
+  return [calls[0]()] + [future.result() for future in futures]
+
+#----------------------------------------------------------------------------#
+# Page validators.
+#
+# The values each page's ETag is derived from, for conditional GETs. Row
+# timestamps catch inserts and updates; row counts catch deletions.
+#----------------------------------------------------------------------------#
+
+# The tables each listing shows data from. Shows are only deleted along with
+# their venue or artist, so only those two tables need counting, which
+# spares a count over the (much larger) shows table.
+LISTING_TABLES = {
+  'venues': (Venue,),
+  'artists': (Artist,),
+  'shows': (Show, Venue, Artist)
+}
+
+def get_listing_validators(listing):
+  # One round trip of max(updated_at) (served by the updated_at indexes) and
+  # count subqueries, whatever the listing's size
+  aggregates = []
+  for model in LISTING_TABLES[listing]:
+      aggregates.append(db.session.query(db.func.max(model.updated_at)).scalar_subquery())
+      if model is not Show:
+          aggregates.append(db.session.query(db.func.count(model.id)).scalar_subquery())
+  return tuple(db.session.query(*aggregates).one())
+
+def get_detail_validators(model, entity_id, current_datetime):
+  # Covers the entity, its shows and the other side of each show. The number
+  # of upcoming shows is included since shows move from the upcoming to the
+  # past section as time goes by. Returns None if there's no entity.
+  foreign_key, counterpart, prefix = DETAIL_PAGES[model]
+  values = db.session.query(model.updated_at, db.func.max(Show.updated_at),
+  db.func.max(counterpart.updated_at), db.func.count(Show.id),
+  db.func.count(db.case([(Show.start_time > current_datetime, Show.id)]))).outerjoin(Show,
+  foreign_key == model.id).outerjoin(counterpart, counterpart.id == getattr(Show, prefix + '_id')).filter(model.id == entity_id).group_by(model.id, model.updated_at).first()
+  if values is None:
+      return None
+  return tuple(values)
+
+#----------------------------------------------------------------------------#
+# Writes.
+#
+# Each function is one transaction (see unit_of_work.py) and returns what
+# the controllers need afterwards, so nothing is reloaded after the commit.
+#----------------------------------------------------------------------------#
+
+def set_genres(model, entity_id, names, replace=True):
+  # Links a venue or an artist to the named genres (unknown names are
+  # ignored), dropping its other genres when replace is set
+  association, foreign_key = GENRE_ASSOCIATIONS[model]
+  if replace:
+      db.session.execute(association.delete().where(foreign_key == entity_id))
+  genre_ids = get_genre_ids()
+  links = [{foreign_key.key: entity_id, 'genre_id': genre_ids[name]} for name in set(names) if name in genre_ids]
+  if links:
+      db.session.execute(association.insert(), links)
+
+@transactional()
+def create_entity(model, details, genres):
+  # Adds a venue or an artist; returns its id, name and city
+  entity = insert_returning(model, details, ('id', 'name', 'city'))
+  set_genres(model, entity['id'], genres, replace=False)
+  return entity
+
+class EditConflict(Exception):
+  # Raised when a venue or an artist was changed by someone else after the
+  # edit form was filled in
+  def __init__(self, model, entity_id):
+      super(EditConflict, self).__init__('%s %s was changed since it was loaded' % (model.__name__, entity_id))
+      self.model = model
+      self.entity_id = entity_id
+
+@transactional()
+def update_entity(model, entity_id, version_id, details, genres):
+  # Updates a venue or an artist from an edit form filled in at version_id,
+  # writing only the columns and genres that differ from the stored ones;
+  # returns its id, name and city, or None if it doesn't exist. Raises
+  # EditConflict if the entity has moved on from version_id.
+  table = model.__table__
+  association, foreign_key = GENRE_ASSOCIATIONS[model]
+  current = db.session.execute(db.select([table.c.version_id, table.c.name, table.c.city] +
+  [table.c[column] for column in details]).where(table.c.id == entity_id)).first()
+  if current is None:
+      return None
+  if current.version_id != version_id:
+      raise EditConflict(model, entity_id)
+
+  changes = dict((column, value) for column, value in details.items() if current._mapping[column] != value)
+  genre_ids = get_genre_ids()
+  current_genres = set(genre_id for (genre_id,) in db.session.query(association.c.genre_id).filter(foreign_key == entity_id))
+  genres_changed = current_genres != set(genre_ids[name] for name in genres if name in genre_ids)
+
+  # Submitting an unchanged form writes nothing; changing only the genres
+  # still bumps the version (and updated_at)
+  if changes or genres_changed:
+      if not update_versioned(model, entity_id, version_id, changes):
+          raise EditConflict(model, entity_id)
+      if genres_changed:
+          set_genres(model, entity_id, genres)
+  entity = dict(id=entity_id, name=current.name, city=current.city)
+  entity.update((column, value) for column, value in changes.items() if column in entity)
+  return entity
+
+@transactional()
+def delete_entities(model, entity_ids):
+  # Deletes venues or artists in one statement; the database deletes their
+  # shows and genre links (ON DELETE CASCADE). Their shows are first taken
+  # off the counters of the artists or venues they were with. Returns the
+  # ids that were deleted and the ids of those artists or venues.
+  if not entity_ids:
+      return [], []
+  related_ids = uncount_shows(model, entity_ids)
+  deleted_ids = [entity_id for (entity_id,) in delete_returning(model.__table__, model.id.in_(entity_ids), ('id',))]
+  return sorted(deleted_ids), related_ids
+
+@transactional()
+def create_show(details):
+  show = insert_returning(Show, details, ('id', 'venue_id', 'artist_id'))
+  count_shows([details])
+  return show
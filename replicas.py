@@ -0,0 +1,176 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import itertools
+import threading
+import time
+from flask import request, session, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.sql.dml import UpdateBase
+from cache import NO_STORE
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#
+# Replicas are binds in SQLALCHEMY_BINDS (by default, those whose key
+# starts with 'replica'), e.g.
+#
+#   FYYUR_SQLALCHEMY_BINDS='{"replica1": "postgresql://replica1/fyyur"}'
+#
+# Views marked with @read_only read from one of them, picked per request
+# by REPLICA_SELECTION: 'round-robin', or 'least-latency' (the replica
+# whose statements have been quickest lately). Everything else, writes
+# included, uses the primary, and so do the reads of a visitor who wrote in
+# the last REPLICA_STICKY_SECONDS, so they see their own changes.
+# For that long after a worker process wrote, pages it reads from replicas
+# aren't cached, so the pages the write invalidated aren't cached again
+# from a replica that's behind. With a cache shared by several workers
+# (CACHE_BACKEND = 'redis'), keep the replicas' lag well under that.
+# Replicas are expected to have the primary's schema; migrations only run
+# against the primary.
+#----------------------------------------------------------------------------#
+
+# Weight of the latest statement in a replica's average latency
+LATENCY_WEIGHT = 0.2
+
+# One least-latency pick in this many goes round-robin instead, so a replica
+# that was slow gets the chance to show it has recovered
+PROBE_EVERY = 20
+
+_last_write = 0.0
+_replicas_lock = threading.Lock()
+
+
+def read_only(view):
+  # Marks a view that doesn't write, so it can read from a replica. Put it
+  # right under the route.
+  view.read_only = True
+  return view
+
+
+class ReplicaSet(object):
+  # The replica binds of an app, and how quick each has been
+
+  def __init__(self, keys):
+      self.keys = keys
+      self.latency = dict((key, None) for key in keys)
+      self.lock = threading.Lock()
+      self.turns = itertools.count()
+
+  def choose(self, selection):
+      turn = next(self.turns)
+      if selection == 'least-latency' and turn % PROBE_EVERY:
+          with self.lock:
+              # Replicas not measured yet go first
+              return min(self.keys, key=lambda key: (self.latency[key] is not None, self.latency[key]))
+      return self.keys[turn % len(self.keys)]
+
+  def observe(self, key, elapsed):
+      with self.lock:
+          average = self.latency[key]
+          self.latency[key] = elapsed if average is None else average + LATENCY_WEIGHT * (elapsed - average)
+
+  def watch(self, key, engine):
+      # Times the statements sent to a replica's engine
+      def start(conn, cursor, statement, parameters, context, executemany):
+          if context is not None:
+              context._replica_started = time.perf_counter()
+
+      def end(conn, cursor, statement, parameters, context, executemany):
+          started = getattr(context, '_replica_started', None)
+          if started is not None:
+              self.observe(key, time.perf_counter() - started)
+
+      event.listen(engine, 'before_cursor_execute', start)
+      event.listen(engine, 'after_cursor_execute', end)
+
+
+class RoutingSession(SignallingSession):
+  # Sends the statements of read-only views to a replica, the same one for
+  # the whole request, and everything else to the primary
+
+  def get_bind(self, mapper=None, clause=None):
+      if not isinstance(clause, UpdateBase) and not self._flushing:
+          key = self.replica_key()
+          if key is not None:
+              return self.app.extensions['sqlalchemy'].db.get_engine(self.app, bind=key)
+      return super(RoutingSession, self).get_bind(mapper, clause)
+
+  def replica_key(self):
+      if not has_request_context():
+          return None
+      # Kept in the environ, which the concurrent queries of a request
+      # (see run_concurrently in queries.py) share
+      if 'fyyur.replica' not in request.environ:
+          request.environ['fyyur.replica'] = choose_replica(self.app)
+      return request.environ['fyyur.replica']
+
+  def commit(self):
+      global _last_write
+      super(RoutingSession, self).commit()
+      # Reads by this visitor stay on the primary for a while, and pages
+      # read from replicas in this process aren't cached
+      _last_write = time.time()
+      if has_request_context():
+          request.environ['fyyur.wrote'] = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+  def create_session(self, options):
+      return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def get_replicas(app):
+  # The app's ReplicaSet, or None without replicas. Built on first use, as
+  # the engines are created lazily.
+  with _replicas_lock:
+      replicas = app.extensions.get('read_replicas')
+      if replicas is None:
+          keys = app.config['REPLICA_BINDS']
+          if keys is None:
+              keys = sorted(key for key in (app.config.get('SQLALCHEMY_BINDS') or {}) if key.startswith('replica'))
+          replicas = ReplicaSet(keys)
+          db = app.extensions['sqlalchemy'].db
+          for key in keys:
+              replicas.watch(key, db.get_engine(app, bind=key))
+          app.extensions['read_replicas'] = replicas
+  return replicas if replicas.keys else None
+
+def choose_replica(app):
+  # The replica bind the current request reads from, or None for the primary
+  view = app.view_functions.get(request.endpoint)
+  if not getattr(view, 'read_only', False):
+      return None
+  replicas = get_replicas(app)
+  if replicas is None:
+      return None
+  if session.get('primary_until', 0) > time.time():
+      return None
+  if time.time() < _last_write + app.config['REPLICA_STICKY_SECONDS']:
+      request.environ[NO_STORE] = True
+  return replicas.choose(app.config['REPLICA_SELECTION'])
+
+
+class ReadReplicas(object):
+
+  def __init__(self, app=None):
+      if app is not None:
+          self.init_app(app)
+
+  def init_app(self, app):
+      app.config.setdefault('REPLICA_BINDS', None)
+      app.config.setdefault('REPLICA_SELECTION', 'round-robin')
+      app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+      app.extensions['read_replicas'] = None
+
+      @app.after_request
+      def stick_to_primary(response):
+          if request.environ.get('fyyur.wrote') and get_replicas(app) is not None:
+              session['primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+          return response
+
+
+replicas = ReadReplicas()
@@ -0,0 +1,424 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from flask import current_app
+from models import db, Venue, Artist, Show, Genre
+
+#----------------------------------------------------------------------------#
+# Search.
+#
+# Venues and artists are matched on name, city and genres, shows on the
+# artist's and venue's names. Two backends are available:
+# - 'postgresql' uses the pg_trgm and full text indexes created by the
+#   d1f3a7c9e2b4 migration (and redefined by e4a9d2b7c815).
+# - 'ngram' keeps an in-process n-gram inverted index, for SQLite and tests.
+# SEARCH_BACKEND selects one of them; 'auto' (the default) picks 'postgresql'
+# when the database is PostgreSQL and 'ngram' otherwise.
+#----------------------------------------------------------------------------#
+
+# Fields matched for each entity, with their weight in the ranking
+SEARCH_FIELDS = {
+  Venue: (('name', 3), ('city', 1), ('genres', 1)),
+  Artist: (('name', 3), ('city', 1), ('genres', 1))
+}
+
+def _words(term):
+  return re.findall(r'\w+', term.lower())
+
+def _document_values(name, city, genres):
+  # The searchable text of a venue or an artist, by field
+  return {
+    'name': name,
+    'city': city,
+    'genres': ' '.join(genres)
+  }
+
+def _in_ids(column, ids):
+  # The ids are written into the statement, so long lists don't run into the
+  # database's limit on bound parameters (999 in older SQLite versions)
+  return column.in_(db.bindparam(None, ids, expanding=True, literal_execute=True))
+
+def _listing_query(model):
+  # Columns used by the search result pages
+  return db.session.query(model.id, model.name)
+
+def _shows_query():
+  return db.session.query(Show.artist_id, Show.venue_id, Show.start_time,
+  Artist.name, Artist.image_link, Venue.name).join(Artist).join(Venue)
+
+
+class PostgresSearchBackend(object):
+  # Matches names and cities with ILIKE, which the pg_trgm GIN indexes can
+  # serve, plus prefix matching through the full text index. Genres are
+  # matched through the genres table. Results are ranked by trigram
+  # similarity of the name and the full text rank.
+
+  def document(self, model):
+      # Must stay identical to the expression indexed in the migration
+      separator = db.literal_column("' '")
+      text = db.func.coalesce(model.name, '') + separator + db.func.coalesce(model.city, '')
+      return db.func.to_tsvector(db.literal_column("'simple'"), text)
+
+  def filter(self, query, model, term):
+      words = _words(term)
+      if not term.strip():
+          return query.order_by(model.name, model.id)
+
+      pattern = '%' + term + '%'
+      criteria = [model.name.ilike(pattern), model.city.ilike(pattern),
+      model.genres.any(Genre.name.ilike(pattern))]
+      rank = db.func.similarity(model.name, term)
+      if words:
+          ts_query = db.func.to_tsquery(db.literal_column("'simple'"),
+          ' & '.join(word + ':*' for word in words))
+          criteria.append(self.document(model).op('@@')(ts_query))
+          rank = rank + db.func.ts_rank(self.document(model), ts_query)
+
+      return query.filter(db.or_(*criteria)).order_by(rank.desc(), model.id)
+
+  def venues(self, term):
+      return self.filter(_listing_query(Venue), Venue, term)
+
+  def artists(self, term):
+      return self.filter(_listing_query(Artist), Artist, term)
+
+  def shows(self, term):
+      query = _shows_query()
+      if not term.strip():
+          return query.order_by(Show.start_time, Show.id)
+
+      pattern = '%' + term + '%'
+      rank = db.func.greatest(db.func.similarity(Artist.name, term),
+      db.func.similarity(Venue.name, term))
+      return query.filter(Artist.name.ilike(pattern) | Venue.name.ilike(pattern)).order_by(rank.desc(), Show.start_time, Show.id)
+
+  # The database maintains its own indexes
+  def index(self, model, entity_id, name, city, genres):
+      pass
+
+  def unindex(self, model, entity_id):
+      pass
+
+
+# Rows updated this long before the latest updated_at an n-gram index has
+# seen are reloaded when it's refreshed
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+# Most venue and artist ids the n-gram backend sends to the database to find
+# the shows matching a term; broader terms are matched on the names instead
+MAX_MATCHED_IDS = 5000
+
+
+class NgramIndex(object):
+  # Inverted index from character n-grams (of length 1 to n) to document ids.
+  # Candidates are the documents containing all of a word's n-grams; they are
+  # then checked for an actual substring match, same as ILIKE '%word%'.
+
+  def __init__(self, fields, n=3):
+      self.fields = fields
+      self.n = n
+      self.postings = defaultdict(set)
+      self.documents = {}
+      # The latest updated_at loaded, and when the database was last checked
+      # for changes (see NgramSearchBackend)
+      self.latest = None
+      self.checked = 0.0
+
+  def grams(self, text):
+      grams = set()
+      for size in range(1, self.n + 1):
+          for i in range(len(text) - size + 1):
+              grams.add(text[i:i + size])
+      return grams
+
+  def add(self, doc_id, values):
+      self.remove(doc_id)
+      document = {}
+      for field, weight in self.fields:
+          text = (values.get(field) or '').lower()
+          document[field] = text
+          for gram in self.grams(text):
+              self.postings[gram].add(doc_id)
+      self.documents[doc_id] = document
+
+  def remove(self, doc_id):
+      document = self.documents.pop(doc_id, None)
+      if document is None:
+          return
+      for text in document.values():
+          for gram in self.grams(text):
+              self.postings[gram].discard(doc_id)
+              if not self.postings[gram]:
+                  del self.postings[gram]
+
+  def candidates(self, word):
+      if len(word) <= self.n:
+          return set(self.postings.get(word, ()))
+      grams = [word[i:i + self.n] for i in range(len(word) - self.n + 1)]
+      grams.sort(key=lambda gram: len(self.postings.get(gram, ())))
+      result = set(self.postings.get(grams[0], ()))
+      for gram in grams[1:]:
+          result &= self.postings.get(gram, set())
+          if not result:
+              break
+      return result
+
+  def search(self, term, fields=None):
+      # Returns (doc_id, score) pairs, best match first. Every word in the
+      # term has to appear in at least one of the searched fields.
+      fields = [(field, weight) for field, weight in self.fields
+      if fields is None or field in fields]
+      words = _words(term)
+      scores = None
+
+      for word in words:
+          word_scores = {}
+          for doc_id in self.candidates(word):
+              document = self.documents[doc_id]
+              score = 0
+              for field, weight in fields:
+                  text = document[field]
+                  if word in text:
+                      score += weight
+                      # Prefix (of the field or of one of its words) bonus
+                      if text.startswith(word) or re.search(r'\W' + re.escape(word), text):
+                          score += weight
+              if score:
+                  word_scores[doc_id] = score
+          if scores is None:
+              scores = word_scores
+          else:
+              scores = {doc_id: score + word_scores[doc_id] for doc_id, score
+              in scores.items() if doc_id in word_scores}
+          if not scores:
+              break
+
+      return sorted((scores or {}).items(), key=lambda item: (-item[1], item[0]))
+
+
+class NgramSearchBackend(object):
+  # Keeps one NgramIndex per searchable model. Indexes are built from the
+  # database on first use and kept current by the write controllers of this
+  # process. Writes made elsewhere (other worker processes, flask import,
+  # migrations) are picked up every SEARCH_REFRESH_SECONDS: when the row
+  # count or the latest updated_at changed, rows updated since the last
+  # refresh are reloaded, and deleted ones dropped. None turns refreshing
+  # off, for a single process.
+
+  def __init__(self):
+      self.indexes = {}
+      self.lock = threading.Lock()
+
+  def get_index(self, model):
+      with self.lock:
+          index = self.indexes.get(model)
+          if index is None:
+              index = NgramIndex(SEARCH_FIELDS[model])
+              self.load(model, index)
+              self.indexes[model] = index
+          elif self.refresh_due(index):
+              self.refresh(model, index)
+          return index
+
+  def load(self, model, index, since=None):
+      # Adds the venues or artists updated since the given time (all of them
+      # without one) to the index
+      # One row per genre, in a single statement
+      rows = db.session.query(model.id, model.name, model.city, model.updated_at,
+      Genre.name).outerjoin(model.genres)
+      if since is not None:
+          rows = rows.filter(model.updated_at >= since)
+      documents = {}
+      for entity_id, name, city, updated_at, genre in rows:
+          document = documents.setdefault(entity_id, (name, city, []))
+          if genre is not None:
+              document[2].append(genre)
+          if index.latest is None or updated_at > index.latest:
+              index.latest = updated_at
+      for entity_id, document in documents.items():
+          index.add(entity_id, _document_values(*document))
+      index.checked = time.time()
+
+  def refresh_due(self, index):
+      seconds = current_app.config['SEARCH_REFRESH_SECONDS']
+      return seconds is not None and time.time() >= index.checked + seconds
+
+  def refresh(self, model, index):
+      count, latest = db.session.query(db.func.count(model.id), db.func.max(model.updated_at)).one()
+      index.checked = time.time()
+      if count == len(index.documents) and latest == index.latest:
+          return
+      if latest is not None:
+          # Other processes stamp updated_at with their own clocks, and may
+          # commit after a later stamp was read, so the window starts a bit
+          # before the latest time seen
+          self.load(model, index, None if index.latest is None else index.latest - REFRESH_OVERLAP)
+      if count != len(index.documents):
+          entity_ids = set(entity_id for entity_id, in db.session.query(model.id))
+          for doc_id in [doc_id for doc_id in index.documents if doc_id not in entity_ids]:
+              index.remove(doc_id)
+
+  def match(self, model, term, fields=None):
+      index = self.get_index(model)
+      with self.lock:
+          return index.search(term, fields)
+
+  def filter(self, query, model, term):
+      if not _words(term):
+          return query.order_by(model.name, model.id)
+      return RankedResults(query, model.id, [doc_id for doc_id, score in self.match(model, term)])
+
+  def venues(self, term):
+      return self.filter(_listing_query(Venue), Venue, term)
+
+  def artists(self, term):
+      return self.filter(_listing_query(Artist), Artist, term)
+
+  def shows(self, term):
+      query = _shows_query()
+      if not _words(term):
+          return query.order_by(Show.start_time, Show.id)
+
+      artist_ids = [doc_id for doc_id, score in self.match(Artist, term, ('name',))]
+      venue_ids = [doc_id for doc_id, score in self.match(Venue, term, ('name',))]
+      if not artist_ids and not venue_ids:
+          return query.filter(db.false())
+      if len(artist_ids) + len(venue_ids) <= MAX_MATCHED_IDS:
+          # Looked up through the shows' artist_id and venue_id indexes
+          criteria = _in_ids(Show.artist_id, artist_ids) | _in_ids(Show.venue_id, venue_ids)
+      else:
+          # A term this broad matches most shows anyway; the names are
+          # matched in the join rather than sent as huge id lists
+          criteria = db.or_(*[db.and_(*[column.ilike('%' + word + '%') for word in _words(term)])
+          for column in (Artist.name, Venue.name)])
+      return query.filter(criteria).order_by(Show.start_time, Show.id)
+
+  def index(self, model, entity_id, name, city, genres):
+      with self.lock:
+          index = self.indexes.get(model)
+          if index is not None:
+              index.add(entity_id, _document_values(name, city, genres))
+
+  def unindex(self, model, entity_id):
+      with self.lock:
+          index = self.indexes.get(model)
+          if index is not None:
+              index.remove(entity_id)
+
+
+BACKENDS = {
+  'postgresql': PostgresSearchBackend,
+  'ngram': NgramSearchBackend
+}
+
+
+class RankedResults(object):
+  # Matches ranked by the n-gram backend: the matched ids, best first, and
+  # the query to look them up with. Pages are cut from the id list, so only
+  # the ids of the page requested are sent to the database, and the total
+  # is the length of the list.
+
+  def __init__(self, query, column, ids):
+      self.query = query
+      self.column = column
+      self.ids = ids
+
+  def paginate(self, page, per_page):
+      ids = self.ids[(page - 1) * per_page:page * per_page]
+      rows = self.query.filter(self.column.in_(ids)).all() if ids else []
+      position = dict((doc_id, i) for i, doc_id in enumerate(ids))
+      rows.sort(key=lambda row: position[getattr(row, self.column.key)])
+      return SearchPage(rows, len(self.ids), page, per_page)
+
+
+class SearchPage(object):
+  # One page of search results along with the total number of matches
+
+  def __init__(self, items, total, page, per_page):
+      self.items = items
+      self.total = total
+      self.page = page
+      self.per_page = per_page
+
+  @property
+  def has_prev(self):
+      return self.page > 1
+
+  @property
+  def has_next(self):
+      return self.page * self.per_page < self.total
+
+
+def execute_search(query, page=1, per_page=20):
+  # Gets one page of results and the total number of matches in a single
+  # round trip, using a COUNT(*) OVER () window over the unpaged query
+  offset = (page - 1) * per_page
+  rows = query.add_columns(db.func.count().over().label('total')).limit(per_page).offset(offset).all()
+
+  if rows:
+      total = rows[0].total
+  elif page > 1:
+      # Past the last page, the window has no row to report the total on
+      total = query.order_by(None).count()
+  else:
+      total = 0
+
+  return SearchPage(rows, total, page, per_page)
+
+
+class Search(object):
+  # Flask extension giving the controllers access to the configured backend
+
+  def __init__(self, app=None):
+      if app is not None:
+          self.init_app(app)
+
+  def init_app(self, app):
+      app.config.setdefault('SEARCH_BACKEND', 'auto')
+      app.config.setdefault('SEARCH_PAGE_SIZE', 20)
+      app.config.setdefault('SEARCH_REFRESH_SECONDS', 10)
+      # The backend is created on first use, once the database URL is known
+      app.extensions['search'] = None
+
+  @property
+  def backend(self):
+      app = current_app._get_current_object()
+      backend = app.extensions.get('search')
+      if backend is None:
+          name = app.config['SEARCH_BACKEND']
+          if name == 'auto':
+              name = 'postgresql' if db.engine.dialect.name == 'postgresql' else 'ngram'
+          backend = BACKENDS[name]()
+          app.extensions['search'] = backend
+      return backend
+
+  def venues(self, term):
+      return self.backend.venues(term)
+
+  def artists(self, term):
+      return self.backend.artists(term)
+
+  def shows(self, term):
+      return self.backend.shows(term)
+
+  def paginate(self, results, page=1):
+      # results is what venues, artists or shows returned
+      per_page = current_app.config['SEARCH_PAGE_SIZE']
+      if isinstance(results, RankedResults):
+          return results.paginate(page, per_page)
+      return execute_search(results, page, per_page)
+
+  def index(self, model, entity_id, name, city, genres):
+      self.backend.index(model, entity_id, name, city, genres)
+
+  def unindex(self, model, entity_id):
+      self.backend.unindex(model, entity_id)
+
+
+search = Search()
@@ -3,14 +3,14 @@ window.parseISOString = function parseISOString(s) {
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
 
-if(window.location.pathname.substr(0, 8) == '/venues/' && window.location.pathname.substr(7,8) != '/create')
+//sends delete request to the server from a venue's or an artist's page
+var deleteBtn = document.getElementById('deleteBtn');
+if(deleteBtn)
 	{
-		//sends delete request to the server
-		document.getElementById('deleteBtn').addEventListener('click', function(e) {
+		deleteBtn.addEventListener('click', function(e) {
 			e.preventDefault();
-			let numVenue = e.target.dataset.id;
 
-			fetch(`/venues/${numVenue}`, {
+			fetch(e.target.dataset.url, {
 				method: 'DELETE'
 			});
 		});
@@ -0,0 +1,110 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import tempfile
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+
+#----------------------------------------------------------------------------#
+# Template cache.
+#
+# Templates are compiled to Python bytecode once and kept in
+# TEMPLATE_CACHE_DIR, so new worker processes load them instead of parsing
+# and compiling every template on its first use. The directory is filled at
+# build time with
+#
+#   flask templates warm [--clear]
+#
+# and with PRELOAD_TEMPLATES set, every template is loaded when the app
+# starts rather than by the first request using it.
+#----------------------------------------------------------------------------#
+
+class AtomicBytecodeCache(FileSystemBytecodeCache):
+  # Worker processes share the directory, so files are written under a
+  # temporary name and renamed into place, and a reader never sees half a
+  # file. A file that can't be written or read is compiled from source.
+
+  def dump_bytecode(self, bucket):
+      filename = self._get_cache_filename(bucket)
+      try:
+          fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+      except OSError:
+          return
+      try:
+          with os.fdopen(fd, 'wb') as f:
+              bucket.write_bytecode(f)
+          os.replace(temporary, filename)
+      except OSError:
+          if os.path.exists(temporary):
+              os.remove(temporary)
+
+  def load_bytecode(self, bucket):
+      try:
+          super(AtomicBytecodeCache, self).load_bytecode(bucket)
+      except Exception:
+          bucket.reset()
+
+
+def load_templates(app):
+  # Loads every template into the environment's in-memory cache, from the
+  # bytecode cache when it's there; returns their names
+  env = app.jinja_env
+  names = [name for name in env.list_templates() if name.endswith('.html')]
+  for name in names:
+      env.get_template(name)
+  return names
+
+
+class TemplateCache(object):
+
+  def __init__(self, app=None):
+      if app is not None:
+          self.init_app(app)
+
+  def init_app(self, app):
+      # Call once the template filters are registered, as templates using
+      # an unknown filter don't compile
+      app.config.setdefault('TEMPLATE_CACHE_DIR', None)
+      app.config.setdefault('PRELOAD_TEMPLATES', False)
+
+      directory = app.config['TEMPLATE_CACHE_DIR']
+      if directory:
+          try:
+              os.makedirs(directory, exist_ok=True)
+              app.jinja_env.bytecode_cache = AtomicBytecodeCache(directory)
+          except OSError:
+              app.logger.warning('Template cache directory %s is not usable; compiling templates from source', directory)
+
+      if app.config['PRELOAD_TEMPLATES']:
+          load_templates(app)
+
+
+template_cache = TemplateCache()
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@click.group('templates')
+def templates_command():
+  """Manage the compiled template cache."""
+
+@templates_command.command('warm')
+@click.option('--clear', is_flag=True, help='Drop the cached templates first.')
+@with_appcontext
+def warm_command(clear):
+  """Compile every template into the template cache."""
+  bytecode_cache = current_app.jinja_env.bytecode_cache
+  if bytecode_cache is None:
+      raise click.UsageError('TEMPLATE_CACHE_DIR is not set')
+  if clear:
+      bytecode_cache.clear()
+
+  started = time.time()
+  names = load_templates(current_app)
+  click.echo('Cached %d templates in %s in %.2fs' % (len(names), bytecode_cache.directory, time.time() - started))
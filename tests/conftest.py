@@ -0,0 +1,21 @@
+#----------------------------------------------------------------------------#
+# Shared test setup. Each test module gets an app of its own, on a scratch
+# SQLite database seeded with synthetic data (see benchmarks/common.py).
+#
+#   python -m pytest tests
+#----------------------------------------------------------------------------#
+
+import pytest
+from benchmarks.common import create_bench_app, seed
+
+
+@pytest.fixture(scope='module')
+def app():
+  app = create_bench_app()
+  seed(app, num_cities=50, num_venues=500, num_artists=500, num_shows=5000)
+  app.config['WTF_CSRF_ENABLED'] = False
+  return app
+
+@pytest.fixture
+def client(app):
+  return app.test_client()
@@ -0,0 +1,28 @@
+#----------------------------------------------------------------------------#
+# Ids out of the database's integer range.
+#----------------------------------------------------------------------------#
+
+import pytest
+
+BAD_IDS = ['99999999999999999999', '-99999999999999999999', '1,%d' % 2 ** 63]
+
+
+@pytest.mark.parametrize('resource', ['venues', 'artists', 'shows'])
+@pytest.mark.parametrize('ids', BAD_IDS)
+def test_api_rejects_ids_out_of_range(client, resource, ids):
+  response = client.get('/api/v1/' + resource, query_string={'ids': ids})
+  assert response.status_code == 400
+
+
+@pytest.mark.parametrize('resource', ['venues', 'artists'])
+@pytest.mark.parametrize('ids', BAD_IDS)
+def test_batch_deletes_reject_ids_out_of_range(client, resource, ids):
+  response = client.delete('/' + resource, query_string={'ids': ids})
+  assert response.status_code == 400
+
+
+@pytest.mark.parametrize('name', ['venue_id', 'artist_id'])
+@pytest.mark.parametrize('value', ['99999999999999999999', '-99999999999999999999'])
+def test_exports_reject_ids_out_of_range(client, name, value):
+  response = client.get('/shows/export.csv', query_string={name: value})
+  assert response.status_code == 400
@@ -0,0 +1,38 @@
+#----------------------------------------------------------------------------#
+# Conditional GETs.
+#----------------------------------------------------------------------------#
+
+import pytest
+from datetime import datetime, timedelta
+from werkzeug.http import http_date
+
+PAGES = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1']
+
+
+@pytest.mark.parametrize('path', PAGES)
+def test_a_current_copy_gets_a_304(client, path):
+  etag = client.get(path).headers['ETag']
+  response = client.get(path, headers={'If-None-Match': etag})
+  assert response.status_code == 304
+  assert response.headers['ETag'] == etag
+
+
+@pytest.mark.parametrize('path', PAGES)
+def test_pages_have_no_last_modified(client, path):
+  response = client.get(path)
+  assert 'Last-Modified' not in response.headers
+  later = http_date(datetime.utcnow() + timedelta(days=1))
+  assert client.get(path, headers={'If-Modified-Since': later}).status_code == 200
+
+
+# A listing and a batch delete changing it
+DELETES = [('/venues', '/venues?ids=490'), ('/artists', '/artists?ids=490'), ('/shows', '/venues?ids=491')]
+
+
+@pytest.mark.parametrize('path,delete', DELETES)
+def test_deletes_change_the_listings(client, path, delete):
+  etag = client.get(path).headers['ETag']
+  assert client.delete(delete).status_code == 200
+  response = client.get(path, headers={'If-None-Match': etag})
+  assert response.status_code == 200
+  assert response.headers['ETag'] != etag
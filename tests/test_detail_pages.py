@@ -0,0 +1,11 @@
+#----------------------------------------------------------------------------#
+# Venue and artist pages.
+#----------------------------------------------------------------------------#
+
+import pytest
+
+
+@pytest.mark.parametrize('path', ['/venues/1', '/artists/1'])
+def test_show_lists_start_past_the_end(client, path):
+  response = client.get(path + '?past_from=99999999999999999999&upcoming_from=99999999999999999999')
+  assert response.status_code == 200
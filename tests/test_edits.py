@@ -0,0 +1,36 @@
+#----------------------------------------------------------------------------#
+# Venue and artist edits, with optimistic concurrency control.
+#----------------------------------------------------------------------------#
+
+import re
+import pytest
+
+FORMS = {
+  'venues': {'city': 'City 1', 'state': 'S01', 'address': '1 Main St', 'genres': ['Jazz']},
+  'artists': {'city': 'City 1', 'state': 'S01', 'genres': ['Jazz']}
+}
+
+
+def version_of(page):
+  return re.search(r'name="version_id"[^>]*value="(\d+)"|value="(\d+)"[^>]*name="version_id"', page).group(1)
+
+@pytest.mark.parametrize('kind', ['venues', 'artists'])
+def test_a_resubmit_after_a_conflict_succeeds(app, kind):
+  path = '/%s/2/edit' % kind
+  alice = app.test_client()
+  bob = app.test_client()
+  version = version_of(alice.get(path).get_data(as_text=True))
+  assert version_of(bob.get(path).get_data(as_text=True)) == version
+
+  response = alice.post(path, data=dict(FORMS[kind], name='Alice', version_id=version))
+  assert response.status_code == 302
+  conflict = bob.post(path, data=dict(FORMS[kind], name='Bob', version_id=version))
+  assert conflict.status_code == 409
+  page = conflict.get_data(as_text=True)
+  # The form shows the current row, and its version
+  assert 'value="Alice"' in page
+  current = version_of(page)
+  assert current != version
+
+  response = bob.post(path, data=dict(FORMS[kind], name='Bob', version_id=current))
+  assert response.status_code == 302
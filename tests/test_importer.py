@@ -0,0 +1,31 @@
+#----------------------------------------------------------------------------#
+# flask import.
+#----------------------------------------------------------------------------#
+
+import json
+from datetime import datetime
+from models import db, Show
+
+
+def run_import(app, tmp_path, kind, rows):
+  path = tmp_path / (kind + '.ndjson')
+  path.write_text(''.join(json.dumps(row) + '\n' for row in rows))
+  return app.test_cli_runner().invoke(args=['import', kind, str(path)])
+
+def test_imports_shows(app, tmp_path):
+  result = run_import(app, tmp_path, 'shows', [{'artist_id': 1, 'venue_id': 1, 'start_time': '2030-01-02 20:00:00'}])
+  assert '1 rejected' not in result.output
+  with app.app_context():
+      assert db.session.query(Show).filter(Show.start_time == datetime(2030, 1, 2, 20)).count() == 1
+
+def test_rows_missing_required_keys_are_rejected(app, tmp_path):
+  with app.app_context():
+      shows = db.session.query(Show).count()
+  result = run_import(app, tmp_path, 'shows', [{'artist_id': 1, 'venue_id': 1}])
+  assert 'start_time: This field is required.' in result.output
+  assert '0 shows' in result.output and '1 rejected' in result.output
+  with app.app_context():
+      assert db.session.query(Show).count() == shows
+
+  result = run_import(app, tmp_path, 'venues', [{'name': 'No City', 'state': 'CA', 'address': '1 Main St'}])
+  assert 'city: This field is required.' in result.output
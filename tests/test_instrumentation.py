@@ -0,0 +1,20 @@
+#----------------------------------------------------------------------------#
+# Request instrumentation.
+#----------------------------------------------------------------------------#
+
+from benchmarks.common import create_bench_app
+
+
+def test_metrics_are_off_by_default(client):
+  assert client.get('/metrics').status_code == 404
+
+def test_metrics_are_served_at_metrics_url(monkeypatch):
+  monkeypatch.setenv('FYYUR_METRICS_URL', '/internal/metrics')
+  client = create_bench_app().test_client()
+  client.get('/')
+  response = client.get('/internal/metrics')
+  assert response.status_code == 200
+  assert 'fyyur_requests_total{endpoint="index",method="GET",status="200"} 1' in response.get_data(as_text=True)
+
+def test_responses_carry_server_timing(client):
+  assert 'db;dur=' in client.get('/venues').headers['Server-Timing']
@@ -0,0 +1,23 @@
+#----------------------------------------------------------------------------#
+# Show listings.
+#----------------------------------------------------------------------------#
+
+import pytest
+
+
+@pytest.mark.parametrize('start_time', [None, '', 'tomorrow', '2030-02-30 20:00:00'])
+def test_a_bad_start_time_shows_the_form_again(client, start_time):
+  data = {'venue_id': '1', 'artist_id': '1'}
+  if start_time is not None:
+      data['start_time'] = start_time
+  response = client.post('/shows/create', data=data)
+  assert response.status_code == 400
+  page = response.get_data(as_text=True)
+  assert 'The start time must be given as YYYY-MM-DD HH:MM:SS' in page
+  assert 'name="venue_id"' in page
+
+
+def test_a_show_is_listed(client):
+  response = client.post('/shows/create', data={'venue_id': '1', 'artist_id': '1', 'start_time': '2030-01-01 20:00:00'})
+  assert response.status_code == 200
+  assert 'Show was successfully listed!' in response.get_data(as_text=True)
@@ -0,0 +1,33 @@
+#----------------------------------------------------------------------------#
+# Keyset pagination tokens.
+#----------------------------------------------------------------------------#
+
+import pytest
+from pagination import encode_token
+
+# Tokens a client could make up, for any listing
+BAD_TOKENS = [
+  encode_token([[{'a': 1}, 1], 1]),
+  encode_token([{'a': 1}, 1]),
+  encode_token(['Artist 1', 2 ** 70]),
+  encode_token(['Artist 1', True]),
+  encode_token(['Artist 1']),
+  'not a token'
+]
+# and for the shows listings, keyed on (start_time, id)
+BAD_SHOW_TOKENS = [
+  encode_token(['99999999999-01-01', 1]),
+  encode_token([1, 1])
+]
+
+LISTINGS = ['/venues', '/artists', '/shows', '/api/v1/venues', '/api/v1/artists', '/api/v1/shows']
+
+
+@pytest.mark.parametrize('path,token', [(path, token) for path in LISTINGS for token in BAD_TOKENS]
++ [(path, token) for path in LISTINGS if path.endswith('shows') for token in BAD_SHOW_TOKENS])
+@pytest.mark.parametrize('direction', ['after', 'before'])
+def test_bad_tokens_get_the_first_page(client, path, direction, token):
+  response = client.get(path, query_string={direction: token})
+  assert response.status_code == 200
+  first = client.get(path)
+  assert response.get_data() == first.get_data()
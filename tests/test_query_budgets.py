@@ -0,0 +1,93 @@
+#----------------------------------------------------------------------------#
+# Query budgets of every route.
+#
+# Requests every route of the app against a database big enough for N+1
+# queries to show, with the caches a worker fills as it goes (pages, genres,
+# search index) empty, so each request costs what it does at worst. The app
+# is in testing mode, where a request over its view's @query_budget or
+# repeating a statement more than QUERY_REPEAT_LIMIT times raises
+# QueryBudgetExceeded. Every view must have a budget and every route must
+# be exercised here.
+#----------------------------------------------------------------------------#
+
+import pytest
+import queries
+from datetime import datetime, timedelta
+
+# Endpoints that don't use the database
+EXEMPT = {'static', 'asset', 'metrics'}
+
+START_TIME = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+
+ENTITY_FORM = {
+  'name': 'Budget', 'city': 'City 1', 'state': 'S01', 'address': '1 Main St',
+  'phone': '555-555-5555', 'genres': ['Jazz', 'Rock n Roll'], 'facebook_link': 'https://www.facebook.com/budget',
+  'image_link': 'https://example.com/budget.jpg', 'website': 'https://example.com'
+}
+
+# (method, path, form data) in the order they're run; the deletes come last
+REQUESTS = [
+  ('GET', '/', None),
+  ('GET', '/venues', None),
+  ('GET', '/venues?genre=Jazz', None),
+  ('POST', '/venues/search', {'search_term': 'venue 1'}),
+  ('GET', '/venues/1', None),
+  ('GET', '/venues/1?past_from=21&upcoming_from=21', None),
+  ('GET', '/venues/create', None),
+  ('POST', '/venues/create', ENTITY_FORM),
+  ('GET', '/venues/1/edit', None),
+  ('POST', '/venues/1/edit', dict(ENTITY_FORM, version_id='1')),
+  ('GET', '/artists', None),
+  ('GET', '/artists?genre=Jazz', None),
+  ('POST', '/artists/search', {'search_term': 'artist 1'}),
+  ('GET', '/artists/1', None),
+  ('GET', '/artists/1?past_from=21&upcoming_from=21', None),
+  ('GET', '/artists/create', None),
+  ('POST', '/artists/create', ENTITY_FORM),
+  ('GET', '/artists/1/edit', None),
+  ('POST', '/artists/1/edit', dict(ENTITY_FORM, version_id='1')),
+  ('GET', '/shows', None),
+  ('GET', '/shows/export.csv', None),
+  ('GET', '/shows/export.ndjson?gzip=1', None),
+  ('POST', '/shows/search', {'search_term': 'venue 1'}),
+  ('GET', '/shows/create', None),
+  ('POST', '/shows/create', {'venue_id': '2', 'artist_id': '2', 'start_time': START_TIME}),
+  ('GET', '/api/v1/venues', None),
+  ('GET', '/api/v1/artists?fields=id,name,genres', None),
+  ('GET', '/api/v1/shows?ids=1,2,3', None),
+  ('GET', '/api/v1/venues/1', None),
+  ('DELETE', '/venues/3', None),
+  ('DELETE', '/venues?ids=4,5,6', None),
+  ('DELETE', '/artists/3', None),
+  ('DELETE', '/artists?ids=4,5,6', None)
+]
+
+
+
+def match(app, method, path):
+  return app.url_map.bind('localhost').match(path.split('?')[0], method=method, return_rule=True)[0]
+
+@pytest.mark.parametrize('method,path,data', REQUESTS)
+def test_request_is_within_budget(app, method, path, data):
+  from app import cache
+  with app.app_context():
+      cache.clear()
+  queries._genre_ids = None
+  app.extensions['search'] = None
+  # Without the session (and flashed messages) of earlier requests
+  client = app.test_client()
+  response = client.open(path, method=method, data=data)
+  # Streamed responses query as they're read
+  response.get_data()
+  assert response.status_code < 500
+
+def test_every_view_has_a_budget(app):
+  missing = [rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint not in EXEMPT
+  and getattr(app.view_functions[rule.endpoint], 'query_budget', None) is None]
+  assert missing == []
+
+def test_every_route_is_exercised(app):
+  exercised = set((match(app, method, path).endpoint, method) for method, path, data in REQUESTS)
+  missing = ['%s %s' % (method, rule.rule) for rule in app.url_map.iter_rules() if rule.endpoint not in EXEMPT
+  for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}) if (rule.endpoint, method) not in exercised]
+  assert missing == []
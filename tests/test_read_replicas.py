@@ -0,0 +1,126 @@
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#
+# Copies the seeded primary to two replica files, each with venue 1 renamed
+# so the pages show which database they came from, and checks that
+# - read-only views take turns on the replicas ('round-robin'), and avoid
+#   a slow one ('least-latency');
+# - other views (edit forms) and writes use the primary;
+# - after a write, the visitor who wrote reads from the primary for
+#   REPLICA_STICKY_SECONDS, while pages other visitors read from replicas
+#   in that time aren't cached;
+# - a venue page loading its queries concurrently reads from one replica.
+#----------------------------------------------------------------------------#
+
+import sqlite3
+import time
+import pytest
+from sqlalchemy import event
+from benchmarks.common import create_bench_app, seed
+from cache import NullCache, LRUCache, CacheStats
+import replicas
+
+NAMES = {'primary': 'Venue 0', 'replica1': 'Replica One', 'replica2': 'Replica Two'}
+
+
+def make_replica(primary_path, path, name):
+  # A copy of the primary, with venue 1 renamed
+  source = sqlite3.connect(primary_path)
+  target = sqlite3.connect(path)
+  source.backup(target)
+  target.execute('UPDATE venues SET name = ? WHERE id = 1', (name,))
+  target.commit()
+  source.close()
+  target.close()
+
+def source_of(client, path):
+  # Which database a page about venue 1 came from
+  page = client.get(path).get_data(as_text=True)
+  found = [key for key, name in NAMES.items() if name in page]
+  return found[0] if len(found) == 1 else None
+
+
+@pytest.fixture(scope='module')
+def app():
+  app = create_bench_app()
+  seed(app, num_cities=5, num_venues=50, num_artists=50, num_shows=500)
+  primary_path = app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):]
+  binds = {}
+  for key in ('replica1', 'replica2'):
+      path = primary_path + '.' + key
+      make_replica(primary_path, path, NAMES[key])
+      binds[key] = 'sqlite:///' + path
+
+  # Pages are rendered every time
+  app.extensions['response_cache'] = NullCache(CacheStats())
+  app.config.update(SQLALCHEMY_BINDS=binds, WTF_CSRF_ENABLED=False, CONDITIONAL_GET=False,
+  REPLICA_STICKY_SECONDS=10)
+  return app
+
+@pytest.fixture(autouse=True)
+def fresh_replicas(app):
+  # Round-robin from the first replica, and nothing written lately
+  app.config['REPLICA_SELECTION'] = 'round-robin'
+  app.extensions['read_replicas'] = None
+  replicas._last_write = 0.0
+
+
+def test_read_only_views_take_turns_on_the_replicas(client):
+  assert [source_of(client, '/venues/1') for i in range(4)] == ['replica1', 'replica2', 'replica1', 'replica2']
+  assert source_of(client, '/venues') in ('replica1', 'replica2')
+
+def test_edit_forms_read_from_the_primary(client):
+  assert source_of(client, '/venues/1/edit') == 'primary'
+
+def test_concurrent_queries_read_from_the_request_replica(app, client):
+  app.config['CONCURRENT_QUERIES'] = True
+  try:
+      sources = [source_of(client, '/venues/1') for i in range(4)]
+  finally:
+      app.config['CONCURRENT_QUERIES'] = False
+  assert sources == ['replica1', 'replica2', 'replica1', 'replica2']
+
+def test_writes_go_to_the_primary(app):
+  writer = app.test_client()
+  reader = app.test_client()
+  response = writer.post('/venues/create', data={'name': 'Written', 'city': 'City 1', 'state': 'S01',
+  'address': '1 Main St', 'genres': ['Jazz']})
+  assert response.status_code == 200
+  counts = {}
+  for key, url in [('primary', app.config['SQLALCHEMY_DATABASE_URI'])] + sorted(app.config['SQLALCHEMY_BINDS'].items()):
+      connection = sqlite3.connect(url[len('sqlite:///'):])
+      counts[key] = connection.execute("SELECT count(*) FROM venues WHERE name = 'Written'").fetchone()[0]
+      connection.close()
+  assert counts == {'primary': 1, 'replica1': 0, 'replica2': 0}
+
+  assert source_of(writer, '/venues/1') == 'primary'
+  assert source_of(reader, '/venues/1') in ('replica1', 'replica2')
+
+def test_pages_read_from_replicas_right_after_a_write_are_not_cached(app, client):
+  store = LRUCache(CacheStats())
+  app.extensions['response_cache'] = store
+  try:
+      replicas._last_write = time.time()
+      assert source_of(client, '/venues/1') in ('replica1', 'replica2')
+      assert not store.entries
+      # As if REPLICA_STICKY_SECONDS had gone by
+      replicas._last_write = 0.0
+      assert source_of(client, '/venues/1') in ('replica1', 'replica2')
+      assert store.entries
+  finally:
+      app.extensions['response_cache'] = NullCache(CacheStats())
+
+def test_least_latency_avoids_a_slow_replica(app, client):
+  app.config['REPLICA_SELECTION'] = 'least-latency'
+  with app.app_context():
+      engine = app.extensions['sqlalchemy'].db.get_engine(app, bind='replica1')
+      # The replicas' timing listeners go first, so they count the delay
+      replicas.get_replicas(app)
+  def delay(*args):
+      time.sleep(0.02)
+  event.listen(engine, 'before_cursor_execute', delay)
+  try:
+      sources = [source_of(client, '/venues/1') for i in range(40)]
+  finally:
+      event.remove(engine, 'before_cursor_execute', delay)
+  assert sources.count('replica2') >= 30
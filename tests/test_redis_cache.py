@@ -0,0 +1,173 @@
+#----------------------------------------------------------------------------#
+# The Redis cache backend, against a stand-in server.
+#
+# The stand-in speaks the Redis protocol and implements the commands
+# RedisCache sends (GET, SET with PX, SADD, SMEMBERS, PEXPIRE, DEL, KEYS,
+# SELECT), with a keyspace per database.
+#----------------------------------------------------------------------------#
+
+import fnmatch
+import socketserver
+import threading
+import time
+import pytest
+from benchmarks.common import create_bench_app, seed
+from cache import CacheStats, RedisCache
+
+
+class StandInRedis(socketserver.ThreadingTCPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self):
+      socketserver.ThreadingTCPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+      self.lock = threading.Lock()
+      # Database number -> key -> (value, expiry time or None)
+      self.databases = {}
+      self.commands = []
+
+  def keyspace(self, database):
+      keys = self.databases.setdefault(database, {})
+      now = time.time()
+      for key in [key for key, (value, expiry) in keys.items() if expiry is not None and expiry <= now]:
+          del keys[key]
+      return keys
+
+
+class StandInHandler(socketserver.StreamRequestHandler):
+
+  def handle(self):
+      self.database = 0
+      while True:
+          line = self.rfile.readline()
+          if not line:
+              return
+          args = []
+          for i in range(int(line[1:-2])):
+              length = int(self.rfile.readline()[1:-2])
+              args.append(self.rfile.read(length + 2)[:-2])
+          with self.server.lock:
+              self.server.commands.append(args[0].decode().upper())
+              reply = self.run(args[0].decode().upper(), args[1:])
+          self.wfile.write(self.encode(reply))
+
+  def run(self, command, args):
+      keys = self.server.keyspace(self.database)
+      if command == 'SELECT':
+          self.database = int(args[0])
+          return 'OK'
+      if command == 'GET':
+          value = keys.get(args[0])
+          return value[0] if value else None
+      if command == 'SET':
+          expiry = time.time() + int(args[3]) / 1000.0 if len(args) > 2 and args[2].upper() == b'PX' else None
+          keys[args[0]] = (args[1], expiry)
+          return 'OK'
+      if command == 'SADD':
+          members, expiry = keys.get(args[0], (set(), None))
+          added = len(set(args[1:]) - members)
+          keys[args[0]] = (members | set(args[1:]), expiry)
+          return added
+      if command == 'SMEMBERS':
+          return sorted(keys.get(args[0], (set(), None))[0])
+      if command == 'PEXPIRE':
+          if args[0] not in keys:
+              return 0
+          keys[args[0]] = (keys[args[0]][0], time.time() + int(args[1]) / 1000.0)
+          return 1
+      if command == 'DEL':
+          return sum(keys.pop(key, None) is not None for key in args)
+      if command == 'KEYS':
+          pattern = args[0].decode()
+          return sorted(key for key in keys if fnmatch.fnmatchcase(key.decode(), pattern))
+      return Exception('unknown command ' + command)
+
+  def encode(self, reply):
+      if reply is None:
+          return b'$-1\r\n'
+      if isinstance(reply, Exception):
+          return b'-ERR %s\r\n' % str(reply).encode()
+      if isinstance(reply, str):
+          return b'+%s\r\n' % reply.encode()
+      if isinstance(reply, int):
+          return b':%d\r\n' % reply
+      if isinstance(reply, list):
+          return b'*%d\r\n' % len(reply) + b''.join(self.encode(item) for item in reply)
+      return b'$%d\r\n%s\r\n' % (len(reply), reply)
+
+
+@pytest.fixture
+def server():
+  server = StandInRedis()
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  yield server
+  server.shutdown()
+  server.server_close()
+
+def url_of(server, database=0):
+  return 'redis://127.0.0.1:%d/%d' % (server.server_address[1], database)
+
+
+def test_get_and_set(server):
+  cache = RedisCache(CacheStats(), url_of(server))
+  assert cache.get('venue:1|/venues/1') is None
+  cache.set('venue:1', 'venue:1|/venues/1', b'page', 60)
+  assert cache.get('venue:1|/venues/1') == b'page'
+
+def test_entries_expire(server):
+  cache = RedisCache(CacheStats(), url_of(server))
+  cache.set('venues', 'venues|/venues', b'page', 0.05)
+  time.sleep(0.1)
+  assert cache.get('venues|/venues') is None
+
+def test_delete_namespace_only_drops_its_keys(server):
+  cache = RedisCache(CacheStats(), url_of(server))
+  cache.set('venue:1', 'venue:1|/venues/1', b'one', 60)
+  cache.set('venue:1', 'venue:1|/venues/1?past_from=21', b'one, later', 60)
+  cache.set('venue:2', 'venue:2|/venues/2', b'two', 60)
+  cache.delete_namespace('venue:1')
+  assert cache.get('venue:1|/venues/1') is None
+  assert cache.get('venue:1|/venues/1?past_from=21') is None
+  assert cache.get('venue:2|/venues/2') == b'two'
+
+def test_clear_only_drops_the_prefixed_keys(server):
+  cache = RedisCache(CacheStats(), url_of(server))
+  other = RedisCache(CacheStats(), url_of(server), prefix='other:')
+  cache.set('venues', 'venues|/venues', b'page', 60)
+  other.set('venues', 'venues|/venues', b'other page', 60)
+  cache.clear()
+  assert cache.get('venues|/venues') is None
+  assert other.get('venues|/venues') == b'other page'
+
+def test_the_database_in_the_url_is_selected(server):
+  cache = RedisCache(CacheStats(), url_of(server, 2))
+  cache.set('venues', 'venues|/venues', b'page', 60)
+  assert cache.get('venues|/venues') == b'page'
+  assert list(server.databases[2]) and not server.databases.get(0)
+
+def test_a_server_that_is_down_gives_misses(server):
+  cache = RedisCache(CacheStats(), url_of(server))
+  server.shutdown()
+  server.server_close()
+  # The connection of this thread was never opened
+  cache.set('venues', 'venues|/venues', b'page', 60)
+  assert cache.get('venues|/venues') is None
+
+def test_pages_are_cached_and_invalidated(server, monkeypatch):
+  monkeypatch.setenv('FYYUR_CACHE_BACKEND', 'redis')
+  monkeypatch.setenv('FYYUR_CACHE_REDIS_URL', url_of(server))
+  app = create_bench_app()
+  seed(app, num_cities=5, num_venues=20, num_artists=20, num_shows=100)
+  app.config.update(WTF_CSRF_ENABLED=False, CONDITIONAL_GET=False)
+  client = app.test_client()
+
+  first = client.get('/venues/1').get_data()
+  del server.commands[:]
+  assert client.get('/venues/1').get_data() == first
+  assert server.commands == ['GET']
+
+  response = client.post('/venues/1/edit', data={'name': 'Renamed', 'city': 'City 1', 'state': 'S01',
+  'address': '1 Main St', 'genres': ['Jazz'], 'version_id': '1'})
+  assert response.status_code == 302
+  assert b'Renamed' in app.test_client().get('/venues/1').get_data()
@@ -0,0 +1,62 @@
+#----------------------------------------------------------------------------#
+# Search, with the n-gram backend.
+#----------------------------------------------------------------------------#
+
+import pytest
+import search as search_module
+from datetime import datetime
+from models import Artist
+from search import search
+
+
+def all_pages(results):
+  page = search.paginate(results, 1)
+  pages = [page]
+  while page.has_next:
+      page = search.paginate(results, page.page + 1)
+      pages.append(page)
+  return pages
+
+def test_pages_follow_the_ranking(app):
+  with app.test_request_context():
+      ranked = [doc_id for doc_id, score in search.backend.match(Artist, 'artist 1')]
+      pages = all_pages(search.artists('artist 1'))
+  assert len(pages) > 1
+  assert all(page.total == len(ranked) for page in pages)
+  assert [row.id for page in pages for row in page.items] == ranked
+
+def test_broad_show_searches_match_the_names(app, monkeypatch):
+  with app.test_request_context():
+      by_ids = search.paginate(search.shows('artist 1'), 2)
+      monkeypatch.setattr(search_module, 'MAX_MATCHED_IDS', 0)
+      by_names = search.paginate(search.shows('artist 1'), 2)
+  assert by_ids.total == by_names.total > 0
+  assert by_ids.items == by_names.items
+
+def test_writes_made_elsewhere_are_picked_up(app, client):
+  # As another worker process or flask import would: straight to the
+  # database, without going through this process's index
+  from models import db
+  client.post('/artists/search', data={'search_term': 'artist'})
+  with app.app_context():
+      db.session.execute(Artist.__table__.insert(), {'name': 'Elsewhere Added', 'city': 'City 1',
+      'state': 'S01'})
+      db.session.execute(Artist.__table__.update().where(Artist.id == 2).values(name='Elsewhere Renamed',
+      updated_at=datetime.utcnow()))
+      db.session.execute(Artist.__table__.delete().where(Artist.id == 3))
+      db.session.commit()
+
+  app.config['SEARCH_REFRESH_SECONDS'] = 0
+  try:
+      page = client.post('/artists/search', data={'search_term': 'elsewhere'}).get_data(as_text=True)
+      deleted = client.post('/artists/search', data={'search_term': 'artist 3'}).get_data(as_text=True)
+  finally:
+      app.config['SEARCH_REFRESH_SECONDS'] = 10
+  assert 'Elsewhere Added' in page and 'Elsewhere Renamed' in page
+  assert '/artists/3"' not in deleted
+
+@pytest.mark.parametrize('path', ['/venues/search', '/artists/search', '/shows/search'])
+@pytest.mark.parametrize('term', ['', 'artist'])
+def test_pages_past_the_end_are_empty(client, path, term):
+  response = client.post(path, data={'search_term': term, 'page': '99999999999999999999'})
+  assert response.status_code == 200
@@ -0,0 +1,103 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import random
+import time
+from functools import wraps
+from flask import current_app
+from sqlalchemy.exc import DBAPIError
+from models import db
+
+#----------------------------------------------------------------------------#
+# Unit of work.
+#
+# Functions decorated with @transactional() do their writes in the request's
+# session and are committed as one transaction, or rolled back as a whole.
+# Transactions the database aborted because of concurrent ones (a
+# serialization failure, a deadlock, a locked SQLite database) are run again
+# from the start, up to TRANSACTION_RETRIES times, after a short randomised
+# pause. The session stays open afterwards; Flask-SQLAlchemy removes it at
+# the end of the request.
+#
+# The write helpers use single Core statements, getting back the columns the
+# caller needs through RETURNING where the database supports it, instead of
+# reloading the row after the commit.
+#----------------------------------------------------------------------------#
+
+# serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = ('40001', '40P01')
+# MySQL's deadlock and lock wait timeout errors
+RETRYABLE_MYSQL_ERRORS = (1213, 1205)
+
+# Base pause before retrying, in seconds; doubled on every attempt
+RETRY_BACKOFF = 0.02
+
+def is_retryable(error):
+  # Whether the transaction failed only because of concurrent transactions
+  if not isinstance(error, DBAPIError) or error.connection_invalidated:
+      return False
+  original = error.orig
+  if getattr(original, 'pgcode', None) in RETRYABLE_SQLSTATES or getattr(original, 'sqlstate', None) in RETRYABLE_SQLSTATES:
+      return True
+  args = getattr(original, 'args', ())
+  if args and args[0] in RETRYABLE_MYSQL_ERRORS:
+      return True
+  return 'database is locked' in str(original)
+
+def transactional(retries=None):
+  def decorator(work):
+      @wraps(work)
+      def wrapper(*args, **kwargs):
+          attempts = current_app.config['TRANSACTION_RETRIES'] if retries is None else retries
+          attempt = 0
+          while True:
+              try:
+                  result = work(*args, **kwargs)
+                  db.session.commit()
+                  return result
+              except Exception as e:
+                  db.session.rollback()
+                  if attempt >= attempts or not is_retryable(e):
+                      raise
+                  attempt += 1
+                  current_app.logger.info('Retrying %s after %s (attempt %d)', work.__name__, e.__class__.__name__, attempt)
+                  time.sleep(RETRY_BACKOFF * 2 ** attempt * random.random())
+      return wrapper
+  return decorator
+
+def supports_returning():
+  return db.session.connection().dialect.full_returning
+
+def insert_returning(model, values, columns=('id',)):
+  # Inserts a row and returns the given columns of it as a dict. Without
+  # RETURNING, only the primary key and the inserted values are known, so
+  # other columns can't be asked for.
+  table = model.__table__
+  statement = table.insert().values(**values)
+  if supports_returning():
+      return dict(db.session.execute(statement.returning(*[table.c[column] for column in columns])).one()._mapping)
+  result = db.session.execute(statement)
+  row = dict(values, id=result.inserted_primary_key[0])
+  return dict((column, row[column]) for column in columns)
+
+def update_versioned(model, entity_id, version_id, values):
+  # Updates a row by id only if it's still at version_id, bumping its
+  # version; returns whether it was. This compare-and-set takes no lock
+  # between the row being read and written, so an edit made from a stale
+  # form fails instead of waiting on, or overwriting, another one.
+  table = model.__table__
+  statement = table.update().where(db.and_(table.c.id == entity_id,
+  table.c.version_id == version_id)).values(version_id=table.c.version_id + 1, **values)
+  return db.session.execute(statement).rowcount == 1
+
+def delete_returning(table, condition, columns):
+  # Deletes the rows matching condition and returns the given columns of
+  # them, as a list of tuples. Without RETURNING they're selected first.
+  statement = table.delete().where(condition)
+  selected = [table.c[column] for column in columns]
+  if supports_returning():
+      return [tuple(row) for row in db.session.execute(statement.returning(*selected))]
+  rows = [tuple(row) for row in db.session.execute(db.select(selected).where(condition))]
+  db.session.execute(statement)
+  return rows
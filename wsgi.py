@@ -0,0 +1,10 @@
+#----------------------------------------------------------------------------#
+# WSGI entry point.
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#   waitress-serve --threads=8 wsgi:app     (e.g. on Windows)
+#
+# Settings come from the environment; see config.py.
+#----------------------------------------------------------------------------#
+
+from app import app